@@ -69,9 +69,28 @@ setup(
         'whois-api'
     ],
     extras_require={
+        'columns': [
+            'numpy',
+            'pandas',
+        ],
+        'compression': [
+            'brotli',
+            'zstandard',
+        ],
         'dev': [
             'tox',
             'flake8',
+        ],
+        'http2': [
+            'httpx[http2]',
+        ],
+        'parquet': [
+            'pyarrow',
+        ]
+    },
+    entry_points={
+        'console_scripts': [
+            'bulk-whois = bulkwhoisapi.cli:main',
         ]
     }
 )
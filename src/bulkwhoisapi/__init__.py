@@ -1,21 +1,109 @@
-__all__ = ['ApiAuthError', 'ApiRequester', 'Audit', 'BadRequestError',
-           'BulkRequest', 'BulkWhoisApiError', 'BulkWhoisRecord', 'Client',
-           'Contact', 'EmptyApiKeyError', 'ErrorMessage', 'FileError',
-           'HttpApiError', 'NameServers', 'ParameterError', 'Registrant',
-           'RegistryData', 'ResponseCreate', 'ResponseError',
-           'ResponseRecords', 'ResponseRequests',
+__all__ = ['AdaptivePageSize', 'ApiAuthError', 'ApiRequester', 'Audit',
+           'BadRequestError', 'BulkRequest', 'BulkWhoisApiError',
+           'BulkWhoisRecord', 'ByteBoundedQueue', 'ChangeDetector', 'Client',
+           'Contact', 'DomainMultiplexer', 'DownloadIndex', 'DownloadReader',
+           'EmptyApiKeyError', 'ErrorMessage', 'FileError', 'HttpApiError',
+           'HttpxTransport', 'NameServers', 'PageScheduler', 'ParameterError',
+           'RecordChange', 'RecordColumns', 'RecordPipeline', 'RecordStore',
+           'Registrant', 'RegistryData', 'RequestHedging', 'RequestsTransport',
+           'ResponseCache', 'ResponseCreate', 'ResponseError',
+           'ResponseRecords', 'ResponseRequests', 'ResponseStream',
+           'StoredRecord', 'StoredRequest', 'SubmissionScheduler', 'Submitted',
+           'TaggedRecord', 'Timeouts', 'Transport',
            'UnparsableApiResponseError', 'WhoisRecord']
 
-from .client import Client
+import typing
 
-from .models.response import BulkRequest, BulkWhoisRecord, ErrorMessage, \
-    RegistryData, ResponseCreate, ResponseRecords, ResponseRequests, \
-    WhoisRecord
+from ._lazy import lazy_getattr
 
-from .net.http import ApiRequester
+# Submodules are imported on first attribute access (PEP 562), so that
+# `import bulkwhoisapi` does not pull in requests and whoisapi models
+_LAZY = {
+    'AdaptivePageSize': '.paging',
+    'ApiAuthError': '.exceptions.error',
+    'ApiRequester': '.net.http',
+    'Audit': 'whoisapi',
+    'BadRequestError': '.exceptions.error',
+    'BulkRequest': '.models.response',
+    'BulkWhoisApiError': '.exceptions.error',
+    'BulkWhoisRecord': '.models.response',
+    'ByteBoundedQueue': '.pipeline',
+    'ChangeDetector': '.analysis.diff',
+    'Client': '.client',
+    'Contact': 'whoisapi',
+    'DomainMultiplexer': '.fanout',
+    'DownloadIndex': '.storage.index',
+    'DownloadReader': '.models.csv_reader',
+    'EmptyApiKeyError': '.exceptions.error',
+    'ErrorMessage': '.models.response',
+    'FileError': '.exceptions.error',
+    'HttpApiError': '.exceptions.error',
+    'HttpxTransport': '.net.transport',
+    'NameServers': 'whoisapi',
+    'PageScheduler': '.paging',
+    'ParameterError': '.exceptions.error',
+    'RecordChange': '.analysis.diff',
+    'RecordColumns': '.analysis.columns',
+    'RecordPipeline': '.pipeline',
+    'RecordStore': '.storage.sqlite',
+    'Registrant': 'whoisapi',
+    'RegistryData': '.models.response',
+    'RequestHedging': '.paging',
+    'RequestsTransport': '.net.transport',
+    'ResponseCache': '.net.cache',
+    'ResponseCreate': '.models.response',
+    'ResponseError': '.exceptions.error',
+    'ResponseRecords': '.models.response',
+    'ResponseRequests': '.models.response',
+    'ResponseStream': '.net.transport',
+    'StoredRecord': '.storage.sqlite',
+    'StoredRequest': '.storage.sqlite',
+    'SubmissionScheduler': '.submission',
+    'Submitted': '.submission',
+    'TaggedRecord': '.paging',
+    'Timeouts': '.net.http',
+    'Transport': '.net.transport',
+    'UnparsableApiResponseError': '.exceptions.error',
+    'WhoisRecord': '.models.response',
+}
 
-from .exceptions.error import ApiAuthError, BadRequestError, \
-    BulkWhoisApiError, EmptyApiKeyError, FileError, HttpApiError, \
-    ParameterError, ResponseError, UnparsableApiResponseError
+if typing.TYPE_CHECKING:
+    from .analysis import ChangeDetector, RecordChange, RecordColumns
 
-from whoisapi import Registrant, Contact, Audit, NameServers
+    from .client import Client
+
+    from .fanout import DomainMultiplexer
+
+    from .paging import AdaptivePageSize, PageScheduler, \
+        RequestHedging, TaggedRecord
+
+    from .pipeline import ByteBoundedQueue, RecordPipeline
+
+    from .submission import SubmissionScheduler, Submitted
+
+    from .models.csv_reader import DownloadReader
+
+    from .models.response import BulkRequest, BulkWhoisRecord, \
+        ErrorMessage, RegistryData, ResponseCreate, ResponseRecords, \
+        ResponseRequests, WhoisRecord
+
+    from .net.cache import ResponseCache
+    from .net.http import ApiRequester, Timeouts
+    from .net.transport import HttpxTransport, RequestsTransport, \
+        ResponseStream, Transport
+
+    from .storage import DownloadIndex, RecordStore, StoredRecord, \
+        StoredRequest
+
+    from .exceptions.error import ApiAuthError, BadRequestError, \
+        BulkWhoisApiError, EmptyApiKeyError, FileError, HttpApiError, \
+        ParameterError, ResponseError, UnparsableApiResponseError
+
+    from whoisapi import Registrant, Contact, Audit, NameServers
+
+
+__getattr__ = lazy_getattr(globals(), _LAZY)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,25 @@
+import importlib
+import typing
+
+
+def lazy_getattr(namespace: dict, lazy: typing.Dict[str, str]):
+    """
+    Returns a module `__getattr__` (PEP 562) importing names on first use
+
+    :param namespace: dict: globals() of the package
+    :param lazy: dict: Attribute name -> module it is defined in, relative
+        to the package
+    :return: function
+    """
+    package = namespace['__name__']
+
+    def __getattr__(name: str):
+        if name not in lazy:
+            raise AttributeError(
+                'module {!r} has no attribute {!r}'.format(package, name))
+        module = importlib.import_module(lazy[name], package)
+        value = getattr(module, name)
+        namespace[name] = value
+        return value
+
+    return __getattr__
@@ -0,0 +1,4 @@
+__all__ = ['ChangeDetector', 'RecordChange', 'RecordColumns']
+
+from .columns import RecordColumns
+from .diff import ChangeDetector, RecordChange
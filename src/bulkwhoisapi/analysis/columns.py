@@ -0,0 +1,450 @@
+"""
+Column arrays of many records for vectorized filtering and aggregation.
+
+Pages are loaded one at a time into compact int64 arrays (dates as epoch
+milliseconds, `timestamps.MISSING` when unset) and dictionary-encoded
+categories. Masks, group-by counts and histograms then run over whole
+NumPy arrays instead of Python loops over `BulkWhoisRecord` objects.
+Requires numpy, `frame` requires pandas
+(`pip install bulk-whois-api[columns]`).
+"""
+
+import array
+import datetime
+import json
+
+from ..exceptions.error import ParameterError
+from ..models.csv_reader import _import, _numpy_dates
+from ..models.fields import first_set
+from ..models.timestamps import MISSING, epoch_ms
+
+
+def _ms(value: datetime.datetime or None) -> int:
+    if value is None:
+        return MISSING
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+class _Categories:
+    """Dictionary encoding of a string column"""
+
+    def __init__(self):
+        self.codes = array.array('i')
+        self.values = []
+        self._lookup = {}
+
+    def extend(self, values):
+        lookup = self._lookup
+        codes = [lookup.setdefault(v, len(lookup)) for v in values]
+        if len(lookup) > len(self.values):
+            self.values.extend(list(lookup)[len(self.values):])
+        self.codes.extend(codes)
+
+
+class RecordColumns:
+    """
+    Records as columns:
+
+    - domain: domain names
+    - tld, registrar, domain_status: categories, stored as int32 codes
+    - index, whois_record_status: int64
+    - created, updated, expires, fetched: int64 epoch milliseconds
+
+    Build with `from_pages` or `from_records`. Requires numpy.
+    """
+
+    STRING = ('domain',)
+    CATEGORICAL = ('tld', 'registrar', 'domain_status')
+    INTEGER = ('index', 'whois_record_status')
+    DATE = ('created', 'updated', 'expires', 'fetched')
+
+    _DATE_FIELDS = {'created': 'createdDate', 'updated': 'updatedDate',
+                    'expires': 'expiresDate'}
+
+    def __init__(self, columns: dict, categories: dict):
+        """
+        :param columns: name -> numpy array, categories as codes
+        :param categories: name -> list of the values codes refer to
+        """
+        self._numpy = _import('numpy')
+        self._columns = columns
+        self._categories = categories
+
+    def __len__(self) -> int:
+        return len(self._columns['index'])
+
+    @property
+    def names(self) -> tuple:
+        return self.STRING + self.CATEGORICAL + self.INTEGER + self.DATE
+
+    @staticmethod
+    def from_pages(pages) -> 'RecordColumns':
+        """
+        :param pages: Iterable of /getRecords responses: JSON str or
+                bytes, decoded dicts or `ResponseRecords`
+        """
+        builder = _Builder()
+        for page in pages:
+            if isinstance(page, (str, bytes, bytearray, memoryview)):
+                page = json.loads(bytes(page) if isinstance(
+                    page, memoryview) else page)
+            if type(page) is dict:
+                builder.add_values(page.get('whoisRecords') or [])
+            elif hasattr(page, 'whois_records'):
+                builder.add_models(page.whois_records)
+            else:
+                raise ParameterError('Expected /getRecords responses')
+        return builder.build()
+
+    @staticmethod
+    def from_records(records) -> 'RecordColumns':
+        """
+        :param records: Iterable of `BulkWhoisRecord` or of `whoisRecords`
+                dicts
+        """
+        builder = _Builder()
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == _Builder.CHUNK_SIZE:
+                builder.add(chunk)
+                chunk = []
+        builder.add(chunk)
+        return builder.build()
+
+    def column(self, name: str):
+        """
+        :return: numpy array. Categories decoded to an object array,
+                dates as datetime64[ms] (NaT when unset)
+        """
+        values = self._column(name)
+        if name in self.CATEGORICAL:
+            return self.categories(name)[values]
+        if name in self.DATE:
+            return values.view('datetime64[ms]')
+        return values
+
+    def codes(self, name: str):
+        """int32 codes of a categorical column, see `categories`"""
+        if name not in self.CATEGORICAL:
+            raise ParameterError('{} is not categorical'.format(name))
+        return self._columns[name]
+
+    def categories(self, name: str):
+        """Object array of the values of a categorical column"""
+        if name not in self.CATEGORICAL:
+            raise ParameterError('{} is not categorical'.format(name))
+        values = self._numpy.empty(len(self._categories[name]), dtype=object)
+        values[:] = self._categories[name]
+        return values
+
+    def mask(self, **conditions):
+        """
+        Rows matching all conditions, e.g.
+        mask(tld=['com', 'net'], expires=(None, datetime(2025, 1, 1)))
+
+        Values: a value for equality, a list or set for membership. On
+        integer and date columns, a tuple (low, high) for low <= x < high,
+        either end None. Dates may be datetimes or epoch milliseconds
+        :return: numpy bool array
+        """
+        numpy = self._numpy
+        result = numpy.ones(len(self), dtype=bool)
+        for name, condition in conditions.items():
+            values = self._column(name)
+            if name in self.CATEGORICAL:
+                lookup = {v: i for i, v in enumerate(self._categories[name])}
+                wanted = condition if isinstance(
+                    condition, (list, set, tuple, frozenset)) else [condition]
+                codes = [lookup[v] for v in wanted if v in lookup]
+                result &= numpy.isin(values, codes)
+            elif name in self.STRING:
+                if isinstance(condition, (list, set, tuple, frozenset)):
+                    result &= numpy.isin(values, list(condition))
+                else:
+                    result &= values == condition
+            elif type(condition) is tuple:
+                if len(condition) != 2:
+                    raise ParameterError('Ranges are (low, high) tuples')
+                low, high = (self._number(name, v) for v in condition)
+                if low is not None:
+                    result &= values >= low
+                if high is not None:
+                    result &= values < high
+                if name in self.DATE:
+                    result &= values != MISSING
+            elif isinstance(condition, (list, set, frozenset)):
+                result &= numpy.isin(
+                    values, [self._number(name, v) for v in condition])
+            else:
+                result &= values == self._number(name, condition)
+        return result
+
+    def filter(self, mask=None, **conditions) -> 'RecordColumns':
+        """
+        :param mask: numpy bool array, e.g. from `mask`
+        :param conditions: Same as `mask`, combined with `mask`
+        :return: `RecordColumns` of the matching rows, sharing categories
+        """
+        selected = self.mask(**conditions)
+        if mask is not None:
+            selected &= mask
+        return RecordColumns(
+            {name: values[selected]
+             for name, values in self._columns.items()},
+            self._categories)
+
+    def counts(self, by: str, mask=None) -> dict:
+        """
+        Number of rows per value of a column, e.g. registrar distribution
+        :param mask: Count only these rows
+        :return: {value: count}, most frequent first, without zeros
+        """
+        numpy = self._numpy
+        values = self._column(by)
+        if mask is not None:
+            values = values[mask]
+        if by in self.CATEGORICAL:
+            counts = numpy.bincount(values,
+                                    minlength=len(self._categories[by]))
+            keys = self._categories[by]
+        else:
+            keys, counts = numpy.unique(values, return_counts=True)
+            keys = keys.tolist()
+        order = numpy.argsort(-counts, kind='stable')
+        return {keys[i]: int(counts[i]) for i in order if counts[i]}
+
+    def rate(self, by: str, mask) -> dict:
+        """
+        Share of the rows of every group where `mask` is set, e.g. the
+        share of records without a registrar per TLD:
+        rate('tld', mask(registrar=''))
+        :return: {value: fraction}, for every value with rows
+        """
+        totals = self.counts(by)
+        matching = self.counts(by, mask)
+        return {key: matching.get(key, 0) / total
+                for key, total in totals.items()}
+
+    def group_by(self, by: str, column: str, function: str = 'count',
+                 mask=None) -> dict:
+        """
+        Aggregate an integer or date column per value of `by`. Unset dates
+        are ignored
+        :param function: 'count', 'min', 'max' or 'mean'
+        :return: {value: result}, dates of min and max as datetime64[ms]
+        """
+        numpy = self._numpy
+        if function not in ('count', 'min', 'max', 'mean'):
+            raise ParameterError(
+                'Function must be count, min, max or mean')
+        if column not in self.INTEGER + self.DATE:
+            raise ParameterError('{} is not numeric'.format(column))
+
+        keys = self._column(by)
+        values = self._column(column)
+        selected = numpy.ones(len(self), dtype=bool) if mask is None \
+            else mask.copy()
+        if column in self.DATE:
+            selected &= values != MISSING
+        keys, values = keys[selected], values[selected]
+        if not len(keys):
+            return {}
+
+        if by in self.CATEGORICAL:
+            labels = self._categories[by]
+            groups = keys
+        else:
+            labels, groups = numpy.unique(keys, return_inverse=True)
+            labels = labels.tolist()
+        size = len(labels)
+        count = numpy.bincount(groups, minlength=size)
+
+        if function == 'count':
+            result = count
+        elif function == 'mean':
+            total = numpy.bincount(groups, weights=values, minlength=size)
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                result = total / count
+        else:
+            initial = numpy.iinfo('int64').max if function == 'min' \
+                else numpy.iinfo('int64').min
+            result = numpy.full(size, initial, dtype='int64')
+            (numpy.minimum if function == 'min' else numpy.maximum).at(
+                result, groups, values)
+            if column in self.DATE:
+                result = result.view('datetime64[ms]')
+
+        order = numpy.argsort(-count, kind='stable')
+        return {labels[i]: result[i].item() if function == 'count'
+                else result[i] for i in order if count[i]}
+
+    def histogram(self, column: str, bins='year', mask=None) -> tuple:
+        """
+        :param column: Integer or date column. Unset dates are left out
+        :param bins: 'year' or 'month' for dates, a number of equal bins
+                or a sequence of bin edges
+        :return: (bins, counts). Start of every calendar bin as
+                datetime64, or bin edges (one more than counts)
+        """
+        numpy = self._numpy
+        if column not in self.INTEGER + self.DATE:
+            raise ParameterError('{} is not numeric'.format(column))
+        values = self._column(column)
+        if mask is not None:
+            values = values[mask]
+        if column in self.DATE:
+            values = values[values != MISSING]
+
+        if bins in ('year', 'month'):
+            if column not in self.DATE:
+                raise ParameterError('Calendar bins need a date column')
+            unit = 'datetime64[Y]' if bins == 'year' else 'datetime64[M]'
+            units = values.view('datetime64[ms]').astype(unit).view('int64')
+            if not len(units):
+                return numpy.zeros(0, dtype=unit), numpy.zeros(0, 'int64')
+            # Counted by offset from the first unit instead of sorting
+            first = units.min()
+            counts = numpy.bincount(units - first)
+            present = numpy.flatnonzero(counts)
+            return (present + first).view(unit), counts[present]
+
+        if type(bins) is not int and column in self.DATE:
+            bins = [self._number(column, edge) for edge in bins]
+        counts, edges = numpy.histogram(values, bins=bins)
+        if column in self.DATE:
+            edges = edges.astype('int64').view('datetime64[ms]')
+        return edges, counts
+
+    def frame(self):
+        """
+        Requires pandas
+        :return: pandas.DataFrame, categorical columns sharing the codes,
+                dates as datetime64[ms, UTC]
+        """
+        pandas = _import('pandas')
+        data = {}
+        for name in self.names:
+            values = self._columns[name]
+            if name in self.CATEGORICAL:
+                data[name] = pandas.Categorical.from_codes(
+                    values, pandas.Index(self._categories[name],
+                                         dtype=object))
+            elif name in self.DATE:
+                data[name] = pandas.to_datetime(
+                    values.view('datetime64[ms]'), utc=True)
+            else:
+                data[name] = values
+        return pandas.DataFrame(data)
+
+    def _column(self, name: str):
+        if name not in self._columns:
+            raise ParameterError('Unknown column: {}'.format(name))
+        return self._columns[name]
+
+    def _number(self, name: str, value):
+        if value is None or name not in self.DATE:
+            return value
+        if isinstance(value, datetime.datetime):
+            return _ms(value)
+        if isinstance(value, datetime.date):
+            return _ms(datetime.datetime(value.year, value.month, value.day))
+        return value
+
+
+class _Builder:
+    """Accumulates pages into compact arrays"""
+
+    CHUNK_SIZE = 10000
+
+    def __init__(self):
+        self._numpy = _import('numpy')
+        self.domains = []
+        self.categories = {name: _Categories()
+                           for name in RecordColumns.CATEGORICAL}
+        self.integers = {name: array.array('q')
+                         for name in RecordColumns.INTEGER
+                         + RecordColumns.DATE}
+
+    def add(self, records: list):
+        values = [r for r in records if type(r) is dict]
+        if len(values) == len(records):
+            self.add_values(values)
+        elif not values:
+            self.add_models(records)
+        else:
+            for record in records:
+                if type(record) is dict:
+                    self.add_values([record])
+                else:
+                    self.add_models([record])
+
+    def add_values(self, records: list):
+        """`whoisRecords` items of one page"""
+        domains = [r.get('domainName') or '' for r in records]
+        whois = [r.get('whoisRecord') or {} for r in records]
+        registry = [w.get('registryData') or {} for w in whois]
+
+        self._add_common(
+            domains,
+            [_first(w, d, 'registrarName') for w, d in zip(whois, registry)],
+            [r.get('domainStatus') or '' for r in records])
+        self.integers['index'].extend(_integers(records, 'index'))
+        self.integers['whois_record_status'].extend(
+            _integers(records, 'whoisRecordStatus', -1))
+        self.integers['fetched'].extend(
+            epoch_ms(records, 'domainFetchedTime'))
+        for name, field in RecordColumns._DATE_FIELDS.items():
+            dates = _numpy_dates(self._numpy, [
+                _first(w, d, field) for w, d in zip(whois, registry)])
+            self.integers[name].frombytes(
+                dates.astype('datetime64[ms]').view('int64').tobytes())
+
+    def add_models(self, records: list):
+        """`BulkWhoisRecord` objects"""
+        self._add_common(
+            [r.domain_name for r in records],
+            [first_set(r.whois_record, 'registrar_name') or ''
+             for r in records],
+            [r.domain_status for r in records])
+        self.integers['index'].extend(r.index for r in records)
+        self.integers['whois_record_status'].extend(
+            r.whois_record_status for r in records)
+        self.integers['fetched'].extend(
+            _ms(r.domain_fetched_time) for r in records)
+        for name in RecordColumns._DATE_FIELDS:
+            self.integers[name].extend(
+                _ms(first_set(r.whois_record, name + '_date'))
+                for r in records)
+
+    def build(self) -> RecordColumns:
+        numpy = self._numpy
+        columns = {'domain': numpy.array(self.domains, dtype=object)}
+        for name, categories in self.categories.items():
+            columns[name] = numpy.frombuffer(categories.codes, dtype='int32') \
+                if len(categories.codes) else numpy.zeros(0, dtype='int32')
+        for name, values in self.integers.items():
+            columns[name] = numpy.frombuffer(values, dtype='int64') \
+                if len(values) else numpy.zeros(0, dtype='int64')
+        return RecordColumns(columns, {
+            name: categories.values
+            for name, categories in self.categories.items()})
+
+    def _add_common(self, domains: list, registrars: list, statuses: list):
+        self.domains.extend(domains)
+        self.categories['tld'].extend(
+            d.rpartition('.')[2].lower() for d in domains)
+        self.categories['registrar'].extend(registrars)
+        self.categories['domain_status'].extend(statuses)
+
+
+def _first(whois_record: dict, registry_data: dict, field: str) -> str:
+    return whois_record.get(field) or registry_data.get(field) or ''
+
+
+def _integers(records: list, key: str, default: int = 0) -> array.array:
+    """Integer field of `whoisRecords` items, as `BulkWhoisRecord` reads it"""
+    return array.array('q', [int(r.get(key) or 0) if key in r else default
+                             for r in records])
@@ -0,0 +1,215 @@
+import datetime
+import hashlib
+
+from ..exceptions.error import ParameterError
+from ..models.fields import datetime2epoch, first_set, name_servers
+from ..models.response import BaseModel, BulkWhoisRecord
+from ..storage.sqlite import StoredRecord
+
+
+class RecordChange(BaseModel):
+    ADDED = 'added'
+    CHANGED = 'changed'
+    REMOVED = 'removed'
+
+    domain_name: str
+    change: str
+    deltas: dict
+    record: BulkWhoisRecord or StoredRecord or None
+
+    def __init__(self, domain_name: str, change: str, deltas: dict, record):
+        """
+        :param domain_name: str: Normalized domain name
+        :param change: str: ADDED, CHANGED or REMOVED
+        :param deltas: dict: field name -> (old value, new value)
+        :param record: The newer record. None for removed domains
+        """
+        super().__init__()
+        self.domain_name = domain_name
+        self.change = change
+        self.deltas = deltas
+        self.record = record
+
+
+def _normalize(record) -> dict:
+    if isinstance(record, StoredRecord):
+        return {
+            'registrar_name': record.registrar_name or None,
+            'name_servers': tuple(record.name_servers),
+            'expires_date': record.expires_date,
+            'status': record.status or None,
+            'domain_status': record.domain_status or None,
+        }
+
+    whois_record = record.whois_record
+    expires = datetime2epoch(first_set(whois_record, 'expires_date'))
+    return {
+        'registrar_name': first_set(whois_record, 'registrar_name'),
+        'name_servers': tuple(name_servers(whois_record)),
+        'expires_date': None if expires is None else
+        datetime.datetime.fromtimestamp(expires, tz=datetime.timezone.utc),
+        'status': first_set(whois_record, 'status'),
+        'domain_status': record.domain_status or None,
+    }
+
+
+class ChangeDetector:
+    """
+    Detects WHOIS changes between two runs over the same domain list.
+
+    Tracked fields of every record are normalized. The older run is kept
+    as a domain index, so the newer run is streamed through once and only
+    changed domains are yielded. When the old records can be looked up
+    again, e.g. from a `RecordStore`, the index only holds a 16-byte
+    digest per domain and old values are fetched for changed domains.
+    Otherwise it holds the normalized values, needed for the deltas.
+    """
+
+    FIELDS = ('registrar_name', 'name_servers', 'expires_date', 'status',
+              'domain_status')
+
+    _fields: tuple
+
+    def __init__(self, **kwargs):
+        """
+        :key fields: (optional) Tracked fields, subset of FIELDS.
+                All by default
+        :key page_size: int: (optional) `max_records` used to page remote
+                requests. 1000 by default
+        """
+        self.fields = ChangeDetector.FIELDS
+        self.page_size = 1000
+
+        if 'fields' in kwargs:
+            self.fields = kwargs['fields']
+        if 'page_size' in kwargs:
+            self.page_size = kwargs['page_size']
+
+    @property
+    def fields(self) -> tuple:
+        return self._fields
+
+    @fields.setter
+    def fields(self, value):
+        value = tuple(value)
+        if not value or any(f not in ChangeDetector.FIELDS for f in value):
+            raise ParameterError(
+                'Fields must be a non-empty subset of ' +
+                ', '.join(ChangeDetector.FIELDS))
+        self._fields = value
+
+    @property
+    def page_size(self) -> int:
+        return self._page_size
+
+    @page_size.setter
+    def page_size(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Page size must be greater than 0')
+        self._page_size = value
+
+    def diff(self, old_records, new_records, lookup=None):
+        """
+        Compare two iterables of `BulkWhoisRecord` or `StoredRecord`
+        :param lookup: (optional) Callable returning the old record of a
+                lowercase domain name. Only digests of the old records are
+                kept in memory then
+        :return: Generator of `RecordChange`, removed domains come last
+        """
+        key = self._digest if lookup is not None else tuple
+
+        def old_values(domain_name: str, previous) -> tuple:
+            if lookup is None:
+                return previous
+            return self._values(lookup(domain_name))
+
+        index = {}
+        for record in old_records:
+            index[record.domain_name.lower()] = key(self._values(record))
+
+        for record in new_records:
+            domain_name = record.domain_name.lower()
+            values = self._values(record)
+            previous = index.pop(domain_name, None)
+
+            if previous is None:
+                yield RecordChange(
+                    domain_name, RecordChange.ADDED,
+                    {f: (None, v) for f, v in zip(self.fields, values)},
+                    record)
+            elif previous != key(values):
+                yield RecordChange(
+                    domain_name, RecordChange.CHANGED,
+                    {f: (old, new) for f, old, new
+                     in zip(self.fields, old_values(domain_name, previous),
+                            values) if old != new},
+                    record)
+
+        for domain_name, previous in index.items():
+            yield RecordChange(
+                domain_name, RecordChange.REMOVED,
+                {f: (v, None) for f, v
+                 in zip(self.fields, old_values(domain_name, previous))},
+                None)
+
+    def diff_requests(self, client, old_request_id: str,
+                      new_request_id: str):
+        """
+        Compare two bulk requests fetched from the API
+        :param client: `Client` instance
+        :return: Generator of `RecordChange`
+        """
+        return self.diff(
+            self._iter_remote(client, old_request_id),
+            self._iter_remote(client, new_request_id)
+        )
+
+    def diff_stored(self, client, store, request_id: str,
+                    previous_request_id: str = None):
+        """
+        Compare a bulk request fetched from the API with a stored snapshot
+        :param client: `Client` instance
+        :param store: `RecordStore` instance
+        :param previous_request_id: str: (optional) Stored request to compare
+                with. The most recent other stored request by default
+        :return: Generator of `RecordChange`
+        :raises ParameterError: there is no stored snapshot
+        """
+        if previous_request_id is None:
+            for stored in store.get_requests():
+                if stored.request_id != request_id:
+                    previous_request_id = stored.request_id
+                    break
+
+        if previous_request_id is None:
+            raise ParameterError('No stored snapshot to compare with')
+
+        return self.diff(
+            store.iter_records(previous_request_id),
+            self._iter_remote(client, request_id),
+            lambda domain_name: store.get_record(previous_request_id,
+                                                 domain_name)
+        )
+
+    def _values(self, record) -> tuple:
+        normalized = _normalize(record)
+        return tuple(normalized[f] for f in self.fields)
+
+    @staticmethod
+    def _digest(values: tuple) -> bytes:
+        return hashlib.blake2b(
+            repr(values).encode('UTF-8'), digest_size=16).digest()
+
+    def _iter_remote(self, client, request_id: str):
+        start_index = 1
+        while True:
+            page = client.get_records(
+                request_id=request_id,
+                max_records=self.page_size,
+                start_index=start_index
+            )
+            yield from page.whois_records
+
+            start_index += len(page.whois_records)
+            if not page.whois_records or start_index > page.total_records:
+                break
@@ -0,0 +1,483 @@
+"""
+bulk-whois: command-line tool for Bulk Whois API jobs.
+
+Results go to stdout, progress and statistics to stderr, so the commands
+can be chained in shell pipelines:
+
+    bulk-whois submit domains.txt | bulk-whois wait - | \\
+        bulk-whois export - --format ndjson > records.ndjson
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, loads
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+from .client import Client
+from .exceptions.error import BulkWhoisApiError, ParameterError
+from .paging import AdaptivePageSize, RequestHedging, byte_size, \
+    is_timeout
+
+
+API_KEY_ENV = 'BULK_WHOIS_API_KEY'
+
+EXPORT_FIELDS = (
+    'index', 'domainName', 'domainStatus', 'whoisRecordStatus',
+    'domainFetchedTime', 'registrarName', 'createdDate', 'updatedDate',
+    'expiresDate', 'status', 'nameServers'
+)
+
+
+class _Progress:
+    """Rate-limited progress line on stderr"""
+
+    def __init__(self, label: str, total: int = None, enabled: bool = True):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.enabled = enabled
+        self.started = time.monotonic()
+        self._shown = 0.0
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, count: int):
+        self.done += count
+        now = time.monotonic()
+        if self.enabled and now - self._shown >= 0.5:
+            self._shown = now
+            self._write('\r')
+
+    def finish(self):
+        if self.enabled:
+            self._write('\r')
+            sys.stderr.write('\n')
+        sys.stderr.flush()
+
+    def _write(self, prefix: str):
+        total = '' if self.total is None else '/{}'.format(self.total)
+        sys.stderr.write('{}{}: {}{} ({:.1f}/s, {:.1f}s)'.format(
+            prefix, self.label, self.done, total, self.rate,
+            time.monotonic() - self.started))
+        sys.stderr.flush()
+
+
+def _open_input(name: str):
+    if name == '-':
+        return sys.stdin
+    return open(name, 'r', encoding='UTF-8')
+
+
+def _read_lines(names: list):
+    for name in names:
+        source = _open_input(name)
+        try:
+            for line in source:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+
+def _request_ids(values: list):
+    for value in values:
+        if value == '-' or os.path.isfile(value):
+            yield from _read_lines([value])
+        else:
+            yield value
+
+
+def _first_set(values: dict, key: str):
+    value = values.get(key)
+    if not value and type(values.get('registryData')) is dict:
+        value = values['registryData'].get(key)
+    return value or ''
+
+
+def _flatten(record: dict) -> dict:
+    whois_record = record.get('whoisRecord') or {}
+    name_servers = (whois_record.get('nameServers') or {}).get('hostNames')
+    return {
+        'index': record.get('index'),
+        'domainName': record.get('domainName', ''),
+        'domainStatus': record.get('domainStatus', ''),
+        'whoisRecordStatus': record.get('whoisRecordStatus'),
+        'domainFetchedTime': record.get('domainFetchedTime', ''),
+        'registrarName': _first_set(whois_record, 'registrarName'),
+        'createdDate': _first_set(whois_record, 'createdDate'),
+        'updatedDate': _first_set(whois_record, 'updatedDate'),
+        'expiresDate': _first_set(whois_record, 'expiresDate'),
+        'status': _first_set(whois_record, 'status'),
+        'nameServers': ' '.join(
+            h.get('str', '') if type(h) is dict else str(h)
+            for h in name_servers or []),
+    }
+
+
+class _CsvWriter:
+    def __init__(self, output):
+        self._writer = csv.DictWriter(output, EXPORT_FIELDS)
+        self._writer.writeheader()
+
+    def write(self, records: list):
+        self._writer.writerows(_flatten(r) for r in records)
+
+    def close(self):
+        pass
+
+
+class _NdjsonWriter:
+    def __init__(self, output):
+        self._output = output
+
+    def write(self, records: list):
+        self._output.writelines(
+            dumps(r, separators=(',', ':')) + '\n' for r in records)
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    def __init__(self, output):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ParameterError(
+                'Parquet export requires pyarrow: '
+                'pip install bulk-whois-api[parquet]')
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema(
+            [(f, pyarrow.int64()) if f in ('index', 'whoisRecordStatus')
+             else (f, pyarrow.string()) for f in EXPORT_FIELDS])
+        self._writer = pyarrow.parquet.ParquetWriter(
+            output.buffer if hasattr(output, 'buffer') else output,
+            self._schema)
+
+    def write(self, records: list):
+        rows = [_flatten(r) for r in records]
+        self._writer.write_table(self._pyarrow.Table.from_pylist(
+            rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+_WRITERS = {
+    'csv': _CsvWriter,
+    'ndjson': _NdjsonWriter,
+    'parquet': _ParquetWriter,
+}
+
+EXPORT_FORMATS = tuple(sorted(_WRITERS))
+
+
+def export_writer(export_format: str, output):
+    """
+    Writer of flattened records in one of `EXPORT_FORMATS`
+    :param output: Text file the records are written to
+    :return: Object with `write(records)` and `close()`
+    """
+    if export_format not in _WRITERS:
+        raise ParameterError(
+            'Unknown export format: {}'.format(export_format))
+    return _WRITERS[export_format](output)
+
+
+def _fetch_page(client: Client, request_id: str, start_index: int,
+                max_records: int, page_size: AdaptivePageSize = None) -> dict:
+    if page_size is None:
+        return loads(client.get_records_raw(
+            request_id=request_id,
+            max_records=max_records,
+            start_index=start_index
+        ))
+
+    # Fetch the range in pages of the tuned size, smaller after timeouts
+    page, records, timeouts = None, [], 0
+    end = start_index + max_records
+    while start_index < end:
+        count = min(end - start_index, page_size.size)
+        started = time.monotonic()
+        try:
+            response = client.get_records_raw(
+                request_id=request_id,
+                max_records=count,
+                start_index=start_index
+            )
+        except Exception as error:
+            if not is_timeout(error) or timeouts >= page_size.max_timeouts:
+                raise
+            timeouts += 1
+            page_size.timed_out()
+            continue
+
+        timeouts = 0
+        page = loads(response)
+        received = page.get('whoisRecords') or []
+        page_size.observe(count, len(received),
+                          time.monotonic() - started, byte_size(response))
+        records.extend(received)
+        start_index += count
+        if len(received) < count:
+            break
+
+    page['whoisRecords'] = records
+    return page
+
+
+def iter_pages(client: Client, request_id: str, page_size,
+               concurrency: int):
+    """
+    Fetch all record pages of a request, `concurrency` pages at a time
+    :param page_size: int or `AdaptivePageSize`
+    :return: Generator of /getRecords response dicts in index order
+    """
+    sizer = page_size if isinstance(page_size, AdaptivePageSize) else None
+
+    def size() -> int:
+        return sizer.size if sizer is not None else page_size
+
+    next_start = 1 + size()
+    first = _fetch_page(client, request_id, 1, next_start - 1, sizer)
+    yield first
+
+    total = int(first.get('totalRecords') or 0)
+
+    def submit(executor):
+        nonlocal next_start
+        if next_start > total:
+            return None
+        count = min(size(), total + 1 - next_start)
+        future = executor.submit(
+            _fetch_page, client, request_id, next_start, count, sizer)
+        next_start += count
+        return future
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        window = deque()
+        for _ in range(concurrency * 2):
+            future = submit(executor)
+            if future is None:
+                break
+            window.append(future)
+        while window:
+            page = window.popleft().result()
+            future = submit(executor)
+            if future is not None:
+                window.append(future)
+            yield page
+
+
+def _cmd_submit(client: Client, args) -> int:
+    progress = _Progress('domains', enabled=args.progress)
+
+    def counted(domains):
+        for domain in domains:
+            progress.update(1)
+            yield domain
+
+    client.max_domains = args.chunk_size
+    for response in client.create_requests(
+            domains=counted(_read_lines(args.files))):
+        print(response.request_id, flush=True)
+        if response.invalid_domains:
+            sys.stderr.write('{}: {} invalid domain(s)\n'.format(
+                response.request_id, len(response.invalid_domains)))
+    progress.finish()
+    return 0
+
+
+def _cmd_wait(client: Client, args) -> int:
+    deadline = None if args.timeout is None \
+        else time.monotonic() + args.timeout
+
+    for request_id in _request_ids(args.request_ids):
+        progress = _Progress(request_id, enabled=args.progress)
+        while True:
+            page = client.get_records(request_id=request_id, max_records=1)
+            progress.total = page.total_records
+            progress.update(page.records_processed - progress.done)
+            if page.records_left == 0:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                progress.finish()
+                sys.stderr.write('Timed out waiting for {}\n'.format(
+                    request_id))
+                return 2
+            time.sleep(args.interval)
+        progress.finish()
+        print(request_id, flush=True)
+    return 0
+
+
+def _cmd_export(client: Client, args) -> int:
+    output = sys.stdout if args.output == '-' else \
+        open(args.output, 'wb' if args.format == 'parquet' else 'w',
+             encoding=None if args.format == 'parquet' else 'UTF-8',
+             newline=None if args.format == 'parquet' else '')
+    if args.hedge is not None:
+        client.hedging = RequestHedging(budget=args.hedge)
+    try:
+        writer = export_writer(args.format, output)
+        for request_id in _request_ids(args.request_ids):
+            progress = _Progress(request_id, enabled=args.progress)
+            page_size = args.page_size if args.page_size != 'auto' else \
+                AdaptivePageSize(target_latency=args.target_latency,
+                                 max_timeouts=args.max_timeouts)
+            for page in iter_pages(client, request_id, page_size,
+                                   args.concurrency):
+                progress.total = page.get('totalRecords')
+                records = page.get('whoisRecords') or []
+                writer.write(records)
+                progress.update(len(records))
+            progress.finish()
+            sys.stderr.write('{}: {} records in {:.1f}s ({:.1f}/s)\n'.format(
+                request_id, progress.done,
+                time.monotonic() - progress.started, progress.rate))
+            if isinstance(page_size, AdaptivePageSize):
+                metrics = page_size.metrics
+                sys.stderr.write(
+                    '{}: page size {}, {} pages, {} timeouts\n'.format(
+                        request_id, metrics['size'], metrics['pages'],
+                        metrics['timeouts']))
+        if client.hedging is not None:
+            metrics = client.hedging.metrics
+            sys.stderr.write('{} of {} calls hedged, {} won by the hedge\n'
+                             .format(metrics['hedges'], metrics['calls'],
+                                     metrics['hedge_wins']))
+        writer.close()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+def _cmd_list(client: Client, args) -> int:
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    for request in client.get_requests().user_requests:
+        if args.status and request.status.lower() != args.status.lower():
+            continue
+        writer.writerow([
+            request.request_id,
+            request.time.isoformat() if request.time else '',
+            request.status,
+            request.total_records,
+            request.fetched_records,
+        ])
+    return 0
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be greater than 0')
+    return number
+
+
+def _page_size(value: str):
+    if value == 'auto':
+        return value
+    return _positive_int(value)
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='bulk-whois',
+        description='Submit, follow and export Bulk Whois API jobs.')
+    parser.add_argument(
+        '--api-key', default=os.getenv(API_KEY_ENV),
+        help='API key, ${} by default'.format(API_KEY_ENV))
+    parser.add_argument('--base-url', help='API endpoint URL')
+    parser.add_argument('--timeout', dest='http_timeout', type=float,
+                        help='API call timeout in seconds')
+    parser.add_argument('--no-progress', dest='progress',
+                        action='store_false',
+                        help='do not print progress to stderr')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser(
+        'submit', help='create requests from domain files, '
+                       'print request IDs')
+    submit.add_argument('files', nargs='*', default=['-'],
+                        help="domain files, one name per line; '-' is stdin")
+    submit.add_argument('--chunk-size', type=_positive_int,
+                        default=Client.MAX_DOMAINS,
+                        help='max domains per request, streamed from disk')
+    submit.set_defaults(handler=_cmd_submit)
+
+    wait = commands.add_parser(
+        'wait', help='wait until requests are processed, print their IDs')
+    wait.add_argument('request_ids', nargs='+',
+                      help="request IDs or files with IDs; '-' is stdin")
+    wait.add_argument('--interval', type=float, default=10,
+                      help='poll interval in seconds')
+    wait.add_argument('--timeout', type=float,
+                      help='give up after this many seconds')
+    wait.set_defaults(handler=_cmd_wait)
+
+    export = commands.add_parser('export', help='export records')
+    export.add_argument('request_ids', nargs='+',
+                        help="request IDs or files with IDs; '-' is stdin")
+    export.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    export.add_argument('--output', '-o', default='-',
+                        help="output file; '-' is stdout")
+    export.add_argument('--page-size', type=_page_size, default=1000,
+                        help="records per /getRecords call, 'auto' tunes "
+                             'it from measured latency')
+    export.add_argument('--target-latency', type=float, default=5,
+                        help='seconds per call with --page-size auto')
+    export.add_argument('--max-timeouts', type=int, default=3,
+                        help='timeouts in a row retried with smaller pages '
+                             'with --page-size auto')
+    export.add_argument('--concurrency', type=_positive_int, default=4,
+                        help='pages fetched in parallel')
+    export.add_argument('--hedge', type=float, metavar='BUDGET',
+                        help='duplicate calls slower than the p95 latency, '
+                             'up to BUDGET extra calls per call, e.g. 0.05')
+    export.set_defaults(handler=_cmd_export)
+
+    jobs = commands.add_parser('list', help='list requests')
+    jobs.add_argument('--status', help='only requests with this status')
+    jobs.set_defaults(handler=_cmd_list)
+
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = _parser().parse_args(argv)
+
+    kwargs = {}
+    if args.base_url:
+        kwargs['base_url'] = args.base_url
+    if args.http_timeout:
+        kwargs['timeout'] = args.http_timeout
+
+    try:
+        client = Client(args.api_key, **kwargs)
+        return args.handler(client, args)
+    except BrokenPipeError:
+        # The reader went away, e.g. `| head`: silence the final flush
+        sys.stdout = open(os.devnull, 'w')
+        return 141
+    except (BulkWhoisApiError, OSError, ValueError) as error:
+        sys.stderr.write('bulk-whois: {}\n'.format(
+            getattr(error, 'message', error)))
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,34 @@
 from json import loads, JSONDecodeError
 from uuid import UUID
 
+import itertools
+import os
 import re
+import time
+import typing
 
 from .exceptions.error import EmptyApiKeyError, FileError, ParameterError, \
     UnparsableApiResponseError
-from .models.response import ResponseCreate, ResponseRecords, ResponseRequests
 from .net.http import ApiRequester
 
+if typing.TYPE_CHECKING:
+    from .models.response import ResponseCreate, ResponseRecords, \
+        ResponseRequests
+    from .net.cache import ResponseCache
+    from .net.transport import ResponseStream
+    from .paging import RequestHedging
+
 
 class Client:
     __default_url = 'https://www.whoisxmlapi.com/BulkWhoisLookup/bulkServices'
     _api_requester: ApiRequester or None
     _api_key: str
+    _cache: 'ResponseCache' or None
+    _max_domains: int
 
-    _re_api_key = re.compile(r'^at_[a-z0-9]{29}$', re.IGNORECASE)
+    # Compiled on first use by the `re` module cache
+    _re_api_key = r'^at_[a-z0-9]{29}$'
+    _re_records_done = r'"recordsLeft"\s*:\s*0\b|<recordsLeft>0</recordsLeft>'
 
     _PARSABLE_FORMAT = 'json'
 
@@ -29,16 +43,42 @@ class Client:
     SEARCH_ALL = 'all'
     SEARCH_NO_ERROR = 'noerror'
 
+    RETURN_STR = 'str'
+    RETURN_BYTES = 'bytes'
+    RETURN_STREAM = 'stream'
+
+    MAX_DOMAINS = 500000
+
     def __init__(self, api_key: str, **kwargs):
         """
         :param api_key: str: Your API key
         :key base_url: str: (optional) API endpoint URL
         :key timeout: float: (optional) API call timeout in seconds
+        :key compress_threshold: int: (optional) gzip request bodies of at
+                least this many bytes. Disabled by default
+        :key pool_size: int: (optional) Max number of keep-alive connections
+                shared by all threads. New connection per call by default
+        :key max_in_flight: int: (optional) Max number of concurrent API
+                calls. Unlimited by default
+        :key timeouts: dict: (optional) `Timeouts` (connect, read, total
+                seconds) by API path, e.g. {'/download': Timeouts(read=600)}.
+                Not limited to the range of `timeout`
+        :key transport: Transport: (optional) Sends the API calls, e.g.
+                `HttpxTransport` for HTTP/2. `RequestsTransport` by default
+        :key cache: ResponseCache: (optional) Cache for /getUserRequests
+                responses and pages of finished requests
+        :key max_domains: int: (optional) Max number of domains per request.
+                MAX_DOMAINS by default
+        :key hedging: RequestHedging: (optional) Duplicates /getRecords
+                calls slower than usual. Disabled by default
         """
 
         self._api_key = ''
 
         self.api_key = api_key
+        self.cache = kwargs.pop('cache', None)
+        self.hedging = kwargs.pop('hedging', None)
+        self.max_domains = kwargs.pop('max_domains', Client.MAX_DOMAINS)
 
         if 'base_url' not in kwargs:
             kwargs['base_url'] = Client.__default_url
@@ -61,6 +101,32 @@ class Client:
     def api_requester(self, value: ApiRequester):
         self._api_requester = value
 
+    @property
+    def cache(self) -> 'ResponseCache' or None:
+        return self._cache
+
+    @cache.setter
+    def cache(self, value: 'ResponseCache' or None):
+        self._cache = value
+
+    @property
+    def hedging(self) -> 'RequestHedging' or None:
+        return self._hedging
+
+    @hedging.setter
+    def hedging(self, value: 'RequestHedging' or None):
+        self._hedging = value
+
+    @property
+    def max_domains(self) -> int:
+        return self._max_domains
+
+    @max_domains.setter
+    def max_domains(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Max domains value must be greater than 0')
+        self._max_domains = value
+
     @property
     def base_url(self) -> str:
         return self._api_requester.base_url
@@ -80,12 +146,20 @@ class Client:
     def timeout(self, value: float):
         self._api_requester.timeout = value
 
-    def create_request(self, **kwargs) -> ResponseCreate:
+    def create_request(self, **kwargs) -> 'ResponseCreate':
         """
         Create bulk domain names processing request
-        :key domains: Required. list[str]
+        :key domains: Required unless domains_file is set. list[str] or
+                any iterable of str. Iterables are streamed to the server
+        :key domains_file: Optional. str, path-like or text file object.
+                One domain name per line, streamed to the server
+        :key output_format: Optional. JSON_FORMAT (default) or XML_FORMAT.
+                XML responses are parsed incrementally
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
         :return: `ResponseCreate` instance
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -94,11 +168,17 @@ class Client:
         :raises ParameterError: invalid parameter value
         """
 
-        kwargs['output_format'] = Client._PARSABLE_FORMAT
+        output_format = Client._typed_format(kwargs)
+        kwargs['output_format'] = output_format
 
         response = self.create_request_raw(**kwargs)
 
+        if output_format == Client.XML_FORMAT:
+            from .models.xml_parser import parse_create_xml
+            return parse_create_xml(response)
+
         try:
+            from .models.response import ResponseCreate
             parsed = loads(str(response))
             if 'requestId' in parsed:
                 return ResponseCreate(parsed)
@@ -109,6 +189,35 @@ class Client:
                     "Could not parse API response",
                     error)
 
+    def create_requests(self, **kwargs):
+        """
+        Create as many requests as needed to process all domain names,
+        each one with at most `max_domains` names
+        :key domains: Required unless domains_file is set. list[str] or
+                any iterable of str. Iterables are streamed to the server
+        :key domains_file: Optional. str, path-like or text file object.
+                One domain name per line, streamed to the server
+        :return: Generator of `ResponseCreate`, one per created request
+        :raises ConnectionError:
+        :raises BulkWhoisApiError: Base class for all errors below
+        :raises ResponseError: response contains an error message
+        :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
+        :raises BadRequestError: Server returned 400, 417 or 422 HTTP code
+        :raises HttpApiError: HTTP code >= 300 and not equal to above codes
+        :raises ParameterError: invalid parameter value
+        """
+
+        domains = iter(Client._domains_source(kwargs))
+        kwargs.pop('domains_file', None)
+
+        while True:
+            first = next(domains, None)
+            if first is None:
+                break
+            kwargs['domains'] = itertools.chain(
+                [first], itertools.islice(domains, self.max_domains - 1))
+            yield self.create_request(**kwargs)
+
     def download(self, **kwargs):
         """
         Download processing results CSV and save to file
@@ -116,7 +225,10 @@ class Client:
         :key search_type: Optional.
                 Supported options: SEARCH_ALL, SEARCH_NO_ERROR.
                 SEARCH_ALL by default
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -152,7 +264,126 @@ class Client:
         finally:
             result_file.close()
 
-    def get_records(self, **kwargs) -> ResponseRecords:
+    def follow(self, **kwargs):
+        """
+        Yield Whois records as soon as the server has processed them.
+        Only windows after the last yielded record are requested, so every
+        record is fetched once
+        :key request_id: Required. str. Request ID
+        :key max_records: Optional. int. Max number of records per call.
+                1000 by default
+        :key page_size: Optional. `AdaptivePageSize`. Tunes the number of
+                records per call instead of max_records. Calls that time
+                out are retried with smaller pages
+        :key start_index: Optional. int. First record to be returned.
+                Min: 1. Use to resume
+        :key interval: Optional. float. Seconds to wait when there are no new
+                records. 10 by default
+        :key timeout: Optional. float. Stop with TimeoutError after this many
+                seconds. Page calls in flight are cut off at the deadline
+        :return: Generator of `BulkWhoisRecord`
+        :raises ConnectionError:
+        :raises TimeoutError: timeout elapsed before all records were yielded
+        :raises BulkWhoisApiError: Base class for all errors below
+        :raises ResponseError: response contains an error message
+        :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
+        :raises BadRequestError: Server returned 400, 417 or 422 HTTP code
+        :raises HttpApiError: HTTP code >= 300 and not equal to above codes
+        :raises ParameterError: invalid parameter value
+        """
+
+        if not kwargs.get('request_id'):
+            raise ParameterError('Request ID required')
+
+        request_id = Client._validate_request_id(kwargs['request_id'])
+        max_records = Client._validate_max_records(
+            kwargs.get('max_records', 1000))
+        cursor = Client._validate_start_index(kwargs.get('start_index', 1))
+        interval = kwargs.get('interval', 10)
+        page_size = kwargs.get('page_size')
+        deadline = Client._deadline(kwargs)
+        timeouts = 0
+
+        while True:
+            if page_size is not None:
+                max_records = page_size.size
+            started = time.monotonic()
+            page_kwargs = {}
+            if deadline is not None:
+                # Pages share the remaining time of the whole call
+                page_kwargs['timeout'] = max(deadline - started, 0.001)
+            try:
+                response = self.get_records_raw(
+                    request_id=request_id,
+                    max_records=max_records,
+                    start_index=cursor,
+                    output_format=Client._PARSABLE_FORMAT,
+                    **page_kwargs
+                )
+            except Exception as error:
+                from .paging import is_timeout
+                if page_size is None or not is_timeout(error) \
+                        or timeouts >= page_size.max_timeouts \
+                        or (deadline is not None
+                            and time.monotonic() >= deadline):
+                    raise
+                timeouts += 1
+                page_size.timed_out()
+                continue
+
+            timeouts = 0
+            page = Client._parse_records(response)
+            if page_size is not None:
+                from .paging import byte_size
+                page_size.observe(max_records, len(page.whois_records),
+                                  time.monotonic() - started,
+                                  byte_size(response))
+
+            yield from page.whois_records
+            cursor += len(page.whois_records)
+
+            if page.records_left == 0 and cursor > page.total_records:
+                return
+            if len(page.whois_records) == max_records:
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f'Request {request_id} is not processed yet')
+            time.sleep(interval)
+
+    def follow_many(self, **kwargs):
+        """
+        Yield the records of many requests as one stream, fetching pages
+        of all of them through a shared pool of workers. Requests nearest
+        completion are drained first
+        :key request_ids: Required. Iterable of str. Request IDs
+        :key page_size: Optional. int or `AdaptivePageSize`. Records per
+                call. 1000 by default
+        :key max_in_flight: Optional. int. Max number of concurrent calls.
+                8 by default
+        :key per_request: Optional. int. Max number of concurrent calls for
+                the same request. 2 by default
+        :key interval: Optional. float. Seconds to wait before polling a
+                request that is still processed. 10 by default
+        :return: Generator of `TaggedRecord` (request_id, record). Records
+                of one request come in index order
+        :raises ConnectionError:
+        :raises BulkWhoisApiError: Base class for all errors below
+        :raises ResponseError: response contains an error message
+        :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
+        :raises BadRequestError: Server returned 400, 417 or 422 HTTP code
+        :raises HttpApiError: HTTP code >= 300 and not equal to above codes
+        :raises ParameterError: invalid parameter value
+        """
+
+        from .paging import PageScheduler
+
+        request_ids = kwargs.pop('request_ids', None)
+        if request_ids is None or isinstance(request_ids, str):
+            raise ParameterError('Request IDs required')
+        return PageScheduler(self, request_ids, **kwargs).records()
+
+    def get_records(self, **kwargs) -> 'ResponseRecords':
         """
         Get Whois records
         :key request_id: Required. str. Request ID
@@ -160,8 +391,13 @@ class Client:
                 Min: 1
         :key start_index: Optional. int. First record to be returned.
                 Min: 1. Use for pagination
+        :key output_format: Optional. JSON_FORMAT (default) or XML_FORMAT.
+                XML responses are parsed incrementally
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
         :return: `ResponseRecords` instance
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -170,26 +406,27 @@ class Client:
         :raises ParameterError: invalid parameter value
         """
 
-        kwargs['output_format'] = Client._PARSABLE_FORMAT
+        output_format = Client._typed_format(kwargs)
+        kwargs['output_format'] = output_format
 
         response = self.get_records_raw(**kwargs)
 
-        try:
-            parsed = loads(str(response))
-            if 'whoisRecords' in parsed:
-                return ResponseRecords(parsed)
-            raise UnparsableApiResponseError(
-                'Cannot find the correct root element', None)
-        except JSONDecodeError as error:
-            raise UnparsableApiResponseError(
-                    'Could not parse API response',
-                    error)
+        if output_format == Client.XML_FORMAT:
+            from .models.xml_parser import parse_records_xml
+            return parse_records_xml(response)
 
-    def get_requests(self, **kwargs) -> ResponseRequests:
+        return Client._parse_records(response)
+
+    def get_requests(self, **kwargs) -> 'ResponseRequests':
         """
         Get a list of your requests
+        :key output_format: Optional. JSON_FORMAT (default) or XML_FORMAT.
+                XML responses are parsed incrementally
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
         :return: `ResponseRequests` instance
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -198,11 +435,17 @@ class Client:
         :raises ParameterError: invalid parameter value
         """
 
-        kwargs['output_format'] = Client._PARSABLE_FORMAT
+        output_format = Client._typed_format(kwargs)
+        kwargs['output_format'] = output_format
 
         response = self.get_requests_raw(**kwargs)
 
+        if output_format == Client.XML_FORMAT:
+            from .models.xml_parser import parse_requests_xml
+            return parse_requests_xml(response)
+
         try:
+            from .models.response import ResponseRequests
             parsed = loads(str(response))
             if 'userRequests' in parsed:
                 return ResponseRequests(parsed)
@@ -213,15 +456,26 @@ class Client:
                     'Could not parse API response',
                     error)
 
-    def create_request_raw(self, **kwargs) -> str:
+    def create_request_raw(self, **kwargs) \
+            -> 'str or bytes or ResponseStream':
         """
         Get raw create response
-        :key domains: Required. list[str]
+        :key domains: Required unless domains_file is set. list[str] or
+                any iterable of str. Iterables are streamed to the server
+        :key domains_file: Optional. str, path-like or text file object.
+                One domain name per line, streamed to the server
         :key output_format: Optional. Response output format.
                 Supported options: JSON_FORMAT, XML_FORMAT.
                 JSON_FORMAT by default
-        :return: str
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
+        :key return_type: Optional. RETURN_STR, RETURN_BYTES (body as
+                received, not decoded) or RETURN_STREAM (`ResponseStream`
+                to read the body from, the deadline ends once it is
+                returned). RETURN_STR by default
+        :return: str, bytes or `ResponseStream`
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -230,16 +484,14 @@ class Client:
         :raises ParameterError: invalid parameter value
         """
 
-        domains = None
+        api_key = self.api_key
 
-        if self.api_key == '':
+        if api_key == '':
             raise EmptyApiKeyError('')
 
-        if 'domains' in kwargs:
-            domains = Client._validate_domains(kwargs['domains'])
-
-        if not domains:
-            raise ParameterError('Domain names required')
+        deadline = Client._deadline(kwargs)
+        domains = Client._validate_domains(
+            Client._domains_source(kwargs), self.max_domains)
 
         if 'response_format' in kwargs:
             kwargs['output_format'] = kwargs['response_format']
@@ -249,20 +501,30 @@ class Client:
         else:
             output_format = Client._PARSABLE_FORMAT
 
-        return self._api_requester.post(
+        return self._post(
             self._PATH_CREATE,
-            self._build_payload(self.api_key, output_format, domains)
+            self._build_payload(api_key, output_format, domains),
+            deadline,
+            Client._validate_return_type(kwargs)
         )
 
-    def download_raw(self, **kwargs) -> str:
+    def download_raw(self, **kwargs) \
+            -> 'str or bytes or ResponseStream':
         """
         Get raw download response
         :key request_id: Required. str. Request ID
         :key search_type: Optional.
                 Supported options: SEARCH_ALL, SEARCH_NO_ERROR.
                 SEARCH_ALL by default
-        :return: str
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
+        :key return_type: Optional. RETURN_STR, RETURN_BYTES (body as
+                received, not decoded) or RETURN_STREAM (`ResponseStream`
+                to read the body from, the deadline ends once it is
+                returned). RETURN_STR by default
+        :return: str, bytes or `ResponseStream`
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -273,9 +535,13 @@ class Client:
 
         request_id, search_type = [None] * 2
 
-        if self.api_key == '':
+        api_key = self.api_key
+
+        if api_key == '':
             raise EmptyApiKeyError('')
 
+        deadline = Client._deadline(kwargs)
+
         if 'request_id' in kwargs:
             request_id = Client._validate_request_id(kwargs['request_id'])
 
@@ -285,16 +551,19 @@ class Client:
         if 'search_type' in kwargs:
             search_type = Client._validate_search_type(kwargs['search_type'])
 
-        return self._api_requester.post(
+        return self._post(
             self._PATH_DOWNLOAD,
             self._build_payload(
-                api_key=self.api_key,
+                api_key=api_key,
                 request_id=request_id,
                 search_type=search_type
-            )
+            ),
+            deadline,
+            Client._validate_return_type(kwargs)
         )
 
-    def get_records_raw(self, **kwargs) -> str:
+    def get_records_raw(self, **kwargs) \
+            -> 'str or bytes or ResponseStream':
         """
         Get raw records response
         :key request_id: Required. str. Request ID
@@ -305,8 +574,15 @@ class Client:
         :key output_format: Optional. Response output format.
                 Supported options: JSON_FORMAT, XML_FORMAT.
                 JSON_FORMAT by default
-        :return: str
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
+        :key return_type: Optional. RETURN_STR, RETURN_BYTES (body as
+                received, not decoded) or RETURN_STREAM (`ResponseStream`
+                to read the body from, the deadline ends once it is
+                returned). RETURN_STR by default
+        :return: str, bytes or `ResponseStream`
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -317,9 +593,13 @@ class Client:
 
         request_id, max_records, start_index = [None] * 3
 
-        if self.api_key == '':
+        api_key = self.api_key
+
+        if api_key == '':
             raise EmptyApiKeyError('')
 
+        deadline = Client._deadline(kwargs)
+
         if 'request_id' in kwargs:
             request_id = Client._validate_request_id(kwargs['request_id'])
 
@@ -343,26 +623,36 @@ class Client:
         else:
             output_format = Client._PARSABLE_FORMAT
 
-        return self._api_requester.post(
+        return self._post(
             self._PATH_RECORDS,
             self._build_payload(
-                self.api_key,
+                api_key,
                 output_format,
                 None,
                 request_id,
                 max_records,
                 start_index
-            )
+            ),
+            deadline,
+            Client._validate_return_type(kwargs)
         )
 
-    def get_requests_raw(self, **kwargs) -> str:
+    def get_requests_raw(self, **kwargs) \
+            -> 'str or bytes or ResponseStream':
         """
         Get raw list response
         :key output_format: Optional. Response output format.
                 Supported options: JSON_FORMAT, XML_FORMAT.
                 JSON_FORMAT by default
-        :return: str
+        :key timeout: Optional. float. Deadline of this call in seconds,
+                including waiting for a free slot and reading the response
+        :key return_type: Optional. RETURN_STR, RETURN_BYTES (body as
+                received, not decoded) or RETURN_STREAM (`ResponseStream`
+                to read the body from, the deadline ends once it is
+                returned). RETURN_STR by default
+        :return: str, bytes or `ResponseStream`
         :raises ConnectionError:
+        :raises TimeoutError: deadline exceeded
         :raises BulkWhoisApiError: Base class for all errors below
         :raises ResponseError: response contains an error message
         :raises ApiAuthError: Server returned 401, 402 or 403 HTTP code
@@ -371,9 +661,13 @@ class Client:
         :raises ParameterError: invalid parameter value
         """
 
-        if self.api_key == '':
+        api_key = self.api_key
+
+        if api_key == '':
             raise EmptyApiKeyError('')
 
+        deadline = Client._deadline(kwargs)
+
         if 'response_format' in kwargs:
             kwargs['output_format'] = kwargs['response_format']
         if 'output_format' in kwargs:
@@ -382,11 +676,61 @@ class Client:
         else:
             output_format = Client._PARSABLE_FORMAT
 
-        return self._api_requester.post(
+        return self._post(
             self._PATH_REQUESTS,
-            self._build_payload(self.api_key, output_format)
+            self._build_payload(api_key, output_format),
+            deadline,
+            Client._validate_return_type(kwargs)
+        )
+
+    def _post(self, path: str, payload: dict, deadline: float = None,
+              return_type: str = RETURN_STR) \
+            -> 'str or bytes or ResponseStream':
+        # Read shared state once, so that a concurrent setter call cannot
+        # mix two configurations within one API call
+        requester, cache = self._api_requester, self._cache
+        hedging = self._hedging if path == self._PATH_RECORDS else None
+
+        # Bytes and streams are passed through as received, uncached.
+        # Streams are returned with the headers, too early to hedge
+        if return_type == Client.RETURN_BYTES:
+            if hedging is not None:
+                return hedging.call(requester.post_bytes, path, payload,
+                                    deadline)
+            return requester.post_bytes(path, payload, deadline)
+        if return_type == Client.RETURN_STREAM:
+            return requester.post_stream(path, payload, deadline)
+
+        def send() -> str:
+            # Custom requesters without deadline support keep working
+            if deadline is None:
+                return requester.post(path, payload)
+            return requester.post(path, payload, deadline)
+
+        def post() -> str:
+            if hedging is not None:
+                return hedging.call(send)
+            return send()
+
+        if cache is None or path not in [self._PATH_RECORDS,
+                                         self._PATH_REQUESTS]:
+            return post()
+
+        return cache.fetch(
+            cache.key(path, payload),
+            post,
+            lambda response: Client._cache_ttl(cache, path, response)
         )
 
+    @staticmethod
+    def _cache_ttl(cache: 'ResponseCache', path: str, response: str) \
+            -> float:
+        if path == Client._PATH_REQUESTS:
+            return cache.requests_ttl
+        if re.search(Client._re_records_done, response) is not None:
+            return cache.FOREVER
+        return 0
+
     @staticmethod
     def _build_payload(
             api_key,
@@ -413,27 +757,109 @@ class Client:
                 payload[k] = v
         return payload
 
+    @staticmethod
+    def _parse_records(response: str) -> 'ResponseRecords':
+        from .models.response import ResponseRecords
+        return ResponseRecords(Client._decode_records(response))
+
+    @staticmethod
+    def _decode_records(response: str) -> dict:
+        """Decoded /getRecords response, before building the models"""
+        try:
+            parsed = loads(str(response))
+        except JSONDecodeError as error:
+            raise UnparsableApiResponseError(
+                    'Could not parse API response',
+                    error)
+        if 'whoisRecords' in parsed:
+            return parsed
+        raise UnparsableApiResponseError(
+            'Cannot find the correct root element', None)
+
+    @staticmethod
+    def _deadline(kwargs: dict) -> float or None:
+        timeout = kwargs.get('timeout')
+        if timeout is None:
+            return None
+        if type(timeout) not in (int, float) or timeout <= 0:
+            raise ParameterError('Timeout must be greater than 0')
+        return time.monotonic() + timeout
+
     @staticmethod
     def _validate_api_key(api_key) -> str:
-        if Client._re_api_key.search(str(api_key)) is not None:
+        if re.search(Client._re_api_key, str(api_key), re.IGNORECASE) \
+                is not None:
             return str(api_key)
         else:
             raise ParameterError('Invalid API key format')
 
     @staticmethod
-    def _validate_domains(value) -> list:
+    def _domains_source(kwargs: dict):
+        if kwargs.get('domains_file') is not None:
+            return Client._iter_domains_file(kwargs['domains_file'])
+        if 'domains' in kwargs:
+            return kwargs['domains']
+        raise ParameterError('Domain names required')
+
+    @staticmethod
+    def _iter_domains_file(source):
+        if isinstance(source, (str, os.PathLike)):
+            try:
+                source = open(source, 'r', encoding='UTF-8')
+            except OSError:
+                raise FileError('Cannot open domain names file')
+            close = True
+        elif hasattr(source, 'readline'):
+            close = False
+        else:
+            raise ParameterError('Expected a file name or a file object')
+
+        try:
+            for line in source:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            if close:
+                source.close()
+
+    @staticmethod
+    def _validate_domains(value, max_domains: int = MAX_DOMAINS):
         if value is None:
             raise ParameterError('Domain name list cannot be None')
         elif type(value) is list:
             if len(value) < 1:
                 raise ParameterError('Domain name list cannot be empty')
+            if len(value) > max_domains:
+                raise ParameterError(
+                    f'Domain name list cannot be longer than {max_domains}')
             for item in value:
                 if type(item) is not str:
                     raise ParameterError('Incorrect domain name value')
             return value
+        elif not isinstance(value, (str, bytes, dict)) \
+                and hasattr(value, '__iter__'):
+            domains = iter(value)
+            first = next(domains, None)
+            if first is None:
+                raise ParameterError('Domain name list cannot be empty')
+            return Client._iter_valid_domains(
+                itertools.chain([first], domains), max_domains)
 
         raise ParameterError('Expected a list of domain names')
 
+    @staticmethod
+    def _iter_valid_domains(domains, max_domains: int):
+        # Raising here aborts the upload before the JSON body is complete,
+        # so the server never creates the request
+        for count, item in enumerate(domains, 1):
+            if type(item) is not str:
+                raise ParameterError('Incorrect domain name value')
+            if count > max_domains:
+                raise ParameterError(
+                    f'Domain name list cannot be longer than {max_domains}')
+            yield item
+
     @staticmethod
     def _validate_max_records(value: int) -> int:
         if type(value) is int and value > 0:
@@ -441,6 +867,12 @@ class Client:
 
         raise ParameterError('Max records value must be greater than 0')
 
+    @staticmethod
+    def _typed_format(kwargs: dict) -> str:
+        value = kwargs.pop('response_format', kwargs.get(
+            'output_format', Client._PARSABLE_FORMAT))
+        return Client._validate_output_format(value)
+
     @staticmethod
     def _validate_output_format(value: str):
         if type(value) is str \
@@ -459,6 +891,17 @@ class Client:
         except ValueError:
             raise ParameterError('Invalid request ID format')
 
+    @staticmethod
+    def _validate_return_type(kwargs: dict) -> str:
+        value = kwargs.get('return_type', Client.RETURN_STR)
+        if value in [Client.RETURN_STR, Client.RETURN_BYTES,
+                     Client.RETURN_STREAM]:
+            return value
+
+        raise ParameterError(
+            f'Return type must be {Client.RETURN_STR}, '
+            f'{Client.RETURN_BYTES} or {Client.RETURN_STREAM}')
+
     @staticmethod
     def _validate_search_type(value: str):
         if type(value) is str \
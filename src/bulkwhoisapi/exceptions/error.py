@@ -1,7 +1,5 @@
 from json import loads
 
-from ..models.response import ErrorMessage
-
 
 class BulkWhoisApiError(Exception):
     def __init__(self, message):
@@ -20,11 +18,16 @@ class BulkWhoisApiError(Exception):
 
 
 class ResponseError(BulkWhoisApiError):
-    def __init__(self, message):
+    def __init__(self, message, parsed: dict = None):
+        """
+        :param parsed: message already decoded from JSON, if any
+        """
         self.message = message
         self.parsed_message = None
         try:
-            parsed = loads(message)
+            from ..models.response import ErrorMessage
+            if parsed is None:
+                parsed = loads(message)
             self.parsed_message = ErrorMessage(parsed)
         except Exception:
             pass
@@ -39,8 +42,8 @@ class ResponseError(BulkWhoisApiError):
 
 
 class ApiAuthError(ResponseError):
-    def __init__(self, message):
-        super().__init__(message)
+    def __init__(self, message, parsed: dict = None):
+        super().__init__(message, parsed)
 
         if self.parsed_message.code < 0:
             self.parsed_message.code = 403
@@ -0,0 +1,212 @@
+"""
+Shared lookups for many concurrent callers.
+
+Domains submitted by all callers within a short window are collected into
+one bulk request, lowercased and without a trailing dot. A domain already
+waiting or being looked up is not submitted again: every caller asking for
+it gets the same future, which resolves to the same `BulkWhoisRecord`
+object.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import threading
+import time
+import typing
+
+from .exceptions.error import BulkWhoisApiError, ParameterError
+
+if typing.TYPE_CHECKING:
+    from .client import Client
+    from .models.response import BulkWhoisRecord
+
+
+class DomainMultiplexer:
+    """
+    Collapses identical domains across callers into single lookups.
+
+    Results are not kept once a lookup has finished: a domain submitted
+    after its future resolved is looked up again. Use `ResponseCache` or
+    `RecordStore` to keep them.
+    """
+
+    def __init__(self, client: 'Client', **kwargs):
+        """
+        :key batch_window: float: (optional) Seconds to collect domains
+                before creating a request. 0.5 by default
+        :key max_batch: int: (optional) Max domains per request.
+                `client.max_domains` by default
+        :key max_jobs: int: (optional) Max requests followed at once.
+                4 by default
+        :key interval: float: (optional) Seconds between polls of a request
+                in progress. 10 by default
+        :key timeout: float: (optional) Seconds a request may take from its
+                creation to its last record. Its domains then fail with
+                TimeoutError. No limit by default
+        """
+        self.client = client
+        self.batch_window = kwargs.get('batch_window', 0.5)
+        if not isinstance(self.batch_window, (int, float)) \
+                or self.batch_window < 0:
+            raise ParameterError('Batch window must be a positive number')
+        self.max_batch = kwargs.get('max_batch', client.max_domains)
+        if type(self.max_batch) is not int or self.max_batch < 1:
+            raise ParameterError('Max batch must be greater than 0')
+        self.max_jobs = kwargs.get('max_jobs', 4)
+        if type(self.max_jobs) is not int or self.max_jobs < 1:
+            raise ParameterError('Max jobs must be greater than 0')
+        self.interval = kwargs.get('interval', 10)
+        self.timeout = kwargs.get('timeout')
+        if self.timeout is not None and (
+                type(self.timeout) not in (int, float) or self.timeout <= 0):
+            raise ParameterError('Timeout must be greater than 0')
+
+        self._condition = threading.Condition()
+        # Normalized domain -> future, waiting for the next batch
+        self._pending = {}
+        # Normalized domain -> future, part of a request
+        self._in_flight = {}
+        self._closed = False
+        self._thread = None
+        self._executor = None
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'requests': 0,
+                       'records': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Domains submitted, submissions joined to a lookup already waiting
+        or running, requests created, records delivered, and domains
+        currently pending and in flight
+        """
+        with self._condition:
+            result = dict(self._stats)
+            result['pending'] = len(self._pending)
+            result['in_flight'] = len(self._in_flight)
+            return result
+
+    def submit(self, domains) -> typing.List[Future]:
+        """
+        Look up domain names, sharing lookups with other callers
+        :param domains: Iterable of domain names
+        :return: One future per domain name, in order. Futures of the same
+                domain are the same object. They resolve to the
+                `BulkWhoisRecord` or raise ParameterError for an invalid
+                domain name, BulkWhoisApiError when no record was returned,
+                or the error that stopped the request
+        :raises ParameterError: not a list of domain names, or closed
+        """
+        if domains is None or isinstance(domains, (str, bytes, dict)) \
+                or not hasattr(domains, '__iter__'):
+            raise ParameterError('Expected a list of domain names')
+        names = list(domains)
+        for name in names:
+            if type(name) is not str:
+                raise ParameterError('Incorrect domain name value')
+
+        futures = []
+        with self._condition:
+            if self._closed:
+                raise ParameterError('Multiplexer is closed')
+            for name in names:
+                key = DomainMultiplexer._key(name)
+                future = self._pending.get(key) or self._in_flight.get(key)
+                if future is None:
+                    future = Future()
+                    self._pending[key] = future
+                else:
+                    self._stats['deduplicated'] += 1
+                futures.append(future)
+            self._stats['submitted'] += len(names)
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_jobs, thread_name_prefix='bulkwhoisapi-fanout')
+                self._thread = threading.Thread(
+                    target=self._batches, name='bulkwhoisapi-batches',
+                    daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+        return futures
+
+    def close(self):
+        """Submit domains still waiting and wait for all lookups"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+            self._executor.shutdown(wait=True)
+
+    def _batches(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                window_end = time.monotonic() + self.batch_window
+                while len(self._pending) < self.max_batch \
+                        and not self._closed:
+                    remaining = window_end - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = {}
+                for key in list(self._pending)[:self.max_batch]:
+                    batch[key] = self._in_flight[key] = self._pending.pop(key)
+                self._stats['requests'] += 1
+            self._executor.submit(self._lookup, batch)
+
+    def _lookup(self, batch: dict):
+        error = None
+        deadline = None if self.timeout is None \
+            else time.monotonic() + self.timeout
+        try:
+            response = self.client.create_request(domains=list(batch),
+                                                  timeout=self.timeout)
+            for name in response.invalid_domains:
+                self._resolve(batch, name, error=ParameterError(
+                    'Invalid domain name: {}'.format(name)))
+            remaining = None if deadline is None \
+                else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError('Request timed out')
+            for record in self.client.follow(request_id=response.request_id,
+                                             interval=self.interval,
+                                             timeout=remaining):
+                self._resolve(batch, record.domain_name, record=record)
+        except Exception as exception:
+            error = exception
+        finally:
+            # Whatever the request did not return
+            for key in list(batch):
+                self._resolve(batch, key, error=error or BulkWhoisApiError(
+                    'No record returned for {}'.format(key)))
+
+    def _resolve(self, batch: dict, name: str,
+                 record: 'BulkWhoisRecord' = None,
+                 error: BaseException = None):
+        key = DomainMultiplexer._key(name)
+        with self._condition:
+            future = batch.pop(key, None)
+            if future is None:
+                return
+            del self._in_flight[key]
+            if error is None:
+                self._stats['records'] += 1
+        if error is None:
+            future.set_result(record)
+        else:
+            future.set_exception(error)
+
+    @staticmethod
+    def _key(name: str) -> str:
+        return name.strip().rstrip('.').lower()
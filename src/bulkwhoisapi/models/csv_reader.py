@@ -0,0 +1,345 @@
+"""
+Streaming reader for /download CSV results.
+"""
+
+from collections import namedtuple
+
+import csv
+import datetime
+import itertools
+import os
+import re
+
+from ..exceptions.error import FileError, ParameterError
+from .response import BulkWhoisRecord
+from .timestamps import ms_to_datetime, ms_value
+
+
+# Columns of a /getRecords item, the others belong to its whoisRecord
+_RECORD_COLUMNS = frozenset([
+    'domainName', 'domainStatus', 'whoisRecordStatus', 'domainFetchedTime',
+    'index',
+])
+
+_INT_COLUMNS = frozenset([
+    'index', 'num', 'whoisRecordStatus', 'estimatedDomainAge',
+])
+
+_EPOCH_MS_COLUMNS = frozenset(['domainFetchedTime'])
+
+_re_offset = re.compile(r'([-+]\d\d):?(\d\d)$')
+_re_suffix = re.compile(r'(?:\.\d+)?(?:Z|([-+]\d\d):?(\d\d))?$')
+_re_list = re.compile(r'[|,\s]+')
+
+
+def _to_int(value: str) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def _to_datetime(value: str) -> datetime.datetime or None:
+    """Parse ISO 8601 dates, e.g. 2028-09-13T07:00:00+0000, as aware"""
+    if not value:
+        return None
+    text = value[:-1] + '+00:00' if value.endswith('Z') \
+        else _re_offset.sub(r'\1:\2', value)
+    try:
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def _epoch_ms_to_datetime(value: str) -> datetime.datetime or None:
+    try:
+        return ms_to_datetime(ms_value(value))
+    except OverflowError:
+        return None
+
+
+def _converter(column: str, kwargs: dict):
+    if column in kwargs.get('date_columns', ()) or (
+            'date_columns' not in kwargs and column.endswith('Date')):
+        return _to_datetime
+    if column in _EPOCH_MS_COLUMNS:
+        return _epoch_ms_to_datetime
+    if column in kwargs.get('int_columns', _INT_COLUMNS):
+        return _to_int
+    return None
+
+
+class DownloadReader:
+    """
+    Reads a /download CSV file without loading it as a whole.
+
+    Rows are typed as they are read: date columns become aware UTC
+    datetimes, counters and statuses become ints. Columns can also be
+    read in chunks, as lists or as NumPy/pandas arrays converted a whole
+    chunk at a time.
+    """
+
+    def __init__(self, source, **kwargs):
+        """
+        :param source: str, path-like or text file object
+        :key chunk_size: int: (optional) Rows per chunk. 10000 by default
+        :key date_columns: [str]: (optional) Columns holding ISO 8601
+                dates. Columns ending with 'Date' by default
+        :key int_columns: [str]: (optional) Columns holding integers
+        """
+        self._source = source
+        self._options = kwargs
+        self._columns = None
+        self.chunk_size = kwargs.get('chunk_size', 10000)
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
+
+    @chunk_size.setter
+    def chunk_size(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Chunk size must be greater than 0')
+        self._chunk_size = value
+
+    @property
+    def columns(self) -> list or None:
+        """
+        Column names from the header line. With a file object as source,
+        None until reading has started
+        """
+        if self._columns is None and not hasattr(self._source, 'read'):
+            with self._open() as reader:
+                self._columns = next(reader, [])
+        return None if self._columns is None else list(self._columns)
+
+    def rows(self):
+        """
+        :return: Generator of named tuples with typed values
+        """
+        with self._open() as reader:
+            header = self._header(reader)
+            row_type = namedtuple('DownloadRow', header, rename=True)
+            converters = [_converter(c, self._options) for c in header]
+            width = len(header)
+            for values in reader:
+                if not values:
+                    continue
+                values = (values + [''] * width)[:width]
+                yield row_type._make(
+                    f(v) if f else v for f, v in zip(converters, values))
+
+    def records(self):
+        """
+        :return: Generator of `BulkWhoisRecord`. Columns named like
+                registrant_name fill nested fields of the whois record
+        """
+        with self._open() as reader:
+            header = self._header(reader)
+            paths = [c.split('_') for c in header]
+            for values in reader:
+                if not values:
+                    continue
+                item, whois_record = {}, {}
+                for column, path, value in zip(header, paths, values):
+                    if column in _RECORD_COLUMNS:
+                        if value:
+                            item[column] = value
+                        if column == 'domainName':
+                            whois_record[column] = value
+                    elif column == 'nameServers':
+                        whois_record[column] = {
+                            'hostNames': [
+                                h for h in _re_list.split(value) if h]}
+                    else:
+                        target = whois_record
+                        for key in path[:-1]:
+                            target = target.setdefault(key, {})
+                        target[path[-1]] = value
+                item['whoisRecord'] = whois_record
+                yield BulkWhoisRecord(item)
+
+    def chunks(self):
+        """
+        :return: Generator of {column: list} dicts of at most chunk_size
+                typed values each
+        """
+        for rows in self._row_chunks():
+            yield {c: list(v) for c, v in zip(rows[0]._fields, zip(*rows))}
+
+    def arrays(self):
+        """
+        Requires numpy. Dates are datetime64[s] in UTC, NaT when missing
+        :return: Generator of {column: numpy.ndarray} dicts
+        """
+        numpy = _import('numpy')
+        for raw in self._raw_chunks():
+            yield {column: _numpy_column(numpy, column, values, self._options)
+                   for column, values in raw.items()}
+
+    def frames(self):
+        """
+        Requires pandas. Dates are datetime64[ns, UTC], NaT when missing
+        :return: Generator of pandas.DataFrame
+        """
+        pandas = _import('pandas')
+        for raw in self._raw_chunks():
+            frame = pandas.DataFrame(raw)
+            for column in frame.columns:
+                converter = _converter(column, self._options)
+                if converter is _to_datetime:
+                    frame[column] = pandas.to_datetime(
+                        frame[column], utc=True, errors='coerce')
+                elif converter is _epoch_ms_to_datetime:
+                    frame[column] = pandas.to_datetime(
+                        pandas.to_numeric(frame[column], errors='coerce'),
+                        unit='ms', utc=True)
+                elif converter is _to_int:
+                    frame[column] = pandas.to_numeric(
+                        frame[column], errors='coerce'
+                    ).fillna(0).astype('int64')
+            yield frame
+
+    def _open(self):
+        return _CsvSource(self._source)
+
+    def _header(self, reader) -> list:
+        header = next(reader, None)
+        if header is None:
+            raise FileError('Download file is empty')
+        self._columns = header
+        return header
+
+    def _row_chunks(self):
+        rows = self.rows()
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _raw_chunks(self):
+        """{column: [str]} dicts of unconverted values"""
+        with self._open() as reader:
+            header = self._header(reader)
+            width = len(header)
+            while True:
+                chunk = [(v + [''] * width)[:width] for v in
+                         itertools.islice(reader, self.chunk_size) if v]
+                if not chunk:
+                    return
+                yield dict(zip(header, (list(c) for c in zip(*chunk))))
+
+
+class _CsvSource:
+    """csv.reader over a path or an open file, closing only what it opened"""
+
+    def __init__(self, source):
+        self._file = None
+        if isinstance(source, (str, os.PathLike)):
+            try:
+                self._file = open(source, 'r', encoding='UTF-8', newline='')
+            except OSError:
+                raise FileError('Cannot open download file')
+            self._reader = csv.reader(self._file)
+        elif hasattr(source, 'read'):
+            self._reader = csv.reader(source)
+        else:
+            raise ParameterError(
+                'Download source must be a path or a text file object')
+
+    def __enter__(self):
+        return self._reader
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._file is not None:
+            self._file.close()
+
+
+def _import(name: str):
+    try:
+        return __import__(name)
+    except ImportError:
+        raise ParameterError(
+            '{} is required for column arrays: '
+            'pip install bulk-whois-api[columns]'.format(name))
+
+
+def _numpy_column(numpy, column: str, values: list, options: dict):
+    converter = _converter(column, options)
+    if converter is _to_int:
+        return numpy.array([_to_int(v) for v in values], dtype='int64')
+    if converter is _epoch_ms_to_datetime:
+        ms = numpy.array([_to_int(v) for v in values], dtype='int64')
+        result = ms.astype('datetime64[ms]').astype('datetime64[s]')
+        result[ms == 0] = numpy.datetime64('NaT')
+        return result
+    if converter is _to_datetime:
+        return _numpy_dates(numpy, values)
+    return numpy.array(values, dtype=object)
+
+
+def _numpy_dates(numpy, values: list):
+    """
+    Convert ISO 8601 strings to UTC datetime64[s]: the local part of the
+    whole chunk is parsed by NumPy at once, the offsets per distinct suffix.
+    Other values, e.g. dates without a time, are parsed like `rows()` does
+    """
+    text = numpy.array(values, dtype='U')
+    result = numpy.full(len(values), numpy.datetime64('NaT'),
+                        dtype='datetime64[s]')
+    lengths = numpy.char.str_len(text)
+    valid = lengths >= 19
+    for i in numpy.flatnonzero((lengths > 0) & ~valid).tolist():
+        result[i] = _numpy_date(numpy, values[i])
+    if not valid.any():
+        return result
+
+    try:
+        local = text[valid].astype('U19').astype('datetime64[s]')
+    except ValueError:
+        # Mixed formats: fall back to one value at a time
+        return numpy.array([_numpy_date(numpy, v) for v in values],
+                           dtype='datetime64[s]')
+
+    # Suffixes are sliced from the Python strings, much faster than from
+    # NumPy's. Pages usually share a single offset
+    suffixes = [v[19:] for v in (values if valid.all() else [
+        v for v, ok in zip(values, valid.tolist()) if ok])]
+    offsets = {suffix: _offset_seconds(suffix) for suffix in set(suffixes)}
+    if len(offsets) == 1 and None not in offsets.values():
+        shift = numpy.timedelta64(offsets.popitem()[1], 's')
+    else:
+        shift = numpy.array([offsets[s] or 0 for s in suffixes],
+                            dtype='int64').astype('timedelta64[s]')
+    result[valid] = local - shift
+
+    if None in offsets.values():
+        # Suffixes that are not an offset
+        indexes = numpy.flatnonzero(valid).tolist()
+        for i, suffix in zip(indexes, suffixes):
+            if offsets[suffix] is None:
+                result[i] = _numpy_date(numpy, values[i])
+    return result
+
+
+def _numpy_date(numpy, value: str):
+    parsed = _to_datetime(value)
+    if parsed is None:
+        return numpy.datetime64('NaT')
+    return numpy.datetime64(parsed.astimezone(datetime.timezone.utc)
+                            .replace(tzinfo=None), 's')
+
+
+def _offset_seconds(suffix: str) -> int or None:
+    """Offset of the part after the seconds, None if not an offset"""
+    match = _re_suffix.match(suffix)
+    if match is None:
+        return None
+    if match.group(1) is None:
+        return 0
+    sign = -1 if match.group(1)[0] == '-' else 1
+    return sign * (int(match.group(1)[1:]) * 3600 + int(match.group(2)) * 60)
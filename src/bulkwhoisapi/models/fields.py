@@ -0,0 +1,47 @@
+"""
+Normalized fields of WHOIS records, shared by `RecordStore` and the
+analysis tools so that they agree on the values they compare and store.
+"""
+
+import datetime
+
+
+def datetime2epoch(value: datetime.datetime or None) -> int or None:
+    """Seconds since the epoch, naive datetimes are taken as UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+def datetime2epoch_ms(value: datetime.datetime or None) -> int or None:
+    """Milliseconds since the epoch, naive datetimes are taken as UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(round(value.timestamp() * 1000))
+
+
+def name_servers(whois_record) -> list:
+    """Sorted unique host names, lowercase and without a trailing dot"""
+    if whois_record is None or whois_record.name_servers is None:
+        return []
+    result = set()
+    for host in whois_record.name_servers.host_names:
+        if type(host) is dict:
+            host = host.get('str', '')
+        if host:
+            result.add(str(host).lower().rstrip('.'))
+    return sorted(result)
+
+
+def first_set(whois_record, attribute: str):
+    """Attribute of the WHOIS record, or of its registry data if unset"""
+    if whois_record is None:
+        return None
+    value = getattr(whois_record, attribute, None)
+    if not value and whois_record.registry_data is not None:
+        value = getattr(whois_record.registry_data, attribute, None)
+    return value or None
@@ -5,10 +5,16 @@ import sys
 from whoisapi.models.base import BaseModel
 from whoisapi import WhoisRecord, RegistryData
 
+from .timestamps import epoch_ms, ms_to_datetime, ms_value, to_datetimes
+
 if sys.version_info < (3, 9):
     import typing
 
 
+# Argument not passed, None is a valid value
+_UNSET = object()
+
+
 def _bool_value(values: dict, key: str) -> bool:
     if key in values and values[key]:
         return bool(values[key])
@@ -21,11 +27,15 @@ def _int_value(values: dict, key: str) -> int:
     return 0
 
 
-def _list_of_objects(values: dict, key: str, classname: str) -> list:
-    r = []
-    if key in values and type(values[key]) is list:
-        r = [globals()[classname](x) for x in values[key]]
-    return r
+def _list_of_timed_objects(values: dict, key: str, classname: str,
+                           time_key: str) -> list:
+    """Models of a list of dicts, their times converted in one batch"""
+    if key not in values or type(values[key]) is not list:
+        return []
+    items = values[key]
+    times = to_datetimes(epoch_ms(items, time_key))
+    cls = globals()[classname]
+    return [cls(x, time) for x, time in zip(items, times)]
 
 
 def _list_value(values: dict, key: str) -> list:
@@ -40,12 +50,6 @@ def _string_value(values: dict, key: str) -> str:
     return ''
 
 
-def _timestamp2datetime(timestamp) -> datetime.datetime or None:
-    if timestamp is not None:
-        return datetime.datetime.utcfromtimestamp(timestamp)
-    return None
-
-
 class BaseModel(BaseModel):
     def __repr__(self):
         return self.__str__()
@@ -65,10 +69,13 @@ class RegistryData(RegistryData):
 
 class WhoisRecord(WhoisRecord):
     registry_data: RegistryData or None
+    status: str
 
     def __init__(self, values):
         super().__init__(values)
 
+        self.status = ''
+
         self.custom1_field_name = _string_value(values, 'customField1Name')
         self.custom1_field_value = _string_value(values, 'customField1Value')
         self.custom2_field_name = _string_value(values, 'customField2Name')
@@ -77,6 +84,8 @@ class WhoisRecord(WhoisRecord):
         self.custom3_field_value = _string_value(values, 'customField3Value')
 
         if values is not None:
+            self.status = _string_value(values, 'status')
+
             if 'registryData' in values:
                 self.registry_data = RegistryData(values['registryData'])
 
@@ -88,7 +97,10 @@ class BulkRequest(BaseModel):
     total_records: int
     fetched_records: int
 
-    def __init__(self, values):
+    def __init__(self, values, time=_UNSET):
+        """
+        :param time: (optional) `time` already converted, by the page
+        """
         super().__init__()
         self.request_id = ''
         self.time = None
@@ -98,7 +110,8 @@ class BulkRequest(BaseModel):
 
         if values is not None:
             self.request_id = _string_value(values, 'requestId')
-            self.time = _timestamp2datetime(_int_value(values, 'time')/1000)
+            self.time = ms_to_datetime(ms_value(values.get('time'))) \
+                if time is _UNSET else time
             self.status = _string_value(values, 'status')
             self.total_records = _int_value(values, 'totalRecords')
             self.fetched_records = _int_value(values, 'fetchedRecords')
@@ -112,7 +125,11 @@ class BulkWhoisRecord(BaseModel):
     index: int
     whois_record: WhoisRecord or None
 
-    def __init__(self, values):
+    def __init__(self, values, fetched_time=_UNSET):
+        """
+        :param fetched_time: (optional) `domainFetchedTime` already
+                converted, by the page
+        """
         super().__init__()
         self.domain_name = ''
         self.domain_status = ''
@@ -129,10 +146,11 @@ class BulkWhoisRecord(BaseModel):
                 self.whois_record_status = \
                     _int_value(values, 'whoisRecordStatus')
 
-            if 'domainFetchedTime' in values:
-                self.domain_fetched_time = _timestamp2datetime(
-                    int(_string_value(values, 'domainFetchedTime'))/1000
-                )
+            if fetched_time is not _UNSET:
+                self.domain_fetched_time = fetched_time
+            elif 'domainFetchedTime' in values:
+                self.domain_fetched_time = ms_to_datetime(
+                    ms_value(values['domainFetchedTime']))
 
             self.index = _int_value(values, 'index')
 
@@ -207,8 +225,9 @@ class ResponseRecords(BaseModel):
             self.records_processed = _int_value(values, 'recordsProcessed')
             self.domain_list = _list_value(values, 'domainList')
 
-            self.whois_records = \
-                _list_of_objects(values, 'whoisRecords', 'BulkWhoisRecord')
+            self.whois_records = _list_of_timed_objects(
+                values, 'whoisRecords', 'BulkWhoisRecord',
+                'domainFetchedTime')
 
 
 class ResponseRequests(BaseModel):
@@ -223,5 +242,5 @@ class ResponseRequests(BaseModel):
         self.user_requests = []
 
         if values is not None:
-            self.user_requests = \
-                _list_of_objects(values, 'userRequests', 'BulkRequest')
+            self.user_requests = _list_of_timed_objects(
+                values, 'userRequests', 'BulkRequest', 'time')
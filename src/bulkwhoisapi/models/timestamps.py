@@ -0,0 +1,121 @@
+"""
+Conversion of millisecond epoch fields (`time`, `domainFetchedTime`).
+
+`epoch_ms` collects the values of a whole page into an int64 array, which
+`to_datetimes` and `to_datetime64` turn into aware UTC datetimes or a
+NumPy datetime64[ms] array at once.
+"""
+
+import array
+import datetime
+import itertools
+
+
+MISSING = -2 ** 63
+"""Missing value in int64 arrays. Also NumPy's NaT"""
+
+_UTC = datetime.timezone.utc
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=_UTC)
+
+_MS_OFFSETS = tuple(datetime.timedelta(milliseconds=i) for i in range(1000))
+
+
+def ms_value(value) -> int or None:
+    """Milliseconds from an int or a numeric string, None if unset"""
+    if type(value) is int:
+        return value
+    if not value:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ms_to_datetime(ms: int or None) -> datetime.datetime or None:
+    """Aware UTC datetime"""
+    if ms is None or ms == MISSING:
+        return None
+    try:
+        return datetime.datetime.fromtimestamp(ms / 1000, _UTC)
+    except (OverflowError, OSError, ValueError):
+        # Out of the platform's time_t range, e.g. before 1970 on Windows
+        return EPOCH + datetime.timedelta(milliseconds=ms)
+
+
+def epoch_ms(items, key: str = None) -> array.array:
+    """
+    :param items: Iterable of values, or of dicts when key is set, e.g.
+            epoch_ms(page['whoisRecords'], 'domainFetchedTime')
+    :return: array('q') of milliseconds, MISSING for unset values
+    """
+    items = items if type(items) is list else list(items)
+    if key is None:
+        values = items
+    else:
+        try:
+            values = list(map(dict.get, items, itertools.repeat(key)))
+        except TypeError:
+            # Not every item is a dict
+            values = [item.get(key) if isinstance(item, dict) else None
+                      for item in items]
+
+    try:
+        # The whole page in C loops when every value is set. An array
+        # fills faster from a list than from an iterator
+        return array.array('q', list(map(int, values)))
+    except (TypeError, ValueError):
+        pass
+
+    result = array.array('q')
+    append = result.append
+    for value in values:
+        value = ms_value(value)
+        append(MISSING if value is None else value)
+    return result
+
+
+def to_datetimes(ms) -> list:
+    """
+    :param ms: Iterable of milliseconds, e.g. from `epoch_ms`
+    :return: [datetime or None]: Aware UTC datetimes
+    """
+    if type(ms) is not array.array:
+        ms = [MISSING if v is None else v for v in ms]
+
+    # Timestamps of a page are close together: each whole second is
+    # converted once, the milliseconds are added from a table
+    from_timestamp, utc, missing, offsets = \
+        datetime.datetime.fromtimestamp, _UTC, MISSING, _MS_OFFSETS
+    seconds = {}
+    result = []
+    append = result.append
+    base, start, stop = None, 0, 0
+    try:
+        for v in ms:
+            if start <= v < stop:
+                append(base + offsets[v - start])
+            elif v == missing:
+                append(None)
+            else:
+                second = v // 1000
+                base = seconds.get(second)
+                if base is None:
+                    base = seconds[second] = from_timestamp(second, utc)
+                start = second * 1000
+                stop = start + 1000
+                append(base + offsets[v - start])
+    except (OverflowError, OSError, ValueError):
+        return [ms_to_datetime(v) for v in ms]
+    return result
+
+
+def to_datetime64(ms):
+    """
+    Requires numpy
+    :param ms: array('q') from `epoch_ms`, shared without copying
+    :return: numpy.ndarray of datetime64[ms], NaT for missing values
+    """
+    import numpy
+    return numpy.frombuffer(ms, dtype='int64').view('datetime64[ms]')
@@ -0,0 +1,217 @@
+"""
+Incremental parser for XML_FORMAT responses.
+
+Elements are converted into the same dicts the JSON API returns, so the
+regular models are built from them. Every element is cleared and detached
+from its parent as soon as it has been converted. `iter_records_xml` also
+hands over each whois record as soon as it is complete, so memory stays
+bounded by a single record.
+
+Lists may be wrapped (<whoisRecords><whoisRecord>...</whoisRecord>
+</whoisRecords>) or repeated (<whoisRecords>...</whoisRecords>
+<whoisRecords>...</whoisRecords>).
+"""
+
+from xml.etree.ElementTree import iterparse, ParseError
+
+import io
+
+from ..exceptions.error import UnparsableApiResponseError
+from .response import BulkWhoisRecord, ResponseCreate, ResponseRecords, \
+    ResponseRequests
+
+
+_LIST_KEYS = frozenset([
+    'domainList', 'hostNames', 'invalidDomains', 'ips', 'userRequests',
+    'whoisRecords',
+])
+
+_RECORDS_KEY = 'whoisRecords'
+
+
+class _Frame:
+    __slots__ = ('tag', 'element', 'children', 'has_scalars')
+
+    def __init__(self, tag: str, element):
+        self.tag = tag
+        self.element = element
+        self.children = []
+        self.has_scalars = False
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _scalar(text: str or None):
+    if text is None:
+        return ''
+    text = text.strip()
+    if text == 'true':
+        return True
+    if text == 'false':
+        return False
+    return text
+
+
+def _to_dict(children: list) -> dict:
+    result = {}
+    for tag, value, is_item in children:
+        if is_item or tag in _LIST_KEYS:
+            items = result.setdefault(tag, [])
+            if type(value) is list:
+                items.extend(value)
+            else:
+                items.append(value)
+        elif tag in result:
+            if type(result[tag]) is not list:
+                result[tag] = [result[tag]]
+            result[tag].append(value)
+        else:
+            result[tag] = value
+    return result
+
+
+def _value(frame: _Frame, text: str or None):
+    """:return: (value, is_wrapped_list)"""
+    if not frame.children:
+        return _scalar(text), False
+    if frame.tag in _LIST_KEYS and \
+            len(set(c[0] for c in frame.children)) == 1:
+        return [c[1] for c in frame.children], True
+    return _to_dict(frame.children), False
+
+
+def _source(source):
+    if isinstance(source, str):
+        return io.BytesIO(source.encode('UTF-8'))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def _is_record(stack: list, frame: _Frame, value) -> bool:
+    # A record is a dict with a domain name either right below a
+    # whoisRecords element, or being that element itself. A whoisRecord
+    # child of an unwrapped item is not a record: its parent already has
+    # scalar fields
+    if type(value) is not dict or 'domainName' not in value:
+        return False
+    if frame.tag == _RECORDS_KEY and len(stack) == 2:
+        return True
+    parent = stack[-2] if len(stack) >= 2 else None
+    return parent is not None and parent.tag == _RECORDS_KEY \
+        and len(stack) == 3 and not parent.has_scalars
+
+
+def _walk(source):
+    """
+    Convert an XML document element by element
+    :return: Generator of whois record dicts, the remaining root dict last
+    """
+    stack = []
+    try:
+        for event, element in iterparse(
+                _source(source), events=('start', 'end')):
+            if event == 'start':
+                stack.append(_Frame(_local_name(element.tag), element))
+                continue
+
+            frame = stack[-1]
+            value, wrapped = _value(frame, element.text)
+            element.clear()
+
+            is_record = _is_record(stack, frame, value)
+            stack.pop()
+            if stack:
+                # Otherwise the empty shell stays attached, one per
+                # element of the document
+                stack[-1].element.remove(element)
+            if is_record:
+                yield value
+                continue
+            if not stack:
+                yield value if type(value) is dict else {}
+                return
+
+            parent = stack[-1]
+            parent.children.append(
+                (frame.tag, value, frame.tag in _LIST_KEYS and not wrapped))
+            if not frame.children:
+                parent.has_scalars = True
+    except ParseError as error:
+        raise UnparsableApiResponseError(
+            'Could not parse API response', error)
+
+    raise UnparsableApiResponseError('Could not parse API response', None)
+
+
+def _parse(source, records: list = None) -> dict:
+    """
+    :param records: Collects whois record dicts, which are left out of the
+            returned root dict
+    """
+    root = None
+    for value in _walk(source):
+        if root is not None and records is not None:
+            records.append(root)
+        root = value
+    return root
+
+
+def _parse_checked(source, key: str) -> dict:
+    parsed = _parse(source)
+    if key not in parsed:
+        raise UnparsableApiResponseError(
+            'Cannot find the correct root element', None)
+    return parsed
+
+
+def parse_create_xml(source) -> ResponseCreate:
+    """
+    Parse an XML /bulkWhois response
+    :param source: str, bytes or binary file object
+    :return: `ResponseCreate` instance
+    :raises UnparsableApiResponseError:
+    """
+    return ResponseCreate(_parse_checked(source, 'requestId'))
+
+
+def parse_records_xml(source) -> ResponseRecords:
+    """
+    Parse an XML /getRecords response
+    :param source: str, bytes or binary file object
+    :return: `ResponseRecords` instance
+    :raises UnparsableApiResponseError:
+    """
+    records = []
+    parsed = _parse(source, records)
+    if not records and 'requestId' not in parsed:
+        raise UnparsableApiResponseError(
+            'Cannot find the correct root element', None)
+    parsed[_RECORDS_KEY] = records
+    return ResponseRecords(parsed)
+
+
+def parse_requests_xml(source) -> ResponseRequests:
+    """
+    Parse an XML /getUserRequests response
+    :param source: str, bytes or binary file object
+    :return: `ResponseRequests` instance
+    :raises UnparsableApiResponseError:
+    """
+    return ResponseRequests(_parse_checked(source, 'userRequests'))
+
+
+def iter_records_xml(source):
+    """
+    Parse whois records of an XML /getRecords response one at a time
+    :param source: str, bytes or binary file object
+    :return: Generator of `BulkWhoisRecord`
+    :raises UnparsableApiResponseError:
+    """
+    pending = None
+    for value in _walk(source):
+        if pending is not None:
+            yield BulkWhoisRecord(pending)
+        pending = value
@@ -1,3 +1,19 @@
-__all__ = ['ApiRequester']
+__all__ = ['ApiRequester', 'HttpxTransport', 'RequestsTransport',
+           'ResponseCache', 'ResponseStream', 'Timeouts', 'Transport',
+           'TransportResponse']
 
-from .http import ApiRequester
+from .._lazy import lazy_getattr
+
+_LAZY = {
+    'ApiRequester': '.http',
+    'HttpxTransport': '.transport',
+    'RequestsTransport': '.transport',
+    'ResponseCache': '.cache',
+    'ResponseStream': '.transport',
+    'Timeouts': '.http',
+    'Transport': '.transport',
+    'TransportResponse': '.transport',
+}
+
+
+__getattr__ = lazy_getattr(globals(), _LAZY)
@@ -0,0 +1,269 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from hashlib import sha256
+from json import dumps
+
+import math
+import os
+import tempfile
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    LRU cache for raw API responses.
+
+    Entries are bounded by their total size. Responses that never change
+    (pages of finished requests) are kept until evicted and, if a directory
+    is set, shared with other processes through the disk. Other responses
+    expire after a TTL and live in memory only.
+
+    Concurrent calls for the same key are coalesced: only the first caller
+    performs the HTTP request, the others wait for its result.
+    """
+
+    FOREVER = math.inf
+
+    _max_bytes: int
+    _max_disk_bytes: int
+    _requests_ttl: float
+
+    def __init__(self, **kwargs):
+        """
+        :key max_bytes: int: (optional) In-memory size limit. 64 MiB by default
+        :key directory: str: (optional) Directory for the shared on-disk cache
+        :key max_disk_bytes: int: (optional) On-disk size limit.
+                1 GiB by default
+        :key requests_ttl: float: (optional) TTL of /getUserRequests
+                responses in seconds. 5 by default
+        """
+        self.max_bytes = 64 * 2 ** 20
+        self.max_disk_bytes = 2 ** 30
+        self.requests_ttl = 5
+        self._directory = None
+
+        if 'max_bytes' in kwargs:
+            self.max_bytes = kwargs['max_bytes']
+        if 'max_disk_bytes' in kwargs:
+            self.max_disk_bytes = kwargs['max_disk_bytes']
+        if 'requests_ttl' in kwargs:
+            self.requests_ttl = kwargs['requests_ttl']
+        if kwargs.get('directory'):
+            self._directory = kwargs['directory']
+            os.makedirs(self._directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._in_flight = {}
+        self._disk_size = self._scan_disk()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0,
+                       'coalesced': 0, 'evictions': 0}
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: int):
+        if type(value) is not int or value < 0:
+            raise ValueError('Cache size must be a non-negative integer')
+        self._max_bytes = value
+
+    @property
+    def max_disk_bytes(self) -> int:
+        return self._max_disk_bytes
+
+    @max_disk_bytes.setter
+    def max_disk_bytes(self, value: int):
+        if type(value) is not int or value < 0:
+            raise ValueError('Cache size must be a non-negative integer')
+        self._max_disk_bytes = value
+
+    @property
+    def requests_ttl(self) -> float:
+        return self._requests_ttl
+
+    @requests_ttl.setter
+    def requests_ttl(self, value: float):
+        if value is None or value < 0:
+            raise ValueError('TTL must be a non-negative number')
+        self._requests_ttl = value
+
+    @property
+    def size(self) -> int:
+        """In-memory size of cached responses"""
+        return self._size
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def key(path: str, payload: dict) -> str:
+        return sha256(
+            (path + dumps(payload, sort_keys=True)).encode('UTF-8')
+        ).hexdigest()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get(self, key: str) -> str or None:
+        with self._lock:
+            value = self._get_memory(key)
+            if value is not None:
+                self._stats['hits'] += 1
+                return value
+
+        value = self._get_disk(key)
+        if value is not None:
+            with self._lock:
+                self._stats['disk_hits'] += 1
+                self._put_memory(key, value, ResponseCache.FOREVER)
+        return value
+
+    def put(self, key: str, value: str, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._put_memory(key, value, ttl)
+        if ttl == ResponseCache.FOREVER:
+            self._put_disk(key, value)
+
+    def fetch(self, key: str, loader, ttl_for) -> str:
+        """
+        Get a cached response or load it
+        :param key: str: Cache key, see `ResponseCache.key`
+        :param loader: Callable performing the request
+        :param ttl_for: Callable returning the TTL of a loaded response.
+                FOREVER for immutable responses, 0 to skip caching
+        :return: str
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+            self.put(key, value, ttl_for(value))
+            future.set_result(value)
+            return value
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _get_memory(self, key: str) -> str or None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires, _ = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value: str, ttl: float):
+        # Limits are in bytes: characters only count for ASCII text
+        size = len(value) if value.isascii() else len(value.encode('UTF-8'))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self._size += size
+        while self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key)
+
+    def _get_disk(self, key: str) -> str or None:
+        if self._directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read().decode('UTF-8')
+            os.utime(path)
+            return value
+        except OSError:
+            return None
+
+    def _put_disk(self, key: str, value: str):
+        if self._directory is None:
+            return
+        data = value.encode('UTF-8')
+        if len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            try:
+                # Overwritten, e.g. by another process
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._disk_size += len(data) - replaced
+            over = self._disk_size > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _scan_disk(self) -> int:
+        if self._directory is None:
+            return 0
+        return sum(e.stat().st_size for e in os.scandir(self._directory)
+                   if e.is_file() and not e.name.endswith('.tmp'))
+
+    def _evict_disk(self):
+        entries = sorted(
+            (e.stat().st_mtime, e.stat().st_size, e.path)
+            for e in os.scandir(self._directory)
+            if e.is_file() and not e.name.endswith('.tmp'))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_size = total
@@ -1,92 +1,484 @@
-from json import JSONDecodeError, loads
-from requests import request, Response
+from json import JSONDecodeError, dumps, loads
 
+import gzip
+import io
 import logging
+import re
+import threading
+import time
+import typing
+import zlib
 
+from .transport import RequestsTransport, ResponseStream, Transport, \
+    TransportResponse
 from ..exceptions.error import ApiAuthError, BadRequestError, HttpApiError
 from ..version import LIBRARY_NAME, VERSION
 
 
+class Timeouts(typing.NamedTuple):
+    """
+    Timeout budget of an endpoint in seconds. Unlike
+    `ApiRequester.timeout`, values are not limited to [1, 60]
+    """
+    connect: float = 10
+    # None: ApiRequester.timeout
+    read: float or None = None
+    # Deadline of the whole call including waiting for a free slot and
+    # reading the response. None: no deadline
+    total: float or None = None
+
+
+class _Config(typing.NamedTuple):
+    base_url: str
+    # None: not set, ApiRequester.DEFAULT_TIMEOUTS apply
+    timeout: float or None
+    compress_threshold: int or None
+    timeouts: dict
+
+
 class ApiRequester:
-    __connect_timeout = 10
+    """
+    Sends API calls over HTTP.
+
+    Instances can be shared between threads. Setters replace an immutable
+    configuration snapshot as a whole, and every call works with the
+    snapshot taken when it started. Calls go through a `Transport`,
+    `RequestsTransport` by default. With `pool_size` set, calls reuse
+    keep-alive connections from a pool shared by all threads.
+    `max_in_flight` caps the number of concurrent calls, the others wait
+    for a free slot.
+    """
+
     __logger = logging.getLogger('api-requester')
     __user_agent = '{name}/{ver}'.format(name=LIBRARY_NAME, ver=VERSION)
+    __upload_chunk_size = 64 * 1024
+    # Successful responses are only scanned this far for an error code,
+    # error messages are short and start with it
+    __scan_size = 4096
+    __re_message_code = re.compile(rb'"messageCode"\s*:\s*(-?\d+)')
+
+    DEFAULT_TIMEOUT = 30
+    # Downloads and large pages take long to produce, request lists are
+    # cheap and should fail fast instead of blocking workers. Only used
+    # while `timeout` is not set
+    DEFAULT_TIMEOUTS = {
+        '/download': Timeouts(read=300),
+        '/getRecords': Timeouts(read=120),
+        '/getUserRequests': Timeouts(connect=5, read=10),
+    }
 
-    _base_url: str
-    _timeout: float
+    _config: _Config
+    _transport: Transport
+    _max_in_flight: int or None
 
     def __init__(self, **kwargs):
         """
         :param kwargs: Supported parameters:
         - base_url: (optional) API endpoint URL; str
         - timeout: (optional) API call timeout in seconds; float
+        - compress_threshold: (optional) gzip request bodies of at least
+          this many bytes, None disables compression; int
+        - pool_size: (optional) Max number of keep-alive connections shared
+          by all threads. None (default) opens a new connection per call;
+          int
+        - max_in_flight: (optional) Max number of concurrent calls,
+          unlimited by default; int
+        - timeouts: (optional) `Timeouts` by API path, e.g. '/download',
+          taking precedence over `timeout` and DEFAULT_TIMEOUTS; dict
+        - transport: (optional) `Transport` sending the calls, e.g.
+          `HttpxTransport` for HTTP/2. `RequestsTransport` by default
         """
-        self._base_url = ''
-        self.timeout = 30
+        self._lock = threading.Lock()
+        self._config = _Config('', None, None, {})
+        self._transport = RequestsTransport()
+        self._max_in_flight = None
+        self._semaphore = None
+        self._compression_rejected = False
+        self._stats_lock = threading.Lock()
+        self._stats = dict.fromkeys([
+            'requests', 'body_bytes', 'sent_bytes',
+            'received_bytes', 'decoded_bytes'], 0)
 
         if 'base_url' in kwargs:
             self.base_url = kwargs['base_url']
         if 'timeout' in kwargs:
             self.timeout = kwargs['timeout']
+        if 'compress_threshold' in kwargs:
+            self.compress_threshold = kwargs['compress_threshold']
+        if kwargs.get('transport') is not None:
+            self.transport = kwargs['transport']
+        if 'pool_size' in kwargs:
+            self.pool_size = kwargs['pool_size']
+        if 'max_in_flight' in kwargs:
+            self.max_in_flight = kwargs['max_in_flight']
+        if 'timeouts' in kwargs:
+            self.timeouts = kwargs['timeouts'] or {}
 
     @property
     def base_url(self) -> str:
-        return self._base_url
+        return self._config.base_url
 
     @base_url.setter
     def base_url(self, url: str):
         if url is None or len(url) <= 8 or not url.startswith('http'):
             raise ValueError('Invalid URL specified.')
-        self._base_url = url
+        self._update(base_url=url)
 
     @property
     def timeout(self) -> float:
         """API call timeout in seconds"""
-        return self._timeout
+        if self._config.timeout is None:
+            return ApiRequester.DEFAULT_TIMEOUT
+        return self._config.timeout
 
     @timeout.setter
     def timeout(self, value: float):
         """API call timeout in seconds"""
         if value is not None and 1 <= value <= 60:
-            self._timeout = value
+            self._update(timeout=value)
         else:
             raise ValueError('Timeout value should be in [1, 60]')
 
-    def post(self, path: str, data: dict) -> str:
+    @property
+    def compress_threshold(self) -> int or None:
+        """Min request body size in bytes to be sent gzip-compressed"""
+        return self._config.compress_threshold
+
+    @compress_threshold.setter
+    def compress_threshold(self, value: int or None):
+        """Min request body size in bytes to be sent gzip-compressed"""
+        if value is None or (type(value) is int and value >= 0):
+            self._update(compress_threshold=value)
+        else:
+            raise ValueError('Compression threshold should be None or >= 0')
+
+    @property
+    def transport(self) -> Transport:
+        return self._transport
+
+    @transport.setter
+    def transport(self, value: Transport):
+        if not isinstance(value, Transport):
+            raise ValueError('Transport should be a Transport instance')
+        with self._lock:
+            self._transport = value
+
+    @property
+    def pool_size(self) -> int or None:
+        """Max number of pooled keep-alive connections"""
+        return self._transport.pool_size
+
+    @pool_size.setter
+    def pool_size(self, value: int or None):
+        """Max number of pooled keep-alive connections"""
+        self._transport.pool_size = value
+
+    @property
+    def max_in_flight(self) -> int or None:
+        """Max number of concurrent calls"""
+        return self._max_in_flight
+
+    @max_in_flight.setter
+    def max_in_flight(self, value: int or None):
+        """Max number of concurrent calls"""
+        if value is not None and (type(value) is not int or value < 1):
+            raise ValueError(
+                'Max in-flight calls should be None or greater than 0')
+        with self._lock:
+            self._max_in_flight = value
+            self._semaphore = None if value is None \
+                else threading.BoundedSemaphore(value)
+
+    @property
+    def timeouts(self) -> dict:
+        """`Timeouts` by API path, set by the user"""
+        return dict(self._config.timeouts)
+
+    @timeouts.setter
+    def timeouts(self, value: dict):
+        """`Timeouts` by API path, set by the user"""
+        if type(value) is not dict:
+            raise ValueError('Timeouts should be a dict of API paths')
+        timeouts = {}
+        for path, budget in value.items():
+            if type(budget) is dict:
+                budget = Timeouts(**budget)
+            if not isinstance(budget, Timeouts) or not all(
+                    v is None or (type(v) in (int, float) and v > 0)
+                    for v in budget) or budget.connect is None:
+                raise ValueError(
+                    'Timeouts should be positive numbers of seconds')
+            timeouts[path] = budget
+        self._update(timeouts=timeouts)
+
+    def budget(self, path: str) -> Timeouts:
+        """Timeouts of an API path, with the read timeout resolved"""
+        return ApiRequester._budget(self._config, path)
+
+    @property
+    def transfer_stats(self) -> dict:
+        """
+        Byte counters: request bodies before (body_bytes) and after
+        (sent_bytes) compression, responses on the wire (received_bytes)
+        and after decoding (decoded_bytes)
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def post(self, path: str, data: dict, deadline: float = None) -> str:
+        """
+        :param data: Request payload. Values that are iterators (not lists)
+                are serialized as JSON arrays while the body is being sent
+                with chunked transfer encoding, so they are never held in
+                memory as a whole
+        :param deadline: `time.monotonic()` value the call must finish by,
+                on top of the total budget of the path
+        :raises TimeoutError: deadline exceeded
+        """
+        return self.post_bytes(path, data, deadline).decode('UTF-8')
+
+    def post_bytes(self, path: str, data: dict, deadline: float = None) \
+            -> bytes:
+        """
+        Same as `post`, returns the response body without decoding it
+        """
+        return ApiRequester._handle_response(
+            self._exchange(path, data, deadline, False))
+
+    def post_stream(self, path: str, data: dict, deadline: float = None) \
+            -> ResponseStream:
+        """
+        Same as `post`, returns once the start of the response body has
+        been checked for errors. The rest is read from the stream, which
+        holds a `max_in_flight` slot and a connection until it is closed.
+        The deadline does not apply to reading the stream
+        """
+        return ApiRequester._handle_stream(
+            self._exchange(path, data, deadline, True))
+
+    def _exchange(self, path: str, data: dict, deadline: float or None,
+                  stream: bool):
+        config = self._config
+        budget = ApiRequester._budget(config, path)
+        if budget.total is not None:
+            total = time.monotonic() + budget.total
+            deadline = total if deadline is None else min(deadline, total)
+
+        if ApiRequester._is_streamed(data):
+            body = ApiRequester._iter_json(data)
+            compress = config.compress_threshold is not None \
+                and not self._compression_rejected
+            response = self._send(config, path, body, compress, budget,
+                                  deadline, stream)
+            if compress and response.status_code == 415:
+                # The stream is consumed, it cannot be sent again
+                ApiRequester.__logger.warning(
+                    'Server rejected compressed request body, '
+                    'sending uncompressed from now on')
+                self._compression_rejected = True
+            return response
+
+        body = dumps(data).encode('UTF-8')
+        compress = config.compress_threshold is not None \
+            and not self._compression_rejected \
+            and len(body) >= config.compress_threshold
+
+        response = self._send(config, path, body, compress, budget, deadline,
+                              stream)
+
+        if compress and response.status_code == 415:
+            ApiRequester.__logger.warning(
+                'Server rejected compressed request body, '
+                'sending uncompressed from now on')
+            self._compression_rejected = True
+            if stream:
+                response.close()
+            response = self._send(config, path, body, False, budget,
+                                  deadline, stream)
+
+        return response
+
+    @staticmethod
+    def _budget(config: _Config, path: str) -> Timeouts:
+        budget = config.timeouts.get(path)
+        if budget is None and config.timeout is None:
+            budget = ApiRequester.DEFAULT_TIMEOUTS.get(path)
+        budget = budget or Timeouts()
+        if budget.read is None:
+            budget = budget._replace(read=config.timeout
+                                     or ApiRequester.DEFAULT_TIMEOUT)
+        return budget
+
+    def _update(self, **kwargs):
+        with self._lock:
+            self._config = self._config._replace(**kwargs)
+
+    def _send(self, config: _Config, path: str, body, compress: bool,
+              budget: Timeouts, deadline: float or None,
+              stream: bool = False) -> TransportResponse or ResponseStream:
+        transport = self._transport
         headers = {
             'User-Agent': ApiRequester.__user_agent,
-            'Connection': 'close'
+            'Content-Type': 'application/json'
         }
+        counters = {'body_bytes': 0, 'sent_bytes': 0}
 
-        response = request(
-            'POST',
-            self.base_url + path,
-            json=data,
-            headers=headers,
-            timeout=(ApiRequester.__connect_timeout, self.timeout)
-        )
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+
+        if isinstance(body, bytes):
+            counters['body_bytes'] = len(body)
+            if compress:
+                body = gzip.compress(body, compresslevel=6)
+            counters['sent_bytes'] = len(body)
+        else:
+            body = ApiRequester._count_chunks(body, compress, counters)
+
+        semaphore = self._semaphore
+        if semaphore is not None and not semaphore.acquire(
+                timeout=ApiRequester._remaining(deadline)):
+            raise TimeoutError('Deadline exceeded waiting for a free slot')
+        try:
+            remaining = ApiRequester._remaining(deadline)
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError('Deadline exceeded')
+            try:
+                response = (transport.open if stream else transport.send)(
+                    config.base_url + path,
+                    body,
+                    headers,
+                    (budget.connect, budget.read) if remaining is None
+                    else (min(budget.connect, remaining),
+                          min(budget.read, remaining)),
+                    deadline
+                )
+            except Exception as error:
+                if remaining is None or remaining >= budget.read \
+                        or type(error) is TimeoutError \
+                        or not transport.is_timeout(error):
+                    raise
+                # The deadline, not the endpoint's read timeout, ran out
+                raise TimeoutError('Deadline exceeded') from error
+        except BaseException:
+            if semaphore is not None:
+                semaphore.release()
+            raise
 
-        return ApiRequester._handle_response(response)
+        def done(finished):
+            if semaphore is not None:
+                semaphore.release()
+            with self._stats_lock:
+                self._stats['requests'] += 1
+                self._stats['body_bytes'] += counters['body_bytes']
+                self._stats['sent_bytes'] += counters['sent_bytes']
+                self._stats['received_bytes'] += finished.received_bytes
+                self._stats['decoded_bytes'] += finished.bytes_read \
+                    if stream else len(finished.content)
+
+        if stream:
+            # The slot is held until the body has been read
+            response.add_close_callback(done)
+        else:
+            done(response)
+        return response
+
+    @staticmethod
+    def _remaining(deadline: float or None) -> float or None:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    @staticmethod
+    def _is_streamed(data: dict) -> bool:
+        return any(hasattr(v, '__next__') for v in data.values())
+
+    @staticmethod
+    def _iter_json(data: dict):
+        """Serialize a payload to JSON in chunks of about 64 KiB"""
+        def pieces():
+            yield '{'
+            for n, (key, value) in enumerate(data.items()):
+                yield (',' if n else '') + dumps(key) + ':'
+                if hasattr(value, '__next__'):
+                    yield '['
+                    for i, item in enumerate(value):
+                        yield (',' if i else '') + dumps(item)
+                    yield ']'
+                else:
+                    yield dumps(value)
+            yield '}'
+
+        buffer, size = [], 0
+        for piece in pieces():
+            buffer.append(piece)
+            size += len(piece)
+            if size >= ApiRequester.__upload_chunk_size:
+                yield ''.join(buffer).encode('UTF-8')
+                buffer, size = [], 0
+        if buffer:
+            yield ''.join(buffer).encode('UTF-8')
+
+    @staticmethod
+    def _count_chunks(chunks, compress: bool, counters: dict):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) \
+            if compress else None
+        for chunk in chunks:
+            counters['body_bytes'] += len(chunk)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            counters['sent_bytes'] += len(chunk)
+            yield chunk
+        if compressor is not None:
+            chunk = compressor.flush()
+            counters['sent_bytes'] += len(chunk)
+            yield chunk
+
+    @staticmethod
+    def _handle_stream(stream: ResponseStream) -> ResponseStream:
+        if 200 <= stream.status_code < 300:
+            match = ApiRequester.__re_message_code.search(
+                stream.peek(ApiRequester.__scan_size))
+            if match is None or 200 <= int(match.group(1)) < 300:
+                return stream
+
+        with stream:
+            content = stream.read()
+        ApiRequester._handle_response(TransportResponse(
+            stream.status_code, content, stream.received_bytes,
+            stream.version))
+        return ResponseStream(stream.status_code, io.BytesIO(content),
+                              version=stream.version)
 
     @staticmethod
-    def _handle_response(response: Response) -> str:
+    def _handle_response(response: TransportResponse) -> bytes:
         status_code = response.status_code
+        content = response.content
+
+        if 200 <= status_code < 300:
+            match = ApiRequester.__re_message_code.search(
+                content, 0, ApiRequester.__scan_size)
+            if match is None or 200 <= int(match.group(1)) < 300:
+                return content
 
+        # Error path: the whole body is parsed once, here
+        parsed = None
         try:
-            parsed = loads(str(response.text))
-            if 'messageCode' in parsed:
+            parsed = loads(response.text)
+            if type(parsed) is dict and 'messageCode' in parsed:
                 status_code = parsed['messageCode']
         except JSONDecodeError:
             pass
 
         if 200 <= status_code < 300:
-            return response.content.decode('UTF-8')
+            return content
 
         if status_code in [-1, 401, 402, 403]:
-            raise ApiAuthError(response.text)
+            raise ApiAuthError(response.text, parsed)
 
         if status_code in [400, 417, 422]:
-            raise BadRequestError(response.text)
+            raise BadRequestError(response.text, parsed)
 
         if status_code >= 300:
             raise HttpApiError(response.text)
@@ -0,0 +1,410 @@
+"""
+HTTP transports of `ApiRequester`.
+
+A transport sends one POST request and returns the whole response body,
+or a `ResponseStream` to read it from. `RequestsTransport` speaks HTTP/1.1
+through requests, `HttpxTransport` speaks HTTP/2 through httpx,
+multiplexing concurrent calls over a single connection.
+"""
+
+import io
+import threading
+import time
+import typing
+
+
+class TransportResponse(typing.NamedTuple):
+    status_code: int
+    # Decoded body
+    content: bytes
+    # Body size on the wire, before content decoding
+    received_bytes: int
+    version: str = 'HTTP/1.1'
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('UTF-8', 'replace')
+
+
+class ResponseStream(io.RawIOBase):
+    """
+    Binary file object reading a response body as it arrives, already
+    content-decoded. Close it, or use it as a context manager, to release
+    the connection.
+    """
+
+    def __init__(self, status_code: int, source, **kwargs):
+        """
+        :param source: Binary file object of the decoded body
+        :key received_bytes: (optional) Callable returning the body size
+                read from the wire so far
+        :key version: str: (optional) 'HTTP/1.1' by default
+        :key close: (optional) Callable closing the source
+        """
+        super().__init__()
+        self.status_code = status_code
+        self.version = kwargs.get('version', 'HTTP/1.1')
+        self._source = source
+        self._prefix = b''
+        self._read = 0
+        self._received = kwargs.get('received_bytes')
+        self._close = kwargs.get('close', source.close)
+        self._callbacks = []
+
+    @property
+    def bytes_read(self) -> int:
+        """Decoded bytes returned so far"""
+        return self._read
+
+    @property
+    def received_bytes(self) -> int:
+        """Body bytes read from the wire so far"""
+        return self._received() if self._received is not None \
+            else self._read + len(self._prefix)
+
+    def readable(self) -> bool:
+        return True
+
+    def peek(self, size: int) -> bytes:
+        """Up to `size` bytes from the start, left to be read again"""
+        while len(self._prefix) < size:
+            chunk = self._source.read(size - len(self._prefix))
+            if not chunk:
+                break
+            self._prefix += chunk
+        return self._prefix
+
+    def read(self, size: int = -1) -> bytes:
+        # The source's bytes are handed out as they are, without copying
+        # them into a buffer first
+        if self._prefix:
+            if size is None or size < 0:
+                data, self._prefix = self._prefix + self._source.read(), b''
+            else:
+                data = self._prefix[:size]
+                self._prefix = self._prefix[size:]
+        elif size is None or size < 0:
+            data = self._source.read()
+        else:
+            data = self._source.read(size)
+        self._read += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            count = min(len(buffer), len(self._prefix))
+            buffer[:count] = self._prefix[:count]
+            self._prefix = self._prefix[count:]
+        else:
+            count = self._source.readinto(buffer) or 0
+        self._read += count
+        return count
+
+    def add_close_callback(self, callback):
+        """Call `callback(self)` once when the stream is closed"""
+        self._callbacks.append(callback)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._close()
+        finally:
+            super().close()
+            for callback in self._callbacks:
+                callback(self)
+
+
+class Transport:
+    """
+    Base class of transports. Instances are shared by all threads of an
+    `ApiRequester`, so `send` must be thread-safe.
+    """
+
+    def __init__(self, pool_size: int = None):
+        self._lock = threading.Lock()
+        self._pool_size = None
+        self.pool_size = pool_size
+
+    @property
+    def pool_size(self) -> int or None:
+        """Max number of keep-alive connections"""
+        return self._pool_size
+
+    @pool_size.setter
+    def pool_size(self, value: int or None):
+        """Max number of keep-alive connections"""
+        if value is not None and (type(value) is not int or value < 1):
+            raise ValueError('Pool size should be None or greater than 0')
+        with self._lock:
+            self._pool_size = value
+            self._reset()
+
+    def send(self, url: str, body, headers: dict, timeout: tuple,
+             deadline: float or None) -> TransportResponse:
+        """
+        POST a request and read the whole response
+        :param body: bytes, or an iterator of bytes sent with chunked
+                transfer encoding
+        :param timeout: (connect, read) timeouts in seconds
+        :param deadline: `time.monotonic()` value reading the body must
+                finish by
+        :raises TimeoutError: deadline exceeded reading the body
+        """
+        raise NotImplementedError
+
+    def open(self, url: str, body, headers: dict, timeout: tuple,
+             deadline: float or None) -> ResponseStream:
+        """
+        POST a request and return once the response headers arrived.
+        Reads the whole response with `send` unless overridden
+        :param deadline: `time.monotonic()` value the headers must arrive by
+        """
+        response = self.send(url, body, headers, timeout, deadline)
+        return ResponseStream(
+            response.status_code, io.BytesIO(response.content),
+            received_bytes=lambda: response.received_bytes,
+            version=response.version)
+
+    def is_timeout(self, error: BaseException) -> bool:
+        """Whether an exception raised by `send` or `open` is a timeout"""
+        return isinstance(error, TimeoutError)
+
+    def close(self):
+        """Close pooled connections"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        """Drop the connection pool, called with the lock held"""
+
+
+class RequestsTransport(Transport):
+    """
+    HTTP/1.1 through requests. With `pool_size` set, calls reuse
+    keep-alive connections from a pool shared by all threads, each thread
+    having its own `requests.Session`. Otherwise every call opens a new
+    connection.
+    """
+
+    __read_chunk_size = 64 * 1024
+
+    def __init__(self, pool_size: int = None):
+        self._adapter = None
+        self._local = threading.local()
+        super().__init__(pool_size)
+
+    def send(self, url: str, body, headers: dict, timeout: tuple,
+             deadline: float or None) -> TransportResponse:
+        response = self._request(url, body, headers, timeout)
+
+        # urllib3 decodes the body chunk by chunk while it is being read
+        if deadline is None:
+            content = response.content
+        else:
+            content = RequestsTransport._read_until(response, deadline)
+
+        received = response.raw.tell() if response.raw is not None \
+            else len(content)
+        return TransportResponse(response.status_code, content, received)
+
+    def open(self, url: str, body, headers: dict, timeout: tuple,
+             deadline: float or None) -> ResponseStream:
+        response = self._request(url, body, headers, timeout)
+        # urllib3 decodes the body chunk by chunk while it is being read
+        response.raw.decode_content = True
+        return ResponseStream(response.status_code, response.raw,
+                              received_bytes=response.raw.tell,
+                              close=response.close)
+
+    def is_timeout(self, error: BaseException) -> bool:
+        from requests.exceptions import Timeout
+        return isinstance(error, (TimeoutError, Timeout))
+
+    def _request(self, url: str, body, headers: dict, timeout: tuple):
+        # requests is imported on the first call to keep package import cheap
+        from requests import request
+
+        session = self._session()
+        if session is None:
+            headers = dict(headers, Connection='close')
+
+        return (session.request if session else request)(
+            'POST', url, data=body, headers=headers, timeout=timeout,
+            stream=True)
+
+    def _reset(self):
+        if self._adapter is not None:
+            self._adapter.close()
+        self._adapter = None
+
+    def _session(self):
+        """Session of the current thread bound to the shared pool"""
+        from requests import Session
+        from requests.adapters import HTTPAdapter
+
+        with self._lock:
+            if self._pool_size is None:
+                return None
+            if self._adapter is None:
+                self._adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self._pool_size,
+                    pool_block=True
+                )
+            adapter = self._adapter
+
+        session = getattr(self._local, 'session', None)
+        if session is None or session.get_adapter('http://') is not adapter:
+            session = Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    @staticmethod
+    def _read_until(response, deadline: float) -> bytes:
+        chunks = []
+        for chunk in response.iter_content(
+                RequestsTransport.__read_chunk_size):
+            chunks.append(chunk)
+            if time.monotonic() > deadline:
+                response.close()
+                raise TimeoutError('Deadline exceeded reading the response')
+        return b''.join(chunks)
+
+
+class HttpxTransport(Transport):
+    """
+    HTTP/2 through httpx: concurrent calls from all threads share one
+    multiplexed connection instead of one connection each. Requires
+    `pip install bulk-whois-api[http2]`.
+
+    The connection is driven by an event loop in a background thread, the
+    calling threads wait for their streams. httpx's synchronous HTTP/2
+    client is not safe to share between threads.
+
+    HTTP/2 is negotiated over TLS. Plain http:// URLs, e.g. a local proxy,
+    need http1=False to speak HTTP/2 without negotiation.
+
+    Timeouts and connection failures are raised as the builtin
+    TimeoutError and ConnectionError. `open` reads the whole response
+    before returning.
+    """
+
+    def __init__(self, pool_size: int = None, **kwargs):
+        """
+        :param pool_size: Max number of connections. httpx defaults when
+                None
+        :key http2: bool: (optional) True by default
+        :key http1: bool: (optional) Allow falling back to HTTP/1.1.
+                True by default
+        """
+        self.http2 = kwargs.get('http2', True)
+        self.http1 = kwargs.get('http1', True)
+        if not self.http1 and not self.http2:
+            raise ValueError('Enable at least one of http1 and http2')
+        HttpxTransport._import(self.http2)
+        self._loop = None
+        self._thread = None
+        self._client = None
+        super().__init__(pool_size)
+
+    def send(self, url: str, body, headers: dict, timeout: tuple,
+             deadline: float or None) -> TransportResponse:
+        import asyncio
+
+        loop, client = self._connection_pool()
+        return asyncio.run_coroutine_threadsafe(HttpxTransport._send(
+            client, url, body, headers, timeout, deadline), loop).result()
+
+    def _reset(self):
+        import asyncio
+
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(
+                self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+        self._loop, self._thread, self._client = None, None, None
+
+    def _connection_pool(self) -> tuple:
+        import asyncio
+        import httpx
+
+        with self._lock:
+            if self._loop is None:
+                limits = httpx.Limits() if self._pool_size is None \
+                    else httpx.Limits(
+                        max_connections=self._pool_size,
+                        max_keepalive_connections=self._pool_size)
+
+                async def create():
+                    return httpx.AsyncClient(
+                        http1=self.http1, http2=self.http2, limits=limits)
+
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, daemon=True,
+                    name='bulkwhoisapi-http2')
+                self._thread.start()
+                self._client = asyncio.run_coroutine_threadsafe(
+                    create(), self._loop).result()
+            return self._loop, self._client
+
+    @staticmethod
+    async def _send(client, url: str, body, headers: dict, timeout: tuple,
+                    deadline: float or None) -> TransportResponse:
+        import httpx
+
+        connect, read = timeout
+        if not isinstance(body, bytes):
+            body = HttpxTransport._aiter(body)
+        try:
+            async with client.stream(
+                    'POST', url, content=body, headers=headers,
+                    timeout=httpx.Timeout(connect=connect, read=read,
+                                          write=read, pool=read)) \
+                    as response:
+                chunks = []
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(
+                            'Deadline exceeded reading the response')
+                return TransportResponse(
+                    response.status_code, b''.join(chunks),
+                    response.num_bytes_downloaded, response.http_version)
+        except httpx.TimeoutException as error:
+            raise TimeoutError(str(error)) from error
+        except httpx.TransportError as error:
+            raise ConnectionError(str(error)) from error
+
+    @staticmethod
+    async def _aiter(chunks):
+        import asyncio
+
+        # The caller's generator may be slow to produce: it runs on an
+        # executor thread, so that other streams of the loop go on
+        loop = asyncio.get_event_loop()
+        iterator, end = iter(chunks), object()
+        while True:
+            chunk = await loop.run_in_executor(None, next, iterator, end)
+            if chunk is end:
+                return
+            yield chunk
+
+    @staticmethod
+    def _import(http2: bool):
+        try:
+            import httpx  # noqa: F401
+            if http2:
+                import h2  # noqa: F401
+        except ImportError:
+            raise ValueError(
+                'httpx and h2 are required for HTTP/2: '
+                'pip install bulk-whois-api[http2]')
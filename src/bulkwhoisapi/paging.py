@@ -0,0 +1,659 @@
+from concurrent.futures import FIRST_COMPLETED, Future, \
+    ThreadPoolExecutor, wait
+
+import collections
+import threading
+import time
+import typing
+
+from .exceptions.error import ParameterError
+
+if typing.TYPE_CHECKING:
+    from .client import Client
+    from .models.response import BulkWhoisRecord
+
+
+class AdaptivePageSize:
+    """
+    Chooses `max_records` for /getRecords calls from measured pages.
+
+    Every page reports its latency and size. The page size moves toward
+    the one expected to take `target_latency` seconds, grows while the
+    record throughput keeps improving, stays below `max_page_bytes`, and
+    is cut to a quarter after a timeout. Instances can be shared between
+    threads paging the same request.
+    """
+
+    # Throughput changes smaller than this factor count as noise
+    _gain = 1.05
+
+    def __init__(self, **kwargs):
+        """
+        :key initial: int: (optional) First page size. 100 by default
+        :key min_size: int: (optional) 10 by default
+        :key max_size: int: (optional) 10000 by default
+        :key target_latency: float: (optional) Seconds per page. 5 by default
+        :key max_page_bytes: int: (optional) Response size limit.
+                32 MiB by default
+        :key max_timeouts: int: (optional) Timeouts in a row retried with
+                smaller pages before giving up. 3 by default
+        """
+        self._lock = threading.Lock()
+        self.min_size = kwargs.get('min_size', 10)
+        self.max_size = kwargs.get('max_size', 10000)
+        if self.min_size > self.max_size:
+            raise ParameterError('Min page size must not exceed max size')
+        self.target_latency = kwargs.get('target_latency', 5)
+        self.max_page_bytes = kwargs.get('max_page_bytes', 32 * 2 ** 20)
+        self.max_timeouts = kwargs.get('max_timeouts', 3)
+
+        initial = kwargs.get('initial', 100)
+        if type(initial) is not int or initial < 1:
+            raise ParameterError('Page size must be greater than 0')
+        self._size = self._clamp(initial)
+        self._best_throughput = 0.0
+        self._best_size = self._size
+        self._plateau = False
+        self._seconds_per_record = None
+        self._bytes_per_record = None
+        self._stats = {'pages': 0, 'records': 0, 'bytes': 0, 'seconds': 0.0,
+                       'timeouts': 0, 'grown': 0, 'shrunk': 0}
+
+    @property
+    def min_size(self) -> int:
+        return self._min_size
+
+    @min_size.setter
+    def min_size(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Page size must be greater than 0')
+        self._min_size = value
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Page size must be greater than 0')
+        self._max_size = value
+
+    @property
+    def target_latency(self) -> float:
+        return self._target_latency
+
+    @target_latency.setter
+    def target_latency(self, value: float):
+        if value is None or value <= 0:
+            raise ParameterError('Target latency must be greater than 0')
+        self._target_latency = value
+
+    @property
+    def max_page_bytes(self) -> int:
+        return self._max_page_bytes
+
+    @max_page_bytes.setter
+    def max_page_bytes(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Max page bytes must be greater than 0')
+        self._max_page_bytes = value
+
+    @property
+    def max_timeouts(self) -> int:
+        return self._max_timeouts
+
+    @max_timeouts.setter
+    def max_timeouts(self, value: int):
+        if type(value) is not int or value < 0:
+            raise ParameterError('Max timeouts must be a positive number')
+        self._max_timeouts = value
+
+    @property
+    def size(self) -> int:
+        """Page size to request next"""
+        return self._size
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Current size, counters of pages, records, bytes, seconds, timeouts
+        and size changes, and the measured per-record cost
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result['size'] = self._size
+            result['seconds_per_record'] = self._seconds_per_record
+            result['bytes_per_record'] = self._bytes_per_record
+            result['records_per_second'] = \
+                result['records'] / result['seconds'] \
+                if result['seconds'] > 0 else 0.0
+            return result
+
+    def observe(self, requested: int, received: int, seconds: float,
+                size_bytes: int):
+        """
+        Report a finished page
+        :param requested: int: max_records of the call
+        :param received: int: Number of records returned
+        :param seconds: float: Call latency
+        :param size_bytes: int: Response size
+        """
+        with self._lock:
+            self._stats['pages'] += 1
+            self._stats['records'] += received
+            self._stats['bytes'] += size_bytes
+            self._stats['seconds'] += seconds
+            if received < 1 or seconds <= 0:
+                return
+
+            self._seconds_per_record = AdaptivePageSize._average(
+                self._seconds_per_record, seconds / received)
+            self._bytes_per_record = AdaptivePageSize._average(
+                self._bytes_per_record, size_bytes / received)
+
+            if received < requested:
+                # End of the processed records: says nothing about size
+                return
+
+            throughput = received / seconds
+            if seconds > self.target_latency:
+                self._resize(requested * self.target_latency / seconds)
+                self._plateau = False
+                self._best_throughput = 0.0
+                return
+
+            if throughput >= self._best_throughput * AdaptivePageSize._gain:
+                self._best_throughput = throughput
+                self._best_size = requested
+                self._plateau = False
+            elif throughput * AdaptivePageSize._gain < self._best_throughput \
+                    and requested > self._best_size:
+                # Bigger pages made things worse: go back to the best size
+                self._plateau = True
+                self._resize(self._best_size)
+                return
+
+            if not self._plateau:
+                self._resize(min(
+                    requested * 2,
+                    requested * self.target_latency / seconds))
+
+    def timed_out(self):
+        """Report a page that timed out"""
+        with self._lock:
+            self._stats['timeouts'] += 1
+            self._plateau = False
+            self._best_throughput = 0.0
+            self._resize(self._size / 4)
+
+    def _resize(self, size: float):
+        size = self._clamp(int(size))
+        if self._bytes_per_record:
+            size = max(self.min_size, min(size, int(
+                self.max_page_bytes / self._bytes_per_record)))
+        if size > self._size:
+            self._stats['grown'] += 1
+        elif size < self._size:
+            self._stats['shrunk'] += 1
+        self._size = size
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+
+    @staticmethod
+    def _average(current: float or None, value: float) -> float:
+        return value if current is None else current * 0.7 + value * 0.3
+
+
+class RequestHedging:
+    """
+    Hedges /getRecords calls against tail latency.
+
+    A call still running after the `quantile` of recent call latencies
+    gets a duplicate; the first successful response is returned. Pages are
+    idempotent, so both answers are the same. Duplicates are capped at
+    `budget` times the number of calls. Calls are not hedged until
+    `min_samples` latencies were measured.
+
+    Calls run on a pool of `max_workers` threads owned by the instance.
+    When all of them are busy, calls run unhedged in the calling thread.
+    The losing call cannot be interrupted by the blocking transports: it
+    keeps its worker, connection and `max_in_flight` slot until its
+    response arrives or its deadline passes, then the response is
+    discarded. Instances can be shared between clients and threads.
+    """
+
+    # Calls between recomputations of the hedging delay
+    _refresh = 16
+
+    def __init__(self, **kwargs):
+        """
+        :key quantile: float: (optional) Latency quantile after which a
+                call is hedged. 0.95 by default
+        :key budget: float: (optional) Max duplicate calls per call.
+                0.05 by default
+        :key min_samples: int: (optional) Latencies measured before
+                hedging starts. 20 by default
+        :key window: int: (optional) Number of recent latencies the
+                quantile is taken from. 1000 by default
+        :key max_workers: int: (optional) Threads running calls and their
+                duplicates. 32 by default
+        """
+        self._lock = threading.Lock()
+        self.quantile = kwargs.get('quantile', 0.95)
+        self.budget = kwargs.get('budget', 0.05)
+        self.min_samples = kwargs.get('min_samples', 20)
+        window = kwargs.get('window', 1000)
+        if type(window) is not int or window < self.min_samples:
+            raise ParameterError('Window must not be smaller than min samples')
+        self._latencies = collections.deque(maxlen=window)
+        self._delay = None
+        self._stale = 0
+        self.max_workers = kwargs.get('max_workers', 32)
+        # One call and its duplicate
+        if type(self.max_workers) is not int or self.max_workers < 2:
+            raise ParameterError('Max workers must be at least 2')
+        self._executor = None
+        self._running = 0
+        self._stats = {'calls': 0, 'hedges': 0, 'hedge_wins': 0,
+                       'primary_wins': 0, 'over_budget': 0, 'saturated': 0}
+
+    @property
+    def quantile(self) -> float:
+        return self._quantile
+
+    @quantile.setter
+    def quantile(self, value: float):
+        if not isinstance(value, (int, float)) or not 0 < value < 1:
+            raise ParameterError('Quantile must be between 0 and 1')
+        self._quantile = value
+
+    @property
+    def budget(self) -> float:
+        return self._budget
+
+    @budget.setter
+    def budget(self, value: float):
+        if not isinstance(value, (int, float)) or value < 0:
+            raise ParameterError('Budget must be a positive number')
+        self._budget = value
+
+    @property
+    def min_samples(self) -> int:
+        return self._min_samples
+
+    @min_samples.setter
+    def min_samples(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Min samples must be greater than 0')
+        self._min_samples = value
+
+    @property
+    def delay(self) -> float or None:
+        """Seconds before a call is hedged, None while warming up"""
+        with self._lock:
+            return self._current_delay()
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Calls, duplicates sent, calls won by the duplicate and by the
+        original after hedging, calls not hedged because of the budget or
+        because all workers were busy, the current delay and the share of
+        extra calls
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result['delay'] = self._current_delay()
+            result['extra_ratio'] = result['hedges'] / result['calls'] \
+                if result['calls'] else 0.0
+            return result
+
+    def call(self, function, *args):
+        """
+        Call `function(*args)`, hedged with a second call when slow
+        :return: Result of the first call to succeed
+        :raises Exception: raised by the original call when both failed
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            delay = self._current_delay()
+            saturated = delay is not None \
+                and self._running + 2 > self.max_workers
+            if saturated:
+                self._stats['saturated'] += 1
+        if delay is None or saturated:
+            # Warming up, or no worker left for a duplicate
+            started = time.monotonic()
+            try:
+                return function(*args)
+            finally:
+                self._observe(time.monotonic() - started)
+
+        primary = self._start(function, args)
+        # Not `result(delay)`: a TimeoutError of the call is not a slow call
+        if wait([primary], delay).done:
+            return primary.result()
+
+        with self._lock:
+            if self._stats['hedges'] + 1 \
+                    > self._budget * self._stats['calls']:
+                allowed, reason = False, 'over_budget'
+            elif self._running >= self.max_workers:
+                allowed, reason = False, 'saturated'
+            else:
+                allowed, reason = True, 'hedges'
+            self._stats[reason] += 1
+        if not allowed:
+            return primary.result()
+
+        hedge = self._start(function, args)
+        pending = [primary, hedge]
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in [primary, hedge]:
+                if future in done and future.exception() is None:
+                    with self._lock:
+                        self._stats['hedge_wins' if future is hedge
+                                    else 'primary_wins'] += 1
+                    return future.result()
+            pending = [future for future in pending if future not in done]
+        raise primary.exception()
+
+    def close(self):
+        """Stop the worker threads once the calls in progress are done"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _start(self, function, args: tuple) -> Future:
+        def run():
+            started = time.monotonic()
+            try:
+                return function(*args)
+            finally:
+                # Losers, failures and timeouts count as well, or the
+                # quantile would only see the fast calls
+                self._observe(time.monotonic() - started)
+                with self._lock:
+                    self._running -= 1
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers,
+                    thread_name_prefix='bulkwhoisapi-hedging')
+            self._running += 1
+            executor = self._executor
+        return executor.submit(run)
+
+    def _observe(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._stale += 1
+
+    def _current_delay(self) -> float or None:
+        """Called with the lock held"""
+        if len(self._latencies) < self._min_samples:
+            return None
+        if self._delay is None or self._stale >= RequestHedging._refresh:
+            ordered = sorted(self._latencies)
+            self._delay = ordered[min(int(len(ordered) * self._quantile),
+                                      len(ordered) - 1)]
+            self._stale = 0
+        return self._delay
+
+
+class TaggedRecord(typing.NamedTuple):
+    request_id: str
+    record: 'BulkWhoisRecord'
+
+
+class _Job:
+    """Paging state of one request"""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        # None until the first page tells
+        self.total = None
+        self.processing = True
+        # Next record to request
+        self.cursor = 1
+        # Next record to hand over, and pages that arrived ahead of it
+        self.emitted = 1
+        self.arrived = {}
+        # (start, count) of pages to request again after a timeout
+        self.retry = []
+        self.in_flight = 0
+        self.wake_at = 0.0
+        self.done = False
+
+    @property
+    def remaining(self) -> int:
+        """Records still to request, 0 while unknown"""
+        if self.total is None:
+            return 0
+        return max(0, self.total + 1 - self.cursor) + sum(
+            count for _, count in self.retry)
+
+
+class PageScheduler:
+    """
+    Fetches the records of many requests through one worker pool.
+
+    Pages are `(request_id, start_index)` tasks. A free worker takes the
+    request with the fewest pages in flight, then the one nearest
+    completion, so small requests are drained first while none of them
+    waits for a large one. Requests still being processed are polled one
+    page at a time every `interval` seconds. At most `max_in_flight`
+    pages are fetched at once, `per_request` of them for the same request.
+    """
+
+    def __init__(self, client: 'Client', request_ids, **kwargs):
+        """
+        :param request_ids: Iterable of request IDs
+        :key page_size: int or `AdaptivePageSize`: (optional) Records per
+                page. 1000 by default
+        :key max_in_flight: int: (optional) Pages fetched at once.
+                8 by default
+        :key per_request: int: (optional) Pages of one request fetched at
+                once. 2 by default
+        :key interval: float: (optional) Seconds between polls of requests
+                still being processed. 10 by default
+        """
+        from .client import Client
+
+        self.client = client
+        self._jobs = {}
+        for request_id in request_ids:
+            request_id = Client._validate_request_id(request_id)
+            self._jobs.setdefault(request_id, _Job(request_id))
+        if not self._jobs:
+            raise ParameterError('Request ID required')
+
+        page_size = kwargs.get('page_size', 1000)
+        if isinstance(page_size, AdaptivePageSize):
+            self._sizer, self._page_size = page_size, None
+        else:
+            self._sizer = None
+            self._page_size = Client._validate_max_records(page_size)
+        self.max_in_flight = PageScheduler._positive(
+            kwargs.get('max_in_flight', 8), 'Max in-flight pages')
+        self.per_request = PageScheduler._positive(
+            kwargs.get('per_request', 2), 'Pages per request')
+        self.interval = kwargs.get('interval', 10)
+        self._stats = {'pages': 0, 'records': 0, 'requests_done': 0,
+                       'polls': 0, 'max_in_flight': 0, 'timeouts': 0}
+
+    @property
+    def metrics(self) -> dict:
+        """Counters of pages, records, finished requests and polls"""
+        return dict(self._stats)
+
+    def records(self):
+        """
+        :return: Generator of `TaggedRecord`. Records of one request come
+                in index order, requests are interleaved
+        :raises ConnectionError:
+        :raises BulkWhoisApiError: a page failed, the other pages are
+                cancelled
+        """
+        in_flight = {}
+        timeouts = 0
+        with ThreadPoolExecutor(self.max_in_flight) as executor:
+            try:
+                while True:
+                    while len(in_flight) < self.max_in_flight:
+                        job = self._next_job()
+                        if job is None:
+                            break
+                        task = self._page_task(job)
+                        in_flight[executor.submit(self._fetch, *task)] = task
+                    self._stats['max_in_flight'] = max(
+                        self._stats['max_in_flight'], len(in_flight))
+
+                    if not in_flight:
+                        sleeping = [j.wake_at for j in self._jobs.values()
+                                    if not j.done]
+                        if not sleeping:
+                            return
+                        time.sleep(max(0.0, min(sleeping) - time.monotonic()))
+                        continue
+
+                    finished, _ = wait(list(in_flight), timeout=self._wait(),
+                                       return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        job, start, count = in_flight.pop(future)
+                        job.in_flight -= 1
+                        try:
+                            page = future.result()
+                        except Exception as error:
+                            if self._sizer is None or not is_timeout(error) \
+                                    or timeouts >= self._sizer.max_timeouts:
+                                raise
+                            timeouts += 1
+                            self._stats['timeouts'] += 1
+                            self._sizer.timed_out()
+                            # Again in pages of the reduced size
+                            size = self._sizer.size
+                            job.retry.extend(
+                                (n, min(size, start + count - n))
+                                for n in range(start, start + count, size))
+                            continue
+                        timeouts = 0
+                        yield from self._page_done(job, start, count, page)
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+    def _next_job(self) -> _Job or None:
+        now = time.monotonic()
+        best = None
+        for job in self._jobs.values():
+            if job.done or job.wake_at > now:
+                continue
+            if job.processing or job.total is None:
+                # Unknown or growing: one page at a time
+                if job.in_flight:
+                    continue
+            elif job.in_flight >= self.per_request or job.remaining == 0:
+                continue
+            if best is None or (job.in_flight, job.remaining) < \
+                    (best.in_flight, best.remaining):
+                best = job
+        return best
+
+    def _page_task(self, job: _Job) -> tuple:
+        job.in_flight += 1
+        if job.retry:
+            start, count = job.retry.pop(0)
+            return job, start, count
+
+        count = self._sizer.size if self._sizer is not None \
+            else self._page_size
+        if job.total is not None and not job.processing:
+            count = min(count, job.remaining)
+        start = job.cursor
+        job.cursor += count
+        return job, start, count
+
+    def _fetch(self, job: _Job, start: int, count: int):
+        started = time.monotonic()
+        response = self.client.get_records_raw(
+            request_id=job.request_id, max_records=count, start_index=start)
+        page = self.client._parse_records(response)
+        if self._sizer is not None:
+            self._sizer.observe(count, len(page.whois_records),
+                                time.monotonic() - started,
+                                byte_size(response))
+        return page
+
+    def _page_done(self, job: _Job, start: int, count: int, page):
+        received = len(page.whois_records)
+        self._stats['pages'] += 1
+        job.total = page.total_records if job.total is None \
+            else min(job.total, page.total_records)
+        job.processing = page.records_left > 0
+
+        if received < count:
+            job.cursor = min(job.cursor, start + received)
+            if job.processing:
+                # Not processed yet: request the rest again later
+                job.wake_at = time.monotonic() + self.interval
+                self._stats['polls'] += 1
+            else:
+                # Nothing left to process: the request holds fewer
+                # records than announced, asking again returns the same
+                job.total = min(job.total, start + received - 1)
+        job.arrived[start] = page.whois_records
+
+        while job.emitted in job.arrived:
+            records = job.arrived.pop(job.emitted)
+            yield from self._emit(job, records)
+            if not records:
+                break
+
+        if not job.processing and not job.in_flight and not job.remaining:
+            # Pages left behind a gap, e.g. the request shrank
+            for start in sorted(job.arrived):
+                yield from self._emit(job, job.arrived.pop(start))
+            job.done = True
+            self._stats['requests_done'] += 1
+
+    def _emit(self, job: _Job, records: list):
+        job.emitted += len(records)
+        self._stats['records'] += len(records)
+        for record in records:
+            yield TaggedRecord(job.request_id, record)
+
+    def _wait(self) -> float or None:
+        now = time.monotonic()
+        sleeping = [j.wake_at - now for j in self._jobs.values()
+                    if not j.done and j.wake_at > now]
+        return max(0.0, min(sleeping)) if sleeping else None
+
+    @staticmethod
+    def _positive(value: int, name: str) -> int:
+        if type(value) is not int or value < 1:
+            raise ParameterError('{} must be greater than 0'.format(name))
+        return value
+
+
+def byte_size(response: str or bytes) -> int:
+    """Size of a response in bytes, as received"""
+    if isinstance(response, bytes) or response.isascii():
+        return len(response)
+    return len(response.encode('UTF-8'))
+
+
+def is_timeout(error: BaseException) -> bool:
+    """Whether an exception raised by an API call is a timeout"""
+    if isinstance(error, TimeoutError):
+        return True
+    try:
+        from requests.exceptions import Timeout
+    except ImportError:
+        return False
+    return isinstance(error, Timeout)
@@ -0,0 +1,346 @@
+"""
+Producer/consumer pipeline for draining requests into slow consumers.
+
+Pages flow fetch -> parse -> sink through queues bounded in bytes. When the
+sink falls behind, the queues fill up and the fetchers block, so memory
+stays bounded by the queue sizes plus one page per worker, however fast
+the network is.
+"""
+
+import threading
+import time
+import typing
+
+from .exceptions.error import ParameterError
+from .paging import byte_size
+
+if typing.TYPE_CHECKING:
+    from .client import Client
+
+
+class QueueClosed(Exception):
+    """The queue is closed and drained, or was aborted"""
+
+
+class ByteBoundedQueue:
+    """
+    Thread-safe FIFO queue bounded by the total size of its items.
+    `put` blocks while the item does not fit. An item larger than the
+    whole queue is still admitted once the queue is empty, so it cannot
+    block forever.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param max_bytes: int: Max total size of queued items
+        """
+        if type(max_bytes) is not int or max_bytes < 1:
+            raise ParameterError('Queue size must be greater than 0')
+        self.max_bytes = max_bytes
+        self._condition = threading.Condition()
+        self._items = []
+        self._head = 0
+        self._bytes = 0
+        self._closed = False
+        self._aborted = False
+        self._stats = {'puts': 0, 'peak_items': 0, 'peak_bytes': 0,
+                       'put_wait_seconds': 0.0, 'get_wait_seconds': 0.0}
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._items) - self._head
+
+    @property
+    def size_bytes(self) -> int:
+        with self._condition:
+            return self._bytes
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Current and peak depth in items and bytes, and the seconds
+        producers waited for space (backpressure) and consumers for items
+        """
+        with self._condition:
+            result = dict(self._stats)
+            result['items'] = len(self._items) - self._head
+            result['bytes'] = self._bytes
+            result['max_bytes'] = self.max_bytes
+            return result
+
+    def put(self, item, size: int):
+        """
+        :param size: int: Size of the item in bytes
+        :raises QueueClosed:
+        """
+        with self._condition:
+            if self._bytes + size > self.max_bytes and self._bytes:
+                started = time.monotonic()
+                while self._bytes + size > self.max_bytes and self._bytes \
+                        and not self._closed:
+                    self._condition.wait()
+                self._stats['put_wait_seconds'] += \
+                    time.monotonic() - started
+            if self._closed:
+                raise QueueClosed()
+            self._items.append((item, size))
+            self._bytes += size
+            self._stats['puts'] += 1
+            depth = len(self._items) - self._head
+            if depth > self._stats['peak_items']:
+                self._stats['peak_items'] = depth
+            if self._bytes > self._stats['peak_bytes']:
+                self._stats['peak_bytes'] = self._bytes
+            self._condition.notify_all()
+
+    def get(self):
+        """
+        :raises QueueClosed: closed and drained, or aborted
+        """
+        with self._condition:
+            if self._head == len(self._items) and not self._closed:
+                started = time.monotonic()
+                while self._head == len(self._items) and not self._closed:
+                    self._condition.wait()
+                self._stats['get_wait_seconds'] += \
+                    time.monotonic() - started
+            if self._aborted or self._head == len(self._items):
+                raise QueueClosed()
+            item, size = self._items[self._head]
+            self._items[self._head] = None
+            self._head += 1
+            if self._head > 1024 and self._head * 2 > len(self._items):
+                del self._items[:self._head]
+                self._head = 0
+            self._bytes -= size
+            self._condition.notify_all()
+            return item
+
+    def close(self):
+        """No more items: consumers drain the queue, then get QueueClosed"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self):
+        """Drop queued items and wake all producers and consumers"""
+        with self._condition:
+            self._closed = self._aborted = True
+            self._items, self._head, self._bytes = [], 0, 0
+            self._condition.notify_all()
+
+
+class _Stage:
+    """Worker threads of one pipeline stage"""
+
+    def __init__(self, name: str, workers: int):
+        if type(workers) is not int or workers < 1:
+            raise ParameterError(
+                'Number of {} workers must be greater than 0'.format(name))
+        self.name = name
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.running = workers
+        self.stats = {'items': 0, 'busy_seconds': 0.0}
+
+    def count(self, started: float):
+        with self.lock:
+            self.stats['items'] += 1
+            self.stats['busy_seconds'] += time.monotonic() - started
+
+    def finished(self) -> bool:
+        """Whether the calling worker was the last one running"""
+        with self.lock:
+            self.running -= 1
+            return self.running == 0
+
+
+class RecordPipeline:
+    """
+    Drains the processed records of a request into `sink` through three
+    stages, each with its own number of threads:
+
+    - fetch: /getRecords calls, raw responses go to the raw queue
+    - parse: raw responses to `BulkWhoisRecord` lists, to the parsed queue
+    - sink: your callable, e.g. a database writer
+
+    Queue items are weighted by the size of the raw response. Pages of one
+    request may reach the sink out of order, records carry their index.
+    """
+
+    def __init__(self, client: 'Client', request_id: str, sink, **kwargs):
+        """
+        :param sink: Callable taking a list of records. Called from the
+                sink threads
+        :key page_size: int: (optional) Records per call. 1000 by default
+        :key fetch_workers: int: (optional) 4 by default
+        :key parse_workers: int: (optional) 1 by default
+        :key sink_workers: int: (optional) 1 by default
+        :key raw_queue_bytes: int: (optional) 32 MiB by default
+        :key parsed_queue_bytes: int: (optional) 32 MiB by default
+        :key parse: (optional) Callable turning a raw JSON response into
+                the list handed to the sink. `BulkWhoisRecord` models by
+                default
+        """
+        from .client import Client
+
+        self.client = client
+        self.request_id = Client._validate_request_id(request_id)
+        self.sink = sink
+        self.page_size = Client._validate_max_records(
+            kwargs.get('page_size', 1000))
+        self.parse = kwargs.get('parse') or RecordPipeline._records
+        self.raw_queue = ByteBoundedQueue(
+            kwargs.get('raw_queue_bytes', 32 * 2 ** 20))
+        self.parsed_queue = ByteBoundedQueue(
+            kwargs.get('parsed_queue_bytes', 32 * 2 ** 20))
+        self._stages = [
+            _Stage('fetch', kwargs.get('fetch_workers', 4)),
+            _Stage('parse', kwargs.get('parse_workers', 1)),
+            _Stage('sink', kwargs.get('sink_workers', 1)),
+        ]
+
+        self._lock = threading.Lock()
+        self._next_start = 1
+        self._total = None
+        self._first_page = threading.Event()
+        self._error = None
+        self._records = 0
+        self._started = None
+        self._elapsed = 0.0
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Per stage items and busy seconds, per queue depth and wait times,
+        records delivered and elapsed seconds
+        """
+        result = {stage.name: dict(stage.stats, workers=stage.workers)
+                  for stage in self._stages}
+        result['raw_queue'] = self.raw_queue.metrics
+        result['parsed_queue'] = self.parsed_queue.metrics
+        result['records'] = self._records
+        result['seconds'] = self._elapsed if self._started is None \
+            else time.monotonic() - self._started
+        return result
+
+    def run(self) -> dict:
+        """
+        Fetch, parse and sink all processed records, blocking until done
+        :return: `metrics`
+        :raises ConnectionError:
+        :raises BulkWhoisApiError: a stage failed, the others were stopped
+        :raises Exception: raised by the sink
+        """
+        fetch, parse, sink = self._stages
+        self._started = time.monotonic()
+        threads = [
+            threading.Thread(target=self._worker, args=(stage, target),
+                             name='bulkwhoisapi-' + stage.name, daemon=True)
+            for stage, target in [(fetch, self._fetch), (parse, self._parse),
+                                  (sink, self._sink)]
+            for _ in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._elapsed = time.monotonic() - self._started
+        self._started = None
+
+        if self._error is not None:
+            raise self._error
+        return self.metrics
+
+    def _worker(self, stage: _Stage, target):
+        try:
+            target(stage)
+        except QueueClosed:
+            pass
+        except BaseException as error:
+            with self._lock:
+                if self._error is None:
+                    self._error = error
+            self._first_page.set()
+            self.raw_queue.abort()
+            self.parsed_queue.abort()
+            return
+        if stage.finished():
+            # The next stage drains its queue and stops
+            if stage.name == 'fetch':
+                self.raw_queue.close()
+            elif stage.name == 'parse':
+                self.parsed_queue.close()
+
+    def _claim(self) -> int or None:
+        """Start index of the next page to fetch, None when done"""
+        with self._lock:
+            # Checked before every call: nothing is fetched after a failure
+            if self._error is not None:
+                return None
+            first = self._next_start == 1
+            if first:
+                self._next_start += self.page_size
+                return 1
+        self._first_page.wait()
+        with self._lock:
+            # No total: the first page failed
+            if self._error is not None or self._total is None \
+                    or self._next_start > self._total:
+                return None
+            start = self._next_start
+            self._next_start += self.page_size
+            return start
+
+    def _fetch(self, stage: _Stage):
+        while True:
+            start = self._claim()
+            if start is None:
+                return
+            started = time.monotonic()
+            values = None
+            try:
+                response = self.client.get_records_raw(
+                    request_id=self.request_id,
+                    max_records=self.page_size,
+                    start_index=start,
+                    output_format='json'
+                )
+                if start == 1:
+                    # Decoded once, the parse stage builds the models
+                    values = self.client._decode_records(response)
+                    with self._lock:
+                        self._total = int(values.get('totalRecords') or 0) \
+                            - int(values.get('recordsLeft') or 0)
+            finally:
+                if start == 1:
+                    self._first_page.set()
+            stage.count(started)
+            size = byte_size(response)
+            self.raw_queue.put((response, values, size), size)
+
+    def _parse(self, stage: _Stage):
+        while True:
+            response, values, size = self.raw_queue.get()
+            started = time.monotonic()
+            if values is not None and self.parse is RecordPipeline._records:
+                from .models.response import ResponseRecords
+                records = ResponseRecords(values).whois_records
+            else:
+                records = self.parse(response)
+            stage.count(started)
+            self.parsed_queue.put(records, size)
+
+    def _sink(self, stage: _Stage):
+        while True:
+            records = self.parsed_queue.get()
+            started = time.monotonic()
+            self.sink(records)
+            stage.count(started)
+            with self._lock:
+                self._records += len(records)
+
+    @staticmethod
+    def _records(response: str) -> list:
+        from .client import Client
+        return Client._parse_records(response).whois_records
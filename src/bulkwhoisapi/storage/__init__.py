@@ -0,0 +1,4 @@
+__all__ = ['DownloadIndex', 'RecordStore', 'StoredRecord', 'StoredRequest']
+
+from .index import DownloadIndex
+from .sqlite import RecordStore, StoredRecord, StoredRequest
@@ -0,0 +1,319 @@
+"""
+Sidecar domain index for downloaded result files.
+"""
+
+from hashlib import sha256
+
+import bisect
+import csv
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+from ..exceptions.error import FileError, ParameterError
+
+
+# magic, source size, entry count, strings size, fingerprint
+_HEADER = struct.Struct('<8sQQQ32s')
+# key offset, key length, row offset
+_ENTRY = struct.Struct('<QHQ')
+_MAGIC = b'BWIDX\x00\x01\x00'
+_FINGERPRINT_BYTES = 4096
+
+
+class _Keys:
+    """Sequence view of the sorted keys of a mapped index for bisect"""
+
+    def __init__(self, index: mmap.mmap, count: int, strings: int):
+        self._index = index
+        self._count = count
+        self._strings = strings
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        key_offset, key_length, _ = self.entry(i)
+        start = self._strings + key_offset
+        return self._index[start:start + key_length]
+
+    def entry(self, i: int) -> tuple:
+        return _ENTRY.unpack_from(self._index, _HEADER.size + i * _ENTRY.size)
+
+
+class DownloadIndex:
+    """
+    Sorted domain -> byte offset index of a /download CSV file.
+
+    The index lives next to the file (records.csv.idx) and both are
+    memory-mapped, so lookups and range queries are a binary search over
+    the mapping instead of a scan of the file. When the file has only been
+    appended to, `update` scans the new rows only.
+    """
+
+    SUFFIX = '.idx'
+
+    def __init__(self, path: str, **kwargs):
+        """
+        :param path: str or path-like: CSV file
+        :key index_path: str: (optional) Index file. path + SUFFIX by default
+        :key column: str: (optional) Indexed column. domainName by default
+        """
+        self._path = os.fspath(path)
+        self._index_path = kwargs.get('index_path') or \
+            self._path + DownloadIndex.SUFFIX
+        self._column = kwargs.get('column', 'domainName')
+        self._file = None
+        self._data = None
+        self._index_file = None
+        self._index = None
+        self._keys = None
+        self._columns = []
+        self._indexed_size = 0
+
+        self.update()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._keys) if self._keys is not None else 0
+
+    def __contains__(self, domain: str) -> bool:
+        return bool(self.offsets(domain))
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def index_path(self) -> str:
+        return self._index_path
+
+    @property
+    def columns(self) -> list:
+        """Column names from the header line"""
+        return list(self._columns)
+
+    @property
+    def indexed_size(self) -> int:
+        """Bytes of the file covered by the index"""
+        return self._indexed_size
+
+    def update(self) -> int:
+        """
+        Bring the index up to date with the file. Only rows appended since
+        the last update are scanned, the index is rebuilt from scratch if
+        the file has been rewritten
+        :return: int: Number of rows added to the index
+        """
+        try:
+            size = os.path.getsize(self._path)
+        except OSError:
+            raise FileError('Cannot open download file')
+
+        self.close()
+        self._map_file(size)
+
+        entries, start = [], 0
+        header = self._read_index_header()
+        if header is not None:
+            indexed, count, strings, fingerprint = header
+            if indexed <= size and \
+                    fingerprint == self._fingerprint(indexed):
+                if indexed == size:
+                    self._map_index()
+                    return 0
+                entries, start = self._read_entries(count, strings), indexed
+
+        added, end = self._scan(start)
+        if start and not added and end == start:
+            self._map_index()
+            return 0
+        added.sort()
+        self._write(list(heapq.merge(entries, added)), end)
+        self._map_index()
+        return len(added)
+
+    def offsets(self, domain: str) -> list:
+        """
+        :return: [int]: Byte offsets of the rows of a domain, in file order
+        """
+        if self._keys is None or not domain:
+            return []
+        key = domain.strip().lower().encode('UTF-8')
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_right(self._keys, key, lo)
+        return [self._keys.entry(i)[2] for i in range(lo, hi)]
+
+    def get(self, domain: str) -> list:
+        """
+        :return: [dict]: Rows of a domain as {column: value} dicts
+        """
+        return [self.row_at(offset) for offset in self.offsets(domain)]
+
+    def range(self, start: str = None, stop: str = None):
+        """
+        Rows with start <= domain < stop in domain order
+        :return: Generator of (domain, {column: value}) tuples
+        """
+        if self._keys is None:
+            return
+        lo = 0 if start is None else bisect.bisect_left(
+            self._keys, start.lower().encode('UTF-8'))
+        hi = len(self._keys) if stop is None else bisect.bisect_left(
+            self._keys, stop.lower().encode('UTF-8'), lo)
+        for i in range(lo, hi):
+            yield self._keys[i].decode('UTF-8'), \
+                self.row_at(self._keys.entry(i)[2])
+
+    def row_at(self, offset: int) -> dict:
+        """
+        :return: dict: The row starting at a byte offset of the file
+        """
+        if self._data is None or not 0 <= offset < self._indexed_size:
+            raise ParameterError('Offset is outside of the indexed file')
+        end = DownloadIndex._record_end(self._data, offset, self._indexed_size)
+        values = next(csv.reader(
+            [self._data[offset:end].decode('UTF-8').rstrip('\r\n')]), [])
+        return dict(zip(self._columns, values))
+
+    def close(self):
+        for name in ('_index', '_index_file', '_data', '_file'):
+            resource = getattr(self, name)
+            if hasattr(resource, 'close'):
+                resource.close()
+            setattr(self, name, None)
+        self._keys = None
+
+    def _map_file(self, size: int):
+        self._file = open(self._path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0,
+                               access=mmap.ACCESS_READ) if size else b''
+
+    def _map_index(self):
+        self._index_file = open(self._index_path, 'rb')
+        self._index = mmap.mmap(self._index_file.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+        _, indexed, count, _, _ = _HEADER.unpack_from(self._index)
+        self._keys = _Keys(self._index, count,
+                           _HEADER.size + count * _ENTRY.size)
+        self._indexed_size = indexed
+        self._columns = self._header_columns(indexed)
+
+    def _read_index_header(self) -> tuple or None:
+        try:
+            with open(self._index_path, 'rb') as f:
+                data = f.read(_HEADER.size)
+        except OSError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, indexed, count, strings, fingerprint = _HEADER.unpack(data)
+        if magic != _MAGIC:
+            return None
+        return indexed, count, strings, fingerprint
+
+    def _read_entries(self, count: int, strings: int) -> list:
+        with open(self._index_path, 'rb') as f:
+            f.seek(_HEADER.size)
+            table = f.read(count * _ENTRY.size)
+            blob = f.read(strings)
+        return [(blob[k:k + n], row) for k, n, row in
+                _ENTRY.iter_unpack(table)]
+
+    def _fingerprint(self, size: int) -> bytes:
+        head = self._data[:min(size, _FINGERPRINT_BYTES)]
+        tail = self._data[max(0, size - _FINGERPRINT_BYTES):size]
+        return sha256(head + tail + str(size).encode()).digest()
+
+    def _header_columns(self, size: int) -> list:
+        if not size:
+            return []
+        end = DownloadIndex._record_end(self._data, 0, size)
+        return next(csv.reader(
+            [self._data[:end].decode('UTF-8').rstrip('\r\n')]), [])
+
+    def _scan(self, start: int) -> tuple:
+        """
+        Read complete rows from a byte offset on
+        :return: ([(key, offset)], end of the last complete row)
+        """
+        data, size = self._data, len(self._data)
+        pos = start
+        if pos == 0:
+            if not size:
+                return [], 0
+            pos = DownloadIndex._record_end(data, 0, size)
+            if pos > size or data[pos - 1:pos] != b'\n':
+                return [], 0
+        self._columns = self._header_columns(pos)
+
+        try:
+            column = self._columns.index(self._column)
+        except ValueError:
+            raise FileError('Column {} not found in download file'.format(
+                self._column))
+
+        entries = []
+        while pos < size:
+            end = DownloadIndex._record_end(data, pos, size)
+            if data[end - 1:end] != b'\n':
+                # A row still being written
+                break
+            line = data[pos:end]
+            if b'"' in line:
+                values = next(csv.reader(
+                    [line.decode('UTF-8').rstrip('\r\n')]), [])
+                value = values[column] if column < len(values) else ''
+            else:
+                values = line.rstrip(b'\r\n').split(b',', column + 1)
+                value = values[column].decode('UTF-8') \
+                    if column < len(values) else ''
+            key = value.strip().lower().encode('UTF-8')
+            if key and len(key) <= 0xFFFF:
+                entries.append((key, pos))
+            pos = end
+        return entries, pos
+
+    def _write(self, entries: list, indexed: int):
+        table, blob, size = [], [], 0
+        for key, row in entries:
+            table.append(_ENTRY.pack(size, len(key), row))
+            blob.append(key)
+            size += len(key)
+
+        directory = os.path.dirname(os.path.abspath(self._index_path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, indexed, len(entries), size,
+                                     self._fingerprint(indexed)))
+                f.writelines(table)
+                f.writelines(blob)
+            os.replace(tmp, self._index_path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise FileError('Cannot write index file')
+
+    @staticmethod
+    def _record_end(data, start: int, size: int) -> int:
+        """End of the CSV record at start, after its line break"""
+        pos = start
+        quotes = 0
+        while True:
+            newline = data.find(b'\n', pos, size)
+            if newline < 0:
+                return size
+            quotes += data[pos:newline].count(b'"')
+            pos = newline + 1
+            if quotes % 2 == 0:
+                return pos
@@ -0,0 +1,331 @@
+import datetime
+import itertools
+import sqlite3
+import sys
+
+from ..exceptions.error import ParameterError
+from ..models.fields import datetime2epoch, datetime2epoch_ms, first_set, \
+    name_servers
+from ..models.response import BaseModel, BulkWhoisRecord, ResponseRecords, \
+    ResponseRequests
+
+if sys.version_info < (3, 9):
+    import typing
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS requests (
+    request_id TEXT PRIMARY KEY,
+    time_ms INTEGER,
+    status TEXT,
+    total_records INTEGER,
+    fetched_records INTEGER
+);
+CREATE TABLE IF NOT EXISTS records (
+    request_id TEXT NOT NULL,
+    record_index INTEGER NOT NULL,
+    domain_name TEXT NOT NULL,
+    domain_status TEXT,
+    whois_record_status INTEGER,
+    fetched_time_ms INTEGER,
+    registrar_name TEXT,
+    name_servers TEXT,
+    status TEXT,
+    created_date INTEGER,
+    updated_date INTEGER,
+    expires_date INTEGER,
+    PRIMARY KEY (request_id, record_index)
+);
+CREATE INDEX IF NOT EXISTS idx_records_domain ON records (domain_name);
+CREATE INDEX IF NOT EXISTS idx_records_request ON records (request_id);
+CREATE INDEX IF NOT EXISTS idx_records_expires ON records (expires_date);
+CREATE INDEX IF NOT EXISTS idx_records_status ON records (domain_status);
+CREATE INDEX IF NOT EXISTS idx_requests_status ON requests (status);
+CREATE INDEX IF NOT EXISTS idx_requests_time ON requests (time_ms);
+'''
+
+_RECORD_COLUMNS = (
+    'request_id', 'record_index', 'domain_name', 'domain_status',
+    'whois_record_status', 'fetched_time_ms', 'registrar_name',
+    'name_servers', 'status', 'created_date', 'updated_date', 'expires_date'
+)
+
+_REQUEST_COLUMNS = (
+    'request_id', 'time_ms', 'status', 'total_records', 'fetched_records'
+)
+
+_INSERT_RECORD = 'INSERT OR REPLACE INTO records ({}) VALUES ({})'.format(
+    ', '.join(_RECORD_COLUMNS), ', '.join('?' * len(_RECORD_COLUMNS)))
+
+_INSERT_REQUEST = 'INSERT OR REPLACE INTO requests ({}) VALUES ({})'.format(
+    ', '.join(_REQUEST_COLUMNS), ', '.join('?' * len(_REQUEST_COLUMNS)))
+
+
+def _epoch2datetime(value: int or None, scale: int = 1) \
+        -> datetime.datetime or None:
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(
+        value / scale, tz=datetime.timezone.utc)
+
+
+def _record_row(request_id: str, record: BulkWhoisRecord) -> tuple:
+    whois_record = record.whois_record
+    return (
+        request_id,
+        record.index,
+        record.domain_name.lower(),
+        record.domain_status,
+        record.whois_record_status,
+        datetime2epoch_ms(record.domain_fetched_time),
+        first_set(whois_record, 'registrar_name'),
+        ','.join(name_servers(whois_record)),
+        first_set(whois_record, 'status'),
+        datetime2epoch(first_set(whois_record, 'created_date')),
+        datetime2epoch(first_set(whois_record, 'updated_date')),
+        datetime2epoch(first_set(whois_record, 'expires_date')),
+    )
+
+
+class StoredRequest(BaseModel):
+    request_id: str
+    time: datetime.datetime or None
+    status: str
+    total_records: int
+    fetched_records: int
+
+    def __init__(self, row: sqlite3.Row):
+        super().__init__()
+        self.request_id = row['request_id']
+        self.time = _epoch2datetime(row['time_ms'], 1000)
+        self.status = row['status'] or ''
+        self.total_records = row['total_records'] or 0
+        self.fetched_records = row['fetched_records'] or 0
+
+
+class StoredRecord(BaseModel):
+    request_id: str
+    index: int
+    domain_name: str
+    domain_status: str
+    whois_record_status: int
+    domain_fetched_time: datetime.datetime or None
+    registrar_name: str
+    status: str
+    created_date: datetime.datetime or None
+    updated_date: datetime.datetime or None
+    expires_date: datetime.datetime or None
+
+    if sys.version_info < (3, 9):
+        name_servers: typing.List[str]
+    else:
+        name_servers: [str]
+
+    def __init__(self, row: sqlite3.Row):
+        super().__init__()
+        self.request_id = row['request_id']
+        self.index = row['record_index']
+        self.domain_name = row['domain_name']
+        self.domain_status = row['domain_status'] or ''
+        self.whois_record_status = row['whois_record_status']
+        self.domain_fetched_time = \
+            _epoch2datetime(row['fetched_time_ms'], 1000)
+        self.registrar_name = row['registrar_name'] or ''
+        self.name_servers = \
+            row['name_servers'].split(',') if row['name_servers'] else []
+        self.status = row['status'] or ''
+        self.created_date = _epoch2datetime(row['created_date'])
+        self.updated_date = _epoch2datetime(row['updated_date'])
+        self.expires_date = _epoch2datetime(row['expires_date'])
+
+
+class RecordStore:
+    """
+    Local SQLite store for bulk requests and their WHOIS records.
+
+    Pages returned by `Client.get_records` and `Client.get_requests` are
+    ingested in batches and can be queried afterwards without calling the
+    API again.
+    """
+
+    _batch_size: int
+
+    def __init__(self, path: str = ':memory:', **kwargs):
+        """
+        :param path: str: Database file name. In-memory database by default
+        :key batch_size: int: (optional) Rows per `executemany` call
+        """
+        self.batch_size = 1000
+
+        if 'batch_size' in kwargs:
+            self.batch_size = kwargs['batch_size']
+
+        self._connection = sqlite3.connect(path)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, value: int):
+        if type(value) is not int or value < 1:
+            raise ParameterError('Batch size must be greater than 0')
+        self._batch_size = value
+
+    def close(self):
+        self._connection.close()
+
+    def add_records(self, records, request_id: str = None) -> int:
+        """
+        Store WHOIS records of a request
+        :param records: `ResponseRecords` page or an iterable of
+                `BulkWhoisRecord`
+        :param request_id: str: Required unless `records` is
+                a `ResponseRecords` instance
+        :return: int: Number of stored records
+        :raises ParameterError: request ID is missing
+        """
+        if isinstance(records, ResponseRecords):
+            request_id = request_id or records.request_id
+            records = records.whois_records
+
+        if not request_id:
+            raise ParameterError('Request ID required')
+
+        return self._insert(
+            _INSERT_RECORD, (_record_row(request_id, r) for r in records))
+
+    def add_requests(self, requests) -> int:
+        """
+        Store bulk requests
+        :param requests: `ResponseRequests` or an iterable of `BulkRequest`
+        :return: int: Number of stored requests
+        """
+        if isinstance(requests, ResponseRequests):
+            requests = requests.user_requests
+
+        return self._insert(_INSERT_REQUEST, (
+            (r.request_id, datetime2epoch_ms(r.time), r.status,
+             r.total_records, r.fetched_records)
+            for r in requests
+        ))
+
+    def get_requests(self, status: str = None, limit: int = None) -> list:
+        """
+        List stored requests, newest first
+        :param status: str: (optional) Only requests with this status
+        :param limit: int: (optional) Max number of requests to return
+        :return: [StoredRequest]
+        """
+        query = 'SELECT * FROM requests'
+        params = []
+        if status is not None:
+            query += ' WHERE status = ?'
+            params.append(status)
+        query += ' ORDER BY time_ms DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        return [StoredRequest(row)
+                for row in self._connection.execute(query, params)]
+
+    def iter_records(self, request_id: str):
+        """
+        Iterate over stored records of a request in index order
+        :param request_id: str: Request ID
+        :return: Generator of `StoredRecord`
+        """
+        cursor = self._connection.execute(
+            'SELECT * FROM records WHERE request_id = ? '
+            'ORDER BY record_index', (request_id,))
+        for row in cursor:
+            yield StoredRecord(row)
+
+    def get_record(self, request_id: str, domain_name: str) \
+            -> StoredRecord or None:
+        """
+        Stored record of a domain in one request
+        :return: `StoredRecord`, None if not stored
+        """
+        row = self._connection.execute(
+            'SELECT * FROM records WHERE domain_name = ? AND request_id = ? '
+            'LIMIT 1', (domain_name.lower(), request_id)).fetchone()
+        return None if row is None else StoredRecord(row)
+
+    def domain_history(self, domain_name: str) -> list:
+        """
+        All stored records of a domain, oldest request first
+        :param domain_name: str: Domain name
+        :return: [StoredRecord]
+        """
+        cursor = self._connection.execute(
+            'SELECT records.* FROM records '
+            'LEFT JOIN requests USING (request_id) '
+            'WHERE domain_name = ? '
+            'ORDER BY requests.time_ms, records.fetched_time_ms',
+            (domain_name.lower(),))
+        return [StoredRecord(row) for row in cursor]
+
+    def expiring(self, within: datetime.timedelta,
+                 last_requests: int = None,
+                 now: datetime.datetime = None) -> list:
+        """
+        Domains expiring within the given period, by their latest record:
+        a domain renewed since an older request is not listed
+        :param within: datetime.timedelta: Period starting from `now`
+        :param last_requests: int: (optional) Only look at the N most recent
+                requests
+        :param now: datetime.datetime: (optional) Start of the period.
+                Current time by default
+        :return: [StoredRecord], one per domain, ordered by expiration date
+        """
+        start = datetime2epoch(
+            now or datetime.datetime.now(datetime.timezone.utc))
+        end = start + int(within.total_seconds())
+
+        in_requests = ''
+        if last_requests is not None:
+            in_requests = ' AND request_id IN (SELECT request_id ' \
+                          'FROM requests ORDER BY time_ms DESC LIMIT ?)'
+        # All records of the candidate domains, latest first per domain
+        query = 'SELECT records.* FROM records ' \
+                'LEFT JOIN requests USING (request_id) ' \
+                'WHERE domain_name IN (SELECT domain_name FROM records ' \
+                'WHERE expires_date BETWEEN ? AND ?' + in_requests + ')' + \
+                in_requests + ' ORDER BY domain_name, ' \
+                'requests.time_ms DESC, records.fetched_time_ms DESC, ' \
+                'records.rowid DESC'
+        params = [start, end]
+        if last_requests is not None:
+            params += [last_requests, last_requests]
+
+        latest = {}
+        for row in self._connection.execute(query, params):
+            if row['domain_name'] not in latest:
+                latest[row['domain_name']] = row
+        return sorted(
+            (StoredRecord(row) for row in latest.values()
+             if row['expires_date'] is not None
+             and start <= row['expires_date'] <= end),
+            key=lambda record: (record.expires_date, record.domain_name))
+
+    def _insert(self, statement: str, rows) -> int:
+        count = 0
+        rows = iter(rows)
+        with self._connection:
+            while True:
+                batch = list(itertools.islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self._connection.executemany(statement, batch)
+                count += len(batch)
+        return count
@@ -0,0 +1,352 @@
+"""
+Prioritized submission of domains to /bulkWhois under a credit budget.
+
+Lookups wait in a priority queue. Urgent ones, by priority or because
+their deadline is near, go out at once in small batches. Everything else
+is collected into large batches that use the credits left over. Every
+valid domain of a request costs one credit, spent credits count against
+the budget for one hour.
+"""
+
+from concurrent.futures import Future
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+import typing
+
+from .exceptions.error import ParameterError
+
+if typing.TYPE_CHECKING:
+    from .client import Client
+
+
+class Submitted(typing.NamedTuple):
+    # Requests holding the domains of one `submit` call
+    request_ids: typing.List[str]
+    invalid_domains: typing.List[str]
+
+
+class _Entry:
+    """Domains of one `submit` call still waiting"""
+
+    def __init__(self, domains: list, priority: int, deadline: float or None,
+                 queued_at: float):
+        self.domains = domains
+        self.offset = 0
+        self.priority = priority
+        self.deadline = deadline
+        self.queued_at = queued_at
+        # Domains taken but not yet confirmed by the server
+        self.sending = 0
+        self.future = Future()
+        self.request_ids = []
+        self.invalid_domains = []
+
+    @property
+    def waiting(self) -> int:
+        return len(self.domains) - self.offset
+
+
+class SubmissionScheduler:
+    """
+    Batches lookups of many callers into /bulkWhois requests, by priority
+    and deadline, without spending more than `credits_per_hour`.
+    """
+
+    WINDOW = 3600
+
+    def __init__(self, client: 'Client', credits_per_hour: int, **kwargs):
+        """
+        :param credits_per_hour: Max valid domains submitted in any hour
+        :key urgent_priority: int: (optional) Lookups with this priority
+                or higher are urgent. 10 by default
+        :key urgent_batch: int: (optional) Max domains per urgent request.
+                100 by default
+        :key batch_size: int: (optional) Domains per bulk request.
+                10000 or `client.max_domains` if lower by default
+        :key batch_window: float: (optional) Seconds a bulk lookup waits
+                for a full batch. Lookups due within this time are urgent.
+                5 by default
+        :key reserve: int: (optional) Credits bulk requests leave for
+                urgent lookups. 0 by default
+        :key include_existing: bool: (optional) Count requests created in
+                the last hour, listed by /getUserRequests, against the
+                budget. True by default
+        """
+        self.client = client
+        self.credits_per_hour = SubmissionScheduler._positive(
+            'Credits per hour', credits_per_hour)
+        self.urgent_priority = kwargs.get('urgent_priority', 10)
+        self.urgent_batch = SubmissionScheduler._positive(
+            'Urgent batch', kwargs.get('urgent_batch', 100))
+        self.batch_size = SubmissionScheduler._positive(
+            'Batch size',
+            kwargs.get('batch_size', min(10000, client.max_domains)))
+        self.batch_window = kwargs.get('batch_window', 5)
+        if not isinstance(self.batch_window, (int, float)) \
+                or self.batch_window < 0:
+            raise ParameterError('Batch window must be a positive number')
+        self.reserve = kwargs.get('reserve', 0)
+        if type(self.reserve) is not int or self.reserve < 0 \
+                or self.reserve >= self.credits_per_hour:
+            raise ParameterError(
+                'Reserve must be between 0 and credits per hour')
+        self.include_existing = kwargs.get('include_existing', True)
+
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._queued = 0
+        # (time.time(), credits), oldest first
+        self._charges = collections.deque()
+        self._closed = False
+        self._thread = None
+        self._stats = {'requests': 0, 'urgent_requests': 0, 'domains': 0,
+                       'invalid_domains': 0, 'expired': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Requests created (all and urgent), domains submitted and found
+        invalid, lookups expired, domains queued, and credits spent and
+        left in the last hour
+        """
+        with self._condition:
+            spent = self._spent(time.time())
+            result = dict(self._stats)
+            result['queued'] = self._queued
+            result['credits_spent'] = spent
+            result['credits_left'] = self.credits_per_hour - spent
+            return result
+
+    def submit(self, domains, **kwargs) -> Future:
+        """
+        Queue domain names for submission
+        :param domains: Iterable of domain names
+        :key priority: int: (optional) Higher goes first. 0 by default
+        :key deadline: float: (optional) Seconds the domains may wait.
+                Lookups still queued then fail with TimeoutError
+        :return: Future of `Submitted`, resolved once all domains are part
+                of a request
+        :raises ParameterError:
+        """
+        if domains is None or isinstance(domains, (str, bytes, dict)) \
+                or not hasattr(domains, '__iter__'):
+            raise ParameterError('Expected a list of domain names')
+        names = list(domains)
+        if not names:
+            raise ParameterError('Domain name list cannot be empty')
+        for name in names:
+            if type(name) is not str:
+                raise ParameterError('Incorrect domain name value')
+        priority = kwargs.get('priority', 0)
+        if type(priority) is not int:
+            raise ParameterError('Priority must be an int')
+        deadline = kwargs.get('deadline')
+        if deadline is not None:
+            if not isinstance(deadline, (int, float)) or deadline <= 0:
+                raise ParameterError('Deadline must be greater than 0')
+            deadline = time.monotonic() + deadline
+
+        # Loaded without holding the lock, a slow /getUserRequests call
+        # must not stall other submitters and the dispatcher
+        existing = None
+        if self.include_existing and self._thread is None:
+            existing = self._existing_charges()
+
+        with self._condition:
+            if self._closed:
+                raise ParameterError('Scheduler is closed')
+            if self._thread is None:
+                if existing is not None:
+                    self._charges = collections.deque(sorted(existing))
+                self._thread = threading.Thread(
+                    target=self._dispatch, name='bulkwhoisapi-submissions',
+                    daemon=True)
+                self._thread.start()
+            entry = _Entry(names, priority, deadline, time.monotonic())
+            heapq.heappush(self._queue, (
+                -priority, float('inf') if deadline is None else deadline,
+                next(self._sequence), entry))
+            self._queued += len(names)
+            self._condition.notify_all()
+        return entry.future
+
+    def close(self):
+        """
+        Submit queued lookups without waiting for full batches, failing
+        those the budget cannot cover with TimeoutError, and stop
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _existing_charges(self) -> list:
+        cutoff = time.time() - SubmissionScheduler.WINDOW
+        return [(request.time.timestamp(), request.total_records)
+                for request in self.client.get_requests().user_requests
+                if request.time is not None
+                and request.time.timestamp() > cutoff]
+
+    def _spent(self, now: float) -> int:
+        while self._charges \
+                and self._charges[0][0] <= now - SubmissionScheduler.WINDOW:
+            self._charges.popleft()
+        return sum(credits for _, credits in self._charges)
+
+    def _urgent(self, entry: _Entry, now: float) -> bool:
+        return entry.priority >= self.urgent_priority \
+            or (entry.deadline is not None
+                and entry.deadline - now <= self.batch_window)
+
+    def _expire(self, now: float):
+        expired = [item for item in self._queue
+                   if item[3].deadline is not None and item[3].deadline <= now]
+        if not expired:
+            return
+        ids = {id(item) for item in expired}
+        self._queue = [item for item in self._queue if id(item) not in ids]
+        heapq.heapify(self._queue)
+        for item in expired:
+            entry = item[3]
+            self._queued -= entry.waiting
+            self._stats['expired'] += 1
+            entry.future.set_exception(TimeoutError(
+                '{} domains not submitted before the deadline'.format(
+                    entry.waiting)))
+
+    def _next_batch(self) -> typing.Optional[tuple]:
+        """
+        Wait for the next batch, called with the condition held
+        :return: (urgent, [(entry, domains)]), None when closed and empty
+        """
+        while True:
+            monotonic, now = time.monotonic(), time.time()
+            self._expire(monotonic)
+            if not self._queue:
+                if self._closed:
+                    return None
+                self._condition.wait()
+                continue
+
+            # Seconds until a lookup becomes urgent, or expires
+            wake = [due - self.batch_window
+                    if due > self.batch_window else due
+                    for due in (item[3].deadline - monotonic
+                                for item in self._queue
+                                if item[3].deadline is not None)]
+            urgent = any(self._urgent(item[3], monotonic)
+                         for item in self._queue)
+            if urgent:
+                size, reserve = self.urgent_batch, 0
+            else:
+                waited = monotonic - self._queue[0][3].queued_at
+                if self._queued < self.batch_size and not self._closed \
+                        and waited < self.batch_window:
+                    self._condition.wait(
+                        min([self.batch_window - waited] + wake))
+                    continue
+                size, reserve = self.batch_size, self.reserve
+
+            available = self.credits_per_hour - reserve - self._spent(now)
+            if available < 1:
+                if self._closed:
+                    self._fail_all(TimeoutError('Credit budget exhausted'))
+                    return None
+                if self._charges:
+                    wake.append(self._charges[0][0]
+                                + SubmissionScheduler.WINDOW - now)
+                # Also woken up by new urgent lookups and closing
+                self._condition.wait(max(min(wake), 0.001) if wake else None)
+                continue
+            return urgent, self._take(min(size, available), urgent, monotonic)
+
+    def _take(self, size: int, urgent: bool, now: float) -> list:
+        """Domains of the first entries in priority order"""
+        batch = []
+        for item in sorted(self._queue):
+            entry = item[3]
+            if not size:
+                break
+            if urgent and not self._urgent(entry, now):
+                continue
+            domains = entry.domains[entry.offset:entry.offset + size]
+            entry.offset += len(domains)
+            entry.sending += len(domains)
+            self._queued -= len(domains)
+            size -= len(domains)
+            batch.append((entry, domains))
+        self._queue = [item for item in self._queue if item[3].waiting]
+        heapq.heapify(self._queue)
+        return batch
+
+    def _fail_all(self, error: BaseException):
+        for item in self._queue:
+            item[3].future.set_exception(error)
+        self._queue, self._queued = [], 0
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                urgent, parts = batch
+                domains = [name for _, names in parts for name in names]
+                # Charged before the call so that the budget holds while
+                # the request is being created
+                charge = [time.time(), len(domains)]
+                self._charges.append(charge)
+
+            try:
+                response = self.client.create_request(domains=domains)
+            except Exception as error:
+                with self._condition:
+                    self._charges.remove(charge)
+                    for entry, names in parts:
+                        if not entry.future.done():
+                            entry.future.set_exception(error)
+                        if entry.waiting:
+                            self._drop(entry)
+                continue
+
+            invalid = set(response.invalid_domains)
+            with self._condition:
+                # Invalid domains are not charged
+                charge[1] -= len(invalid)
+                self._stats['requests'] += 1
+                self._stats['urgent_requests'] += urgent
+                self._stats['domains'] += len(domains)
+                self._stats['invalid_domains'] += len(invalid)
+                for entry, names in parts:
+                    entry.sending -= len(names)
+                    entry.request_ids.append(response.request_id)
+                    entry.invalid_domains.extend(
+                        name for name in names if name in invalid)
+                    if not entry.waiting and not entry.sending:
+                        entry.future.set_result(Submitted(
+                            entry.request_ids, entry.invalid_domains))
+                self._condition.notify_all()
+
+    def _drop(self, entry: _Entry):
+        self._queued -= entry.waiting
+        self._queue = [item for item in self._queue if item[3] is not entry]
+        heapq.heapify(self._queue)
+
+    @staticmethod
+    def _positive(name: str, value: int) -> int:
+        if type(value) is not int or value < 1:
+            raise ParameterError('{} must be greater than 0'.format(name))
+        return value
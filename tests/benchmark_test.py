@@ -0,0 +1,412 @@
+"""
+Performance checks. Timings are printed to stderr, assertions only guard
+against regressions by a wide margin so they hold on slow CI machines.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, loads
+
+import csv
+import datetime
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+
+import bulkwhoisapi
+from bulkwhoisapi import ApiRequester, Client, DownloadIndex, \
+    HttpxTransport, RecordColumns, RequestsTransport, ResponseRecords
+from bulkwhoisapi.models.timestamps import epoch_ms, ms_to_datetime, \
+    ms_value, to_datetimes
+from bulkwhoisapi.models.xml_parser import parse_records_xml
+from bulkwhoisapi.net import TransportResponse
+from tests.fixtures import record_values, records_page, to_xml
+from tests.h2_server import H2StubServer
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+def _report(name: str, **values):
+    sys.stderr.write('\n[benchmark] {}: {}\n'.format(name, ', '.join(
+        '{}={}'.format(k, v) for k, v in values.items())))
+
+
+def _run_python(code: str) -> str:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run(
+        [sys.executable, '-c', code], env=env, check=True,
+        stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+
+
+def _import_time(statement: str, runs: int = 5) -> float:
+    code = 'import time; t = time.perf_counter(); {}; ' \
+           'print(time.perf_counter() - t)'.format(statement)
+    return min(float(_run_python(code)) for _ in range(runs))
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_heavy_modules_not_loaded(self):
+        loaded = _run_python(
+            'import sys, bulkwhoisapi; '
+            'print(",".join(m for m in ("requests", "whoisapi", "sqlite3") '
+            'if m in sys.modules))')
+        self.assertEqual(loaded, '')
+
+        loaded = _run_python(
+            'import sys; from bulkwhoisapi import Client; '
+            'Client("at_" + "a" * 29); '
+            'print(",".join(m for m in ("requests", "whoisapi") '
+            'if m in sys.modules))')
+        self.assertEqual(loaded, '')
+
+    def test_import_time(self):
+        package = _import_time('import bulkwhoisapi')
+        client = _import_time('from bulkwhoisapi import Client')
+        eager = _import_time(
+            'import bulkwhoisapi; from bulkwhoisapi import ResponseRecords')
+        _report('import', package_ms=round(package * 1000, 2),
+                client_ms=round(client * 1000, 2),
+                with_models_ms=round(eager * 1000, 2))
+        self.assertLess(package, eager / 5)
+
+    def test_public_names(self):
+        for name in bulkwhoisapi.__all__:
+            self.assertIsNotNone(getattr(bulkwhoisapi, name), name)
+        self.assertTrue(set(bulkwhoisapi.__all__) <= set(dir(bulkwhoisapi)))
+        with self.assertRaises(AttributeError):
+            getattr(bulkwhoisapi, 'DoesNotExist')
+
+
+class TestThreadSafety(unittest.TestCase):
+    threads = 64
+    calls_per_thread = 10
+
+    def test_shared_client_stress(self):
+        with StubServer() as server:
+            request_id = server.add_job(
+                ['domain{}.com'.format(i) for i in range(100)])
+            client = Client(_api_key, base_url=server.url,
+                            pool_size=16, max_in_flight=16)
+            start = threading.Barrier(self.threads)
+            timings = []
+
+            def worker(n: int) -> list:
+                start.wait()
+                indexes = []
+                for i in range(self.calls_per_thread):
+                    t = time.perf_counter()
+                    page = client.get_records(
+                        request_id=request_id, max_records=1,
+                        start_index=(n + i) % 100 + 1)
+                    timings.append((time.perf_counter(), t))
+                    indexes.append(page.whois_records[0].index)
+                return indexes
+
+            began = time.perf_counter()
+            with ThreadPoolExecutor(self.threads) as executor:
+                results = list(executor.map(worker, range(self.threads)))
+            elapsed = time.perf_counter() - began
+
+            for n, indexes in enumerate(results):
+                self.assertEqual(indexes, [(n + i) % 100 + 1 for i in
+                                           range(self.calls_per_thread)])
+
+            total = self.threads * self.calls_per_thread
+            self.assertLessEqual(server.max_in_flight, 16)
+            self.assertLessEqual(server.connections, 16)
+
+            # Throughput of the first and the second half of the run
+            finished = sorted(end for end, _ in timings)
+            middle = finished[total // 2]
+            first = (total // 2) / (middle - began)
+            second = (total - total // 2) / (finished[-1] - middle)
+            _report('64 threads get_records', calls=total,
+                    calls_per_s=round(total / elapsed),
+                    first_half_per_s=round(first),
+                    second_half_per_s=round(second),
+                    connections=server.connections,
+                    max_in_flight=server.max_in_flight)
+            self.assertGreater(second, first / 3)
+
+
+class TestXmlParsing(unittest.TestCase):
+    records = 2000
+
+    def test_xml_vs_json(self):
+        values = records_page('request', [
+            record_values('domain{}.com'.format(i), i + 1)
+            for i in range(self.records)])
+        json_body = dumps(values)
+        xml_body = to_xml('response', values)
+
+        def best(parse, body) -> float:
+            timings = []
+            for _ in range(3):
+                t = time.perf_counter()
+                page = parse(body)
+                timings.append(time.perf_counter() - t)
+            self.assertEqual(len(page.whois_records), self.records)
+            return min(timings)
+
+        json_time = best(lambda body: ResponseRecords(loads(body)),
+                         json_body)
+        xml_time = best(parse_records_xml, xml_body)
+        _report('parse {} records'.format(self.records),
+                json_ms=round(json_time * 1000, 1),
+                xml_ms=round(xml_time * 1000, 1),
+                json_bytes=len(json_body), xml_bytes=len(xml_body))
+        self.assertLess(xml_time, json_time * 10)
+
+
+class TestDownloadIndex(unittest.TestCase):
+    rows = 100000
+
+    def test_lookup_vs_scan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'records.csv')
+            with open(path, 'w', encoding='UTF-8', newline='') as f:
+                f.write('domainName,registrarName,expiresDate\n')
+                for i in range(self.rows):
+                    f.write('domain{}.com,"Registrar, Inc",2028\n'.format(i))
+
+            t = time.perf_counter()
+            index = DownloadIndex(path)
+            build = time.perf_counter() - t
+
+            wanted = 'domain{}.com'.format(self.rows - 1)
+            t = time.perf_counter()
+            with open(path, encoding='UTF-8', newline='') as f:
+                found = [r for r in csv.DictReader(f)
+                         if r['domainName'] == wanted]
+            scan = time.perf_counter() - t
+
+            lookups = 1000
+            t = time.perf_counter()
+            for i in range(lookups):
+                rows = index.get('domain{}.com'.format(i * 97))
+            lookup = (time.perf_counter() - t) / lookups
+
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(index.get(wanted), found)
+            index.close()
+            _report('index {} rows'.format(self.rows),
+                    build_s=round(build, 2), scan_ms=round(scan * 1000, 1),
+                    lookup_us=round(lookup * 1e6, 1))
+            self.assertLess(lookup * 100, scan)
+
+
+class TestTimestampConversion(unittest.TestCase):
+    values = 100000
+    runs = 5
+
+    def test_conversion_cost(self):
+        page = [{'domainFetchedTime': str(1642158864782 + i)}
+                for i in range(self.values)]
+
+        ms = epoch_ms(page, 'domainFetchedTime')
+        converters = {
+            'before': lambda: [
+                datetime.datetime.utcfromtimestamp(
+                    int(str(v['domainFetchedTime'])) / 1000) for v in page],
+            'per_record': lambda: [
+                ms_to_datetime(ms_value(v['domainFetchedTime']))
+                for v in page],
+            'batch': lambda: to_datetimes(
+                epoch_ms(page, 'domainFetchedTime')),
+            'batch_ints': lambda: to_datetimes(ms),
+        }
+
+        # Runs alternate between the converters, so that noise hits all
+        best = dict.fromkeys(converters, float('inf'))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            for _ in range(self.runs):
+                for name, convert in converters.items():
+                    t = time.perf_counter()
+                    convert()
+                    best[name] = min(best[name], time.perf_counter() - t)
+        before, per_record, batch, batch_ints = (
+            best[name] / self.values * 1e9 for name in converters)
+
+        _report('timestamps per value', before_ns=round(before),
+                per_record_ns=round(per_record), batch_ns=round(batch),
+                batch_from_int64_ns=round(batch_ints))
+        self.assertLessEqual(batch, before)
+
+
+class TestResponseClassification(unittest.TestCase):
+    records = 1000
+    runs = 5
+
+    def test_success_overhead(self):
+        content = dumps(records_page('id', [
+            record_values('domain{}.com'.format(i), i + 1)
+            for i in range(self.records)])).encode('UTF-8')
+        response = TransportResponse(200, content, len(content))
+
+        def per_page(classify) -> float:
+            best = None
+            for _ in range(self.runs):
+                t = time.perf_counter()
+                classify()
+                elapsed = time.perf_counter() - t
+                best = elapsed if best is None else min(best, elapsed)
+            return best * 1000
+
+        def full_parse():
+            # Classification before: the whole body decoded as JSON
+            parsed = loads(response.content.decode('UTF-8'))
+            status_code = parsed.get('messageCode', response.status_code)
+            if 200 <= status_code < 300:
+                return response.content.decode('UTF-8')
+
+        before = per_page(full_parse)
+        after = per_page(lambda: ApiRequester._handle_response(
+            response).decode('UTF-8'))
+        decode = per_page(lambda: content.decode('UTF-8'))
+
+        _report('classify {} records page'.format(self.records),
+                size_kib=len(content) // 1024,
+                full_parse_ms=round(before, 2),
+                prefix_scan_ms=round(after, 2),
+                decode_only_ms=round(decode, 2))
+        self.assertLess(after, before / 5)
+
+
+@unittest.skipUnless(importlib.util.find_spec('httpx')
+                     and importlib.util.find_spec('h2'), 'httpx and h2')
+class TestTransports(unittest.TestCase):
+    threads = 32
+    pages = 256
+
+    def _run(self, server: StubServer, transport) -> dict:
+        request_id = server.add_job(
+            ['domain{}.com'.format(i) for i in range(self.pages * 10)])
+        client = Client(_api_key, base_url=server.url, transport=transport)
+
+        def fetch(n: int) -> int:
+            return len(client.get_records(
+                request_id=request_id, max_records=10,
+                start_index=n * 10 + 1).whois_records)
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(self.threads) as executor:
+            records = sum(executor.map(fetch, range(self.pages)))
+        elapsed = time.perf_counter() - began
+        transport.close()
+
+        self.assertEqual(records, self.pages * 10)
+        return {'connections': server.connections,
+                'max_in_flight': server.max_in_flight,
+                'pages_per_s': round(self.pages / elapsed)}
+
+    def test_http1_vs_http2(self):
+        with StubServer(latency=0.005) as server:
+            per_call = self._run(server, RequestsTransport())
+        with StubServer(latency=0.005) as server:
+            pooled = self._run(server, RequestsTransport(self.threads))
+        with H2StubServer(latency=0.005) as server:
+            multiplexed = self._run(server, HttpxTransport(http1=False))
+
+        for name, result in [('http/1.1 per call', per_call),
+                             ('http/1.1 pool', pooled),
+                             ('http/2', multiplexed)]:
+            _report('{} threads get_records, {}'.format(self.threads, name),
+                    **result)
+        self.assertEqual(per_call['connections'], self.pages)
+        self.assertEqual(multiplexed['connections'], 1)
+        self.assertGreater(multiplexed['max_in_flight'], 1)
+        self.assertGreater(multiplexed['pages_per_s'],
+                           per_call['pages_per_s'] / 5)
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy')
+class TestColumnAnalysis(unittest.TestCase):
+    rows = 10 ** 7
+    pages = 20
+
+    def test_load_pages(self):
+        records = [
+            record_values('domain{}.{}'.format(i, ('com', 'net')[i % 2]),
+                          i + 1, registrar='Registrar {}'.format(i % 50))
+            for i in range(1000)]
+        page = dumps(records_page('id', records))
+        # numpy is imported on first use
+        RecordColumns.from_pages([page])
+
+        loops = time.perf_counter()
+        for _ in range(self.pages):
+            registrars = {}
+            for record in loads(page)['whoisRecords']:
+                name = record['whoisRecord']['registrarName']
+                registrars[name] = registrars.get(name, 0) + 1
+        loops = time.perf_counter() - loops
+
+        began = time.perf_counter()
+        columns = RecordColumns.from_pages([page] * self.pages)
+        loaded = time.perf_counter() - began
+
+        self.assertEqual(len(columns), self.pages * 1000)
+        # Decoding JSON dominates, the columns add little on top
+        self.assertLess(loaded, loops * 3)
+        _report('load {} pages of 1000 records'.format(self.pages),
+                records_per_s=round(len(columns) / loaded),
+                count_loop_records_per_s=round(len(columns) / loops))
+
+    def test_operations(self):
+        import numpy
+
+        random = numpy.random.default_rng(1)
+        rows = self.rows
+        day = 86400 * 1000
+        columns = RecordColumns({
+            'domain': numpy.empty(rows, dtype=object),
+            'tld': random.integers(0, 200, rows, dtype='int32'),
+            'registrar': random.integers(0, 2000, rows, dtype='int32'),
+            'domain_status': random.integers(0, 3, rows, dtype='int32'),
+            'index': numpy.arange(1, rows + 1, dtype='int64'),
+            'whois_record_status': random.integers(0, 3, rows),
+            'created': random.integers(0, 20000, rows) * day,
+            'updated': random.integers(15000, 20000, rows) * day,
+            'expires': random.integers(18000, 22000, rows) * day,
+            'fetched': numpy.full(rows, 1642158864782, dtype='int64'),
+        }, {
+            'tld': ['tld{}'.format(i) for i in range(200)],
+            'registrar': ['Registrar {}'.format(i) for i in range(2000)],
+            'domain_status': ['I', 'N', 'E'],
+        })
+
+        timings = {}
+
+        def timed(name: str, function):
+            began = time.perf_counter()
+            result = function()
+            timings[name] = round(time.perf_counter() - began, 3)
+            return result
+
+        counts = timed('counts_s', lambda: columns.counts('registrar'))
+        mask = timed('mask_s', lambda: columns.mask(
+            tld=['tld1', 'tld2', 'tld3'],
+            expires=(datetime.datetime(2020, 1, 1), None)))
+        timed('rate_s', lambda: columns.rate(
+            'tld', columns.mask(domain_status='E')))
+        timed('group_by_s', lambda: columns.group_by('tld', 'expires', 'max'))
+        timed('histogram_s', lambda: columns.histogram('expires', 'month'))
+        timed('filter_s', lambda: columns.filter(mask))
+
+        _report('column analysis of {} rows'.format(rows), **timings)
+        self.assertEqual(sum(counts.values()), rows)
+        # Seconds for tens of millions of rows, not minutes
+        self.assertLess(max(timings.values()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+from json import dumps
+
+import tempfile
+import threading
+import time
+import unittest
+
+from bulkwhoisapi import Client, ResponseCache
+from tests.fixtures import record_values, records_page, requests_list
+
+
+_api_key = 'at_' + 'a' * 29
+_request_id = '12345678-1234-1234-1234-123456789012'
+
+
+class _CountingRequester:
+    def __init__(self, responses: dict, delay: float = 0):
+        self.responses = responses
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def post(self, path: str, data: dict) -> str:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.responses[path]
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.put('a', '12345', ResponseCache.FOREVER)
+        cache.put('b', '12345', ResponseCache.FOREVER)
+        self.assertEqual(cache.get('a'), '12345')
+        cache.put('c', '12345', ResponseCache.FOREVER)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), '12345')
+        self.assertEqual(cache.size, 10)
+        self.assertEqual(cache.stats['evictions'], 1)
+
+    def test_sizes_in_bytes(self):
+        cache = ResponseCache(max_bytes=10)
+        # 4 characters, 8 bytes
+        cache.put('a', 'äöüß', ResponseCache.FOREVER)
+        self.assertEqual(cache.size, 8)
+        cache.put('b', '123', ResponseCache.FOREVER)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory=directory)
+            for _ in range(3):
+                cache.put('a', 'äöüß', ResponseCache.FOREVER)
+            # Overwrites do not add up
+            self.assertEqual(cache._disk_size, 8)
+
+    def test_ttl(self):
+        cache = ResponseCache()
+        cache.put('a', 'value', 0.01)
+        cache.put('b', 'value', 0)
+        self.assertEqual(cache.get('a'), 'value')
+        self.assertIsNone(cache.get('b'))
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ResponseCache(directory=directory).put(
+                'a', 'immutable', ResponseCache.FOREVER)
+            ResponseCache(directory=directory).put('b', 'short', 60)
+
+            other = ResponseCache(directory=directory)
+            self.assertEqual(other.get('a'), 'immutable')
+            self.assertIsNone(other.get('b'))
+            self.assertEqual(other.stats['disk_hits'], 1)
+
+    def test_coalescing(self):
+        cache = ResponseCache()
+        requester = _CountingRequester({'/x': 'value'}, delay=0.05)
+        results = []
+
+        def call():
+            results.append(cache.fetch(
+                'key', lambda: requester.post('/x', {}), lambda _: 0))
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(requester.calls, 1)
+        self.assertEqual(cache.stats['coalesced'], 7)
+
+
+class TestClientCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.requester = _CountingRequester({
+            '/getUserRequests': dumps(requests_list(
+                [(_request_id, 1641985855887, 'Completed', 1)])),
+            '/getRecords': dumps(records_page(
+                _request_id, [record_values('foo.com')])),
+        })
+        self.client = Client(_api_key, cache=ResponseCache(requests_ttl=60))
+        self.client.api_requester = self.requester
+
+    def test_finished_pages(self):
+        for _ in range(3):
+            self.client.get_records(request_id=_request_id, max_records=1)
+        self.assertEqual(self.requester.calls, 1)
+
+        self.client.get_records(request_id=_request_id, max_records=2)
+        self.assertEqual(self.requester.calls, 2)
+
+    def test_unfinished_pages(self):
+        self.requester.responses['/getRecords'] = dumps(records_page(
+            _request_id, [record_values('foo.com')],
+            total_records=2, records_left=1))
+        for _ in range(2):
+            self.client.get_records(request_id=_request_id, max_records=1)
+        self.assertEqual(self.requester.calls, 2)
+
+    def test_requests(self):
+        for _ in range(3):
+            self.client.get_requests()
+        self.assertEqual(self.requester.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
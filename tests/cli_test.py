@@ -0,0 +1,116 @@
+from contextlib import redirect_stderr, redirect_stdout
+from json import loads
+
+import csv
+import io
+import os
+import tempfile
+import unittest
+
+from bulkwhoisapi import cli
+from bulkwhoisapi.exceptions.error import ParameterError
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer()
+        self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        self.directory.cleanup()
+
+    def _run(self, *argv) -> tuple:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            code = cli.main(['--api-key', _api_key,
+                             '--base-url', self.server.url,
+                             '--no-progress'] + list(argv))
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def _file(self, name: str, lines: list) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_submit_chunks(self):
+        domains = ['domain{}.com'.format(i) for i in range(25)]
+        path = self._file('domains.txt', ['# comment', ''] + domains + ['x'])
+
+        code, out, err = self._run('submit', path, '--chunk-size', '10')
+        self.assertEqual(code, 0)
+
+        request_ids = out.split()
+        self.assertEqual(len(request_ids), 3)
+        self.assertEqual(len(self.server.jobs[request_ids[0]]['domains']), 10)
+        self.assertEqual(len(self.server.jobs[request_ids[2]]['domains']), 5)
+        self.assertIn('1 invalid domain', err)
+
+    def test_wait(self):
+        request_id = self.server.add_job(['a.com', 'b.com'])
+        code, out, _ = self._run('wait', request_id, '--interval', '0')
+        self.assertEqual((code, out.strip()), (0, request_id))
+
+        self.server.set_processed(request_id, 1)
+        code, _, err = self._run(
+            'wait', request_id, '--interval', '0', '--timeout', '0')
+        self.assertEqual(code, 2)
+        self.assertIn('Timed out', err)
+
+    def test_export(self):
+        domains = ['domain{}.com'.format(i) for i in range(23)]
+        request_id = self.server.add_job(domains)
+        ids = self._file('ids.txt', [request_id])
+
+        code, out, err = self._run(
+            'export', ids, '--format', 'ndjson',
+            '--page-size', '5', '--concurrency', '3')
+        self.assertEqual(code, 0)
+        records = [loads(line) for line in out.splitlines()]
+        self.assertEqual([r['domainName'] for r in records], domains)
+        self.assertIn('23 records', err)
+
+        output = os.path.join(self.directory.name, 'out.csv')
+        code, _, _ = self._run('export', request_id, '-o', output,
+                               '--page-size', '7')
+        with open(output, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 23)
+        self.assertEqual(rows[0]['registrarName'], 'Registrar Inc')
+        self.assertEqual(rows[0]['nameServers'],
+                         'ns1.example.net ns2.example.net')
+
+    def test_export_writer(self):
+        self.assertIn('ndjson', cli.EXPORT_FORMATS)
+        output = io.StringIO()
+        writer = cli.export_writer('ndjson', output)
+        writer.write([{'domainName': 'a.com'}])
+        writer.close()
+        self.assertEqual(output.getvalue(), '{"domainName":"a.com"}\n')
+        with self.assertRaises(ParameterError):
+            cli.export_writer('xml', output)
+
+    def test_list(self):
+        request_id = self.server.add_job(['a.com'])
+        self.server.add_job(['b.com'], processed=0)
+        code, out, _ = self._run('list', '--status', 'completed')
+        self.assertEqual(code, 0)
+        rows = [line.split('\t') for line in out.splitlines()]
+        self.assertEqual([r[0] for r in rows], [request_id])
+
+    def test_api_error(self):
+        code, _, err = self._run('export',
+                                 '00000000-0000-0000-0000-000000000000')
+        self.assertEqual(code, 1)
+        self.assertIn('bulk-whois:', err)
+
+
+if __name__ == '__main__':
+    unittest.main()
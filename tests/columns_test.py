@@ -0,0 +1,113 @@
+import datetime
+import importlib.util
+import json
+import unittest
+
+from bulkwhoisapi import ParameterError, RecordColumns, ResponseRecords
+from bulkwhoisapi.models.timestamps import MISSING
+from tests.fixtures import record_values, records_page
+
+
+_has_numpy = importlib.util.find_spec('numpy') is not None
+_has_pandas = importlib.util.find_spec('pandas') is not None
+
+
+def _records() -> list:
+    registrars = ['Alpha', 'Beta', 'Alpha', '', 'Alpha', 'Beta']
+    tlds = ['com', 'net', 'com', 'org', 'com', 'net']
+    expires = ['2025-03-01T00:00:00+0000', '2026-07-01T00:00:00Z',
+               '2025-11-30T23:00:00-0200', '', '2031-01-01T00:00:00+0000',
+               '2026-01-01T00:00:00+0000']
+    return [record_values('Domain{}.{}'.format(i, tld), i + 1,
+                          registrar=registrar, expires=expiry)
+            for i, (registrar, tld, expiry)
+            in enumerate(zip(registrars, tlds, expires))]
+
+
+@unittest.skipUnless(_has_numpy, 'numpy')
+class TestRecordColumns(unittest.TestCase):
+
+    def setUp(self):
+        records = _records()
+        pages = [json.dumps(records_page('id', records[:4])),
+                 records_page('id', records[4:])]
+        self.columns = RecordColumns.from_pages(pages)
+
+    def test_load(self):
+        columns = self.columns
+        self.assertEqual(len(columns), 6)
+        self.assertEqual(columns.column('tld').tolist(),
+                         ['com', 'net', 'com', 'org', 'com', 'net'])
+        self.assertEqual(columns.column('index').tolist(), list(range(1, 7)))
+        expires = columns.column('expires')
+        self.assertEqual(str(expires[2]), '2025-12-01T01:00:00.000')
+        self.assertTrue(str(expires[3]) == 'NaT')
+        self.assertEqual(int(columns.codes('registrar')[3]),
+                         columns.categories('registrar').tolist().index(''))
+
+        # Models and dicts give the same columns
+        page = ResponseRecords(records_page('id', _records()))
+        models = RecordColumns.from_records(page.whois_records)
+        for name in columns.names:
+            self.assertEqual(models.column(name).tolist(),
+                             columns.column(name).tolist(), name)
+
+        # Unset integer fields read as in the models
+        sparse = records_page('id', [{'domainName': 'a.com'}])
+        dicts = RecordColumns.from_pages([sparse])
+        models = RecordColumns.from_records(
+            ResponseRecords(sparse).whois_records)
+        for name in ('index', 'whois_record_status'):
+            self.assertEqual(dicts.column(name).tolist(),
+                             models.column(name).tolist(), name)
+        self.assertEqual(dicts.column('whois_record_status').tolist(), [-1])
+
+    def test_filter_and_group(self):
+        columns = self.columns
+        self.assertEqual(columns.counts('registrar'),
+                         {'Alpha': 3, 'Beta': 2, '': 1})
+        mask = columns.mask(tld=['com', 'org'],
+                            expires=(datetime.datetime(2026, 1, 1), None))
+        self.assertEqual(columns.filter(mask).column('domain').tolist(),
+                         ['Domain4.com'])
+        self.assertEqual(len(columns.filter(registrar='Beta')), 2)
+        self.assertEqual(columns.mask(index=[1, 6]).sum(), 2)
+        self.assertEqual(columns.mask(expires=(None, None)).sum(), 5)
+
+        self.assertEqual(columns.rate('tld', columns.mask(registrar='')),
+                         {'com': 0.0, 'net': 0.0, 'org': 1.0})
+        latest = columns.group_by('tld', 'expires', 'max')
+        self.assertEqual(str(latest['net']), '2026-07-01T00:00:00.000')
+        self.assertNotIn('org', latest)
+        self.assertEqual(columns.group_by('registrar', 'index'),
+                         {'Alpha': 3, 'Beta': 2, '': 1})
+        self.assertEqual(columns.group_by('tld', 'index', 'mean')['net'], 4)
+
+        years, counts = columns.histogram('expires')
+        self.assertEqual([str(y) for y in years],
+                         ['2025', '2026', '2031'])
+        self.assertEqual(counts.tolist(), [2, 2, 1])
+        edges, counts = columns.histogram('index', bins=[1, 3, 7])
+        self.assertEqual(counts.tolist(), [2, 4])
+
+        with self.assertRaises(ParameterError):
+            columns.mask(unknown=1)
+        with self.assertRaises(ParameterError):
+            columns.group_by('tld', 'registrar')
+        with self.assertRaises(ParameterError):
+            columns.histogram('index', bins='month')
+
+    @unittest.skipUnless(_has_pandas, 'pandas')
+    def test_frame(self):
+        frame = self.columns.frame()
+        self.assertEqual(len(frame), 6)
+        self.assertEqual(str(frame['tld'].dtype), 'category')
+        self.assertTrue(str(frame['expires'].dtype).endswith(', UTC]'))
+        self.assertEqual(frame['expires'].isna().sum(), 1)
+        self.assertEqual(int(frame['fetched'].iloc[0].timestamp() * 1000),
+                         1642158864783)
+        self.assertNotEqual(self.columns.column('fetched')[0], MISSING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import datetime
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+
+from bulkwhoisapi import Client, DownloadReader, FileError, ParameterError
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+_csv = (
+    'index,domainName,domainStatus,whoisRecordStatus,domainFetchedTime,'
+    'registrarName,createdDate,expiresDate,registrant_name,nameServers\n'
+    '1,a.com,I,0,1642158864782,"Registrar, Inc",'
+    '1997-09-15T07:00:00+0000,2028-09-13T07:00:00Z,Alice,'
+    'ns1.a.com|ns2.a.com\n'
+    '2,b.com,N,,,,,2025-01-01T02:00:00+02:00,,\n'
+    '\n'
+    '3,c.com,I,1,1642158864785,Other,,garbage,Bob,ns1.c.com\n'
+)
+
+_utc = datetime.timezone.utc
+
+
+class TestDownloadReader(unittest.TestCase):
+
+    def test_rows_are_typed(self):
+        rows = list(DownloadReader(io.StringIO(_csv)).rows())
+
+        self.assertEqual([r.domainName for r in rows],
+                         ['a.com', 'b.com', 'c.com'])
+        self.assertEqual([r.index for r in rows], [1, 2, 3])
+        self.assertEqual(rows[1].whoisRecordStatus, 0)
+        self.assertEqual(rows[0].registrarName, 'Registrar, Inc')
+        self.assertEqual(rows[0].createdDate,
+                         datetime.datetime(1997, 9, 15, 7, tzinfo=_utc))
+        self.assertEqual(rows[0].expiresDate,
+                         datetime.datetime(2028, 9, 13, 7, tzinfo=_utc))
+        self.assertEqual(rows[1].expiresDate,
+                         datetime.datetime(2025, 1, 1, 0, tzinfo=_utc))
+        self.assertEqual(rows[0].domainFetchedTime,
+                         datetime.datetime.fromtimestamp(1642158864.782, _utc))
+        self.assertIsNone(rows[1].createdDate)
+        self.assertIsNone(rows[1].domainFetchedTime)
+        self.assertIsNone(rows[2].expiresDate)
+
+    def test_records(self):
+        records = list(DownloadReader(io.StringIO(_csv)).records())
+
+        self.assertEqual([r.domain_name for r in records],
+                         ['a.com', 'b.com', 'c.com'])
+        self.assertEqual(records[2].index, 3)
+        self.assertEqual(records[2].whois_record_status, 1)
+        self.assertEqual(records[1].whois_record_status, -1)
+        self.assertIsNone(records[1].domain_fetched_time)
+        whois_record = records[0].whois_record
+        self.assertEqual(whois_record.registrar_name, 'Registrar, Inc')
+        self.assertEqual(whois_record.registrant.name, 'Alice')
+        self.assertEqual(whois_record.name_servers.host_names,
+                         ['ns1.a.com', 'ns2.a.com'])
+        self.assertEqual(whois_record.created_date,
+                         datetime.datetime(1997, 9, 15, 7, tzinfo=_utc))
+
+    def test_chunks(self):
+        reader = DownloadReader(io.StringIO(_csv), chunk_size=2)
+        chunks = list(reader.chunks())
+
+        self.assertEqual([len(c['domainName']) for c in chunks], [2, 1])
+        self.assertEqual(chunks[0]['index'], [1, 2])
+        self.assertEqual(reader.columns[:2], ['index', 'domainName'])
+
+        with self.assertRaises(ParameterError):
+            DownloadReader(io.StringIO(_csv), chunk_size=0)
+
+    def test_errors(self):
+        with self.assertRaises(FileError):
+            list(DownloadReader(io.StringIO('')).rows())
+        with self.assertRaises(FileError):
+            list(DownloadReader(os.path.join(
+                tempfile.gettempdir(), 'missing', 'file.csv')).rows())
+        with self.assertRaises(ParameterError):
+            list(DownloadReader(42).rows())
+
+    def test_client_download(self):
+        with StubServer() as stub, tempfile.TemporaryDirectory() as tmp:
+            request_id = stub.add_job(['a.com', 'b.com', 'c.com'])
+            client = Client(_api_key, base_url=stub.url)
+            filename = os.path.join(tmp, 'records.csv')
+            client.download(filename=filename, request_id=request_id)
+
+            reader = DownloadReader(filename)
+            self.assertEqual(reader.columns,
+                             ['domainName', 'registrarName', 'expiresDate'])
+            rows = list(reader.rows())
+            self.assertEqual([r.domainName for r in rows],
+                             ['a.com', 'b.com', 'c.com'])
+            self.assertEqual(rows[0].expiresDate.tzinfo, _utc)
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'),
+                         'numpy is not installed')
+    def test_arrays(self):
+        import numpy
+
+        chunks = list(DownloadReader(io.StringIO(_csv)).arrays())
+        self.assertEqual(len(chunks), 1)
+        columns = chunks[0]
+
+        self.assertEqual(columns['index'].dtype, numpy.int64)
+        self.assertEqual(list(columns['index']), [1, 2, 3])
+        self.assertEqual(columns['expiresDate'][0],
+                         numpy.datetime64('2028-09-13T07:00:00'))
+        self.assertEqual(columns['expiresDate'][1],
+                         numpy.datetime64('2025-01-01T00:00:00'))
+        self.assertTrue(numpy.isnat(columns['createdDate'][1]))
+        self.assertTrue(numpy.isnat(columns['domainFetchedTime'][1]))
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'),
+                         'numpy is not installed')
+    def test_arrays_match_rows(self):
+        import numpy
+
+        source = (
+            'domainName,createdDate,updatedDate,expiresDate\n'
+            'a.com,2010-05-06,2020-01-02T03:04:05.678Z,'
+            '2028-09-13T07:00:00+0000\n'
+            'b.com,,2020-01-02T03:04:05+01:00,2028-09-13T07:00:00junk\n')
+        rows = list(DownloadReader(io.StringIO(source)).rows())
+        columns = next(DownloadReader(io.StringIO(source)).arrays())
+
+        self.assertEqual(rows[0].createdDate,
+                         datetime.datetime(2010, 5, 6, tzinfo=_utc))
+        for name in ('createdDate', 'updatedDate', 'expiresDate'):
+            expected = [
+                numpy.datetime64('NaT') if d is None else numpy.datetime64(
+                    d.astimezone(_utc).replace(tzinfo=None), 's')
+                for d in (getattr(r, name) for r in rows)]
+            numpy.testing.assert_array_equal(columns[name], expected)
+
+    @unittest.skipUnless(importlib.util.find_spec('pandas'),
+                         'pandas is not installed')
+    def test_frames(self):
+        frames = list(DownloadReader(io.StringIO(_csv),
+                                     chunk_size=2).frames())
+        self.assertEqual([len(f) for f in frames], [2, 1])
+        self.assertEqual(str(frames[0]['expiresDate'].dt.tz), 'UTC')
+        self.assertEqual(list(frames[0]['index']), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import datetime
+import unittest
+
+from bulkwhoisapi import ChangeDetector, ParameterError, RecordChange, \
+    RecordStore, ResponseRecords
+from tests.fixtures import record_values, records_page
+
+
+_request_old = '12345678-1234-1234-1234-123456789011'
+_request_new = '12345678-1234-1234-1234-123456789012'
+
+
+def _old_records():
+    return [
+        record_values('same.com', 1),
+        record_values('moved.com', 2),
+        record_values('renewed.com', 3),
+        record_values('gone.com', 4),
+    ]
+
+
+def _new_records():
+    return [
+        record_values('same.com', 1),
+        record_values('moved.com', 2, registrar='New Registrar',
+                      name_servers=['NS1.other.net.']),
+        record_values('renewed.com', 3, expires='2030-09-13T07:00:00+0000'),
+        record_values('new.com', 4),
+    ]
+
+
+class _PagingClient:
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.calls = []
+
+    def get_records(self, **kwargs) -> ResponseRecords:
+        self.calls.append(kwargs)
+        records = self.pages[kwargs['request_id']]
+        start = kwargs['start_index'] - 1
+        return ResponseRecords(records_page(
+            kwargs['request_id'],
+            records[start:start + kwargs['max_records']],
+            total_records=len(records)
+        ))
+
+
+class TestChangeDetector(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client = _PagingClient({
+            _request_old: _old_records(),
+            _request_new: _new_records(),
+        })
+
+    def _check(self, changes: list):
+        by_domain = {c.domain_name: c for c in changes}
+        self.assertEqual(
+            sorted(by_domain),
+            ['gone.com', 'moved.com', 'new.com', 'renewed.com'])
+        self.assertEqual(changes[-1].change, RecordChange.REMOVED)
+        self.assertEqual(by_domain['new.com'].change, RecordChange.ADDED)
+
+        moved = by_domain['moved.com']
+        self.assertEqual(moved.change, RecordChange.CHANGED)
+        self.assertEqual(sorted(moved.deltas),
+                         ['name_servers', 'registrar_name'])
+        self.assertEqual(moved.deltas['name_servers'][1], ('ns1.other.net',))
+        self.assertNotEqual(moved.deltas['registrar_name'][0], 'New Registrar')
+        self.assertIsNotNone(moved.deltas['registrar_name'][0])
+        self.assertIsNotNone(by_domain['gone.com'].deltas['registrar_name'][0])
+
+        renewed = by_domain['renewed.com']
+        self.assertEqual(list(renewed.deltas), ['expires_date'])
+        self.assertEqual(
+            renewed.deltas['expires_date'][1],
+            datetime.datetime(2030, 9, 13, 7, tzinfo=datetime.timezone.utc))
+
+    def test_diff_requests(self):
+        changes = list(ChangeDetector(page_size=3).diff_requests(
+            self.client, _request_old, _request_new))
+        self._check(changes)
+        self.assertEqual(len(self.client.calls), 4)
+
+    def test_diff_stored(self):
+        with RecordStore() as store:
+            store.add_records(ResponseRecords(
+                records_page(_request_old, _old_records())))
+            self._check(list(ChangeDetector().diff_stored(
+                self.client, store, _request_new, _request_old)))
+
+    def test_diff_stored_looks_up_changed_domains(self):
+        with RecordStore() as store:
+            store.add_records(ResponseRecords(
+                records_page(_request_old, _old_records())))
+            get_record = store.get_record
+            looked_up = []
+
+            def counting(request_id: str, domain_name: str):
+                looked_up.append(domain_name)
+                return get_record(request_id, domain_name)
+
+            store.get_record = counting
+            changes = list(ChangeDetector().diff_stored(
+                self.client, store, _request_new, _request_old))
+            self._check(changes)
+            # Unchanged domains are only compared by digest
+            self.assertEqual(sorted(looked_up),
+                             ['gone.com', 'moved.com', 'renewed.com'])
+            self.assertIsNone(get_record(_request_old, 'new.com'))
+
+    def test_tracked_fields(self):
+        detector = ChangeDetector(fields=['expires_date'])
+        changes = [c for c in detector.diff_requests(
+            self.client, _request_old, _request_new)
+            if c.change == RecordChange.CHANGED]
+        self.assertEqual([c.domain_name for c in changes], ['renewed.com'])
+
+        with self.assertRaises(ParameterError):
+            ChangeDetector(fields=['foo'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from bulkwhoisapi import Client, DomainMultiplexer, ParameterError
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+class TestDomainMultiplexer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer()
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _created(self) -> list:
+        return [entry for entry in self.server.log
+                if entry['path'] == '/bulkWhois']
+
+    def test_concurrent_callers_share_lookups(self):
+        tenants = [['shared.com', 'tenant{}.com'.format(i), 'Common.org.']
+                   for i in range(8)]
+        start = threading.Barrier(8)
+
+        with DomainMultiplexer(self.client, batch_window=0.2,
+                               interval=0.01) as multiplexer:
+            def lookup(domains: list) -> list:
+                start.wait()
+                return multiplexer.submit(domains)
+
+            with ThreadPoolExecutor(8) as executor:
+                futures = list(executor.map(lookup, tenants))
+            records = [[future.result(5) for future in tenant]
+                       for tenant in futures]
+            metrics = multiplexer.metrics
+
+        self.assertEqual(len(self._created()), 1)
+        self.assertEqual(metrics['requests'], 1)
+        self.assertEqual(metrics['submitted'], 24)
+        self.assertEqual(metrics['deduplicated'], 14)
+        self.assertEqual(metrics['records'], 10)
+        self.assertEqual(metrics['in_flight'], 0)
+        for tenant in records[1:]:
+            # The very same objects, not copies
+            self.assertIs(tenant[0], records[0][0])
+            self.assertIs(tenant[2], records[0][2])
+        self.assertEqual(records[0][2].domain_name, 'common.org')
+        self.assertEqual(records[3][1].domain_name, 'tenant3.com')
+
+    def test_batches_and_errors(self):
+        with DomainMultiplexer(self.client, batch_window=0.05, max_batch=2,
+                               interval=0.01) as multiplexer:
+            futures = multiplexer.submit(['a.com', 'invalid', 'b.com'])
+            self.assertEqual(futures[0].result(5).domain_name, 'a.com')
+            with self.assertRaises(ParameterError):
+                futures[1].result(5)
+            self.assertEqual(futures[2].result(5).domain_name, 'b.com')
+            self.assertEqual(multiplexer.metrics['requests'], 2)
+
+            # Finished lookups are not cached
+            again = multiplexer.submit(['a.com'])[0]
+            self.assertIsNot(again, futures[0])
+            again.result(5)
+
+        with self.assertRaises(ParameterError):
+            multiplexer.submit(['c.com'])
+        with self.assertRaises(ParameterError):
+            multiplexer.submit('a.com')
+        with self.assertRaises(ParameterError):
+            DomainMultiplexer(self.client, max_jobs=0)
+
+        # Request errors are raised by the futures of the batch
+        client = Client(_api_key, base_url='http://127.0.0.1:9')
+        multiplexer = DomainMultiplexer(client, batch_window=0)
+        futures = multiplexer.submit(['a.com', 'b.com'])
+        multiplexer.close()
+        for future in futures:
+            with self.assertRaises(OSError):
+                future.result()
+
+    def test_timeout(self):
+        # The request is never processed
+        create = self.server._route_bulkWhois
+
+        def stalled(data: dict):
+            status, response = create(data)
+            self.server.set_processed(response['requestId'], 0)
+            return status, response
+
+        self.server._route_bulkWhois = stalled
+        multiplexer = DomainMultiplexer(self.client, batch_window=0,
+                                        interval=0.05, timeout=0.3)
+        future = multiplexer.submit(['a.com'])[0]
+        started = time.monotonic()
+        multiplexer.close()
+        self.assertLess(time.monotonic() - started, 3)
+        with self.assertRaises(TimeoutError):
+            future.result(0)
+
+        with self.assertRaises(ParameterError):
+            DomainMultiplexer(self.client, timeout=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Synthetic API payloads shared by the offline tests.
+"""
+
+
+def record_values(domain_name: str, index: int = 1, **kwargs) -> dict:
+    """
+    Build a `whoisRecords` item as returned by `/getRecords`
+    :key registrar: str: Registrar name
+    :key expires: str: Expiration date, ISO 8601
+    :key name_servers: [str]: Name server host names
+    :key status: str: WHOIS status
+    """
+    return {
+        'domainName': domain_name,
+        'domainStatus': kwargs.get('domain_status', 'I'),
+        'whoisRecordStatus': 0,
+        'domainFetchedTime': str(1642158864782 + index),
+        'index': index,
+        'whoisRecord': {
+            'domainName': domain_name,
+            'registrarName': kwargs.get('registrar', 'Registrar Inc'),
+            'status': kwargs.get('status', 'clientTransferProhibited'),
+            'createdDate': '1997-09-15T07:00:00+0000',
+            'updatedDate': '2019-09-09T15:39:04+0000',
+            'expiresDate': kwargs.get('expires', '2028-09-13T07:00:00+0000'),
+            'nameServers': {
+                'rawText': '',
+                'hostNames': kwargs.get(
+                    'name_servers', ['ns1.example.net', 'ns2.example.net']),
+            },
+        },
+    }
+
+
+def records_page(request_id: str, records: list, **kwargs) -> dict:
+    """
+    Build a `/getRecords` response body
+    :key total_records: int: Total number of records in the request
+    :key records_left: int: Records still being processed
+    """
+    total = kwargs.get('total_records', len(records))
+    left = kwargs.get('records_left', 0)
+    return {
+        'noDataAvailable': False,
+        'requestId': request_id,
+        'domainList': [r['domainName'] for r in records],
+        'whoisRecords': records,
+        'totalRecords': total,
+        'recordsLeft': left,
+        'recordsProcessed': total - left,
+    }
+
+
+def requests_list(requests: list) -> dict:
+    """
+    Build a `/getUserRequests` response body from
+    (request_id, time_ms, status, total_records) tuples
+    """
+    return {
+        'userRequests': [
+            {
+                'requestId': request_id,
+                'time': time_ms,
+                'status': status,
+                'totalRecords': total,
+                'fetchedRecords': 0,
+            } for request_id, time_ms, status, total in requests
+        ]
+    }
+
+
+def to_xml(root: str, values) -> str:
+    """
+    Serialize a response body to XML, wrapping list items in elements
+    named after the list (`whoisRecords` -> `whoisRecord`)
+    """
+    from xml.sax.saxutils import escape
+
+    def element(tag: str, value) -> str:
+        if isinstance(value, dict):
+            inner = ''.join(element(k, v) for k, v in value.items())
+        elif isinstance(value, list):
+            item = tag[:-1] if tag.endswith('s') else 'item'
+            inner = ''.join(element(item, v) for v in value)
+        elif isinstance(value, bool):
+            inner = 'true' if value else 'false'
+        else:
+            inner = escape(str(value))
+        return '<{0}>{1}</{0}>'.format(tag, inner)
+
+    return '<?xml version="1.0" encoding="UTF-8"?>' + element(root, values)
@@ -0,0 +1,69 @@
+import threading
+import unittest
+
+from bulkwhoisapi import Client, ParameterError
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+class TestFollow(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer()
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+        self.domains = ['domain{}.com'.format(i) for i in range(50)]
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _record_calls(self) -> list:
+        return [e for e in self.server.log if e['path'].endswith('Records')]
+
+    def test_waits_for_processing(self):
+        request_id = self.server.add_job(self.domains, processed=5)
+        progress = iter([12, 30, 50])
+
+        def process_more():
+            processed = next(progress, None)
+            if processed is not None:
+                self.server.set_processed(request_id, processed)
+                threading.Timer(0.02, process_more).start()
+
+        threading.Timer(0.02, process_more).start()
+        indexes = [r.index for r in self.client.follow(
+            request_id=request_id, max_records=20, interval=0.005)]
+        self.assertEqual(indexes, list(range(1, 51)))
+
+        # Each call starts right after the last record received so far
+        starts = [e['data']['startIndex'] for e in self._record_calls()]
+        self.assertEqual(starts, sorted(starts))
+        self.assertEqual(starts[0], 1)
+
+    def test_resume(self):
+        request_id = self.server.add_job(self.domains)
+        indexes = [r.index for r in self.client.follow(
+            request_id=request_id, max_records=100, start_index=45)]
+        self.assertEqual(indexes, list(range(45, 51)))
+        self.assertEqual(len(self._record_calls()), 1)
+
+    def test_timeout(self):
+        request_id = self.server.add_job(self.domains, processed=3)
+        records = []
+        with self.assertRaises(TimeoutError):
+            for record in self.client.follow(request_id=request_id,
+                                             interval=0.01, timeout=0.05):
+                records.append(record)
+        self.assertEqual(len(records), 3)
+
+    def test_parameters(self):
+        with self.assertRaises(ParameterError):
+            next(self.client.follow())
+        with self.assertRaises(ParameterError):
+            next(self.client.follow(request_id='foo'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+HTTP/2 variant of the local API stub. Requires h2.
+"""
+
+import socket
+import threading
+
+from tests.stub_server import StubServer
+
+
+class _Headers(dict):
+    """HTTP/2 header names are lowercase, lookups ignore case"""
+
+    def get(self, name: str, default=None):
+        return super().get(name.lower(), default)
+
+
+class H2StubServer(StubServer):
+    """
+    Serves the stub API over HTTP/2 without TLS (prior knowledge).
+    Every stream is answered from its own thread, so slow responses do not
+    block the other streams of a connection.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._socket = None
+        self._running = False
+
+    @property
+    def url(self) -> str:
+        host, port = self._socket.getsockname()[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._socket = socket.socket()
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(128)
+        self._socket.settimeout(0.05)
+        self._running = True
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._drain()
+        self._running = False
+        self._thread.join()
+        self._socket.close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=_Connection(self, connection).serve,
+                             daemon=True).start()
+
+
+class _Connection:
+
+    def __init__(self, stub: H2StubServer, sock: socket.socket):
+        import h2.config
+        import h2.connection
+
+        self.stub = stub
+        self.sock = sock
+        self.h2 = h2.connection.H2Connection(h2.config.H2Configuration(
+            client_side=False, header_encoding='utf-8'))
+        # Writes to the connection and flow control waits
+        self.condition = threading.Condition()
+        self.streams = {}
+
+    def serve(self):
+        import h2.events
+
+        with self.condition:
+            self.h2.initiate_connection()
+            self._flush()
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    return
+                with self.condition:
+                    for event in self.h2.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            self.streams[event.stream_id] = (
+                                _Headers(event.headers), bytearray())
+                        elif isinstance(event, h2.events.DataReceived):
+                            self.streams[event.stream_id][1].extend(
+                                event.data)
+                            self.h2.acknowledge_received_data(
+                                event.flow_controlled_length, event.stream_id)
+                        elif isinstance(event, h2.events.StreamEnded):
+                            threading.Thread(
+                                target=self._respond,
+                                args=(event.stream_id,), daemon=True).start()
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+                    self._flush()
+                    self.condition.notify_all()
+        except OSError:
+            return
+        finally:
+            self.sock.close()
+
+    def _respond(self, stream_id: int):
+        stub = self.stub
+        with self.condition:
+            headers, body = self.streams.pop(stream_id)
+        with stub.lock:
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        try:
+            status, response_headers, content = stub.respond(
+                headers.get(':path'), headers, bytes(body))
+        finally:
+            with stub.lock:
+                stub.in_flight -= 1
+
+        try:
+            with self.condition:
+                self._send(stream_id, status, response_headers, content)
+        except OSError:
+            # The client closed the connection
+            return
+
+    def _send(self, stream_id: int, status: int, headers: dict,
+              content: bytes):
+        self.h2.send_headers(stream_id, [(':status', str(status))] + [
+            (name.lower(), value) for name, value in headers.items()])
+        self._flush()
+        view = memoryview(content)
+        while view:
+            window = min(self.h2.local_flow_control_window(stream_id),
+                         self.h2.max_outbound_frame_size)
+            if window <= 0:
+                self.condition.wait(1)
+                continue
+            self.h2.send_data(stream_id, view[:window].tobytes())
+            view = view[window:]
+            self._flush()
+        self.h2.end_stream(stream_id)
+        self._flush()
+
+    def _flush(self):
+        data = self.h2.data_to_send()
+        if data:
+            self.sock.sendall(data)
@@ -0,0 +1,197 @@
+import time
+import unittest
+from json import dumps
+
+from bulkwhoisapi import ApiAuthError, ApiRequester, BadRequestError, \
+    Client, HttpApiError, ParameterError, Timeouts
+from bulkwhoisapi.net import TransportResponse
+from tests.fixtures import record_values, records_page
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+class TestCompression(unittest.TestCase):
+
+    def _client(self, server: StubServer, **kwargs) -> Client:
+        return Client(_api_key, base_url=server.url, **kwargs)
+
+    def test_compressed_request_body(self):
+        domains = ['domain{}.com'.format(i) for i in range(1000)]
+        with StubServer() as server:
+            client = self._client(server, compress_threshold=1024)
+            response = client.create_request(domains=domains)
+            self.assertTrue(response.request_id)
+
+            log = server.log[-1]
+            self.assertEqual(log['headers'].get('Content-Encoding'), 'gzip')
+
+            stats = client.api_requester.transfer_stats
+            self.assertEqual(stats['requests'], 1)
+            self.assertEqual(stats['sent_bytes'], log['wire_bytes'])
+            self.assertLess(stats['sent_bytes'], stats['body_bytes'] / 4)
+
+    def test_small_body_not_compressed(self):
+        with StubServer() as server:
+            client = self._client(server, compress_threshold=1024)
+            client.get_requests()
+            self.assertNotIn('Content-Encoding', server.log[-1]['headers'])
+
+    def test_rejected_compression_falls_back(self):
+        with StubServer(accept_gzip_requests=False) as server:
+            client = self._client(server, compress_threshold=0)
+            client.get_requests()
+            client.get_requests()
+            self.assertEqual(
+                [e['headers'].get('Content-Encoding') for e in server.log],
+                ['gzip', None, None])
+
+    def test_compressed_response(self):
+        with StubServer(gzip_responses=True) as server:
+            client = self._client(server)
+            request_id = server.add_job(
+                ['domain{}.com'.format(i) for i in range(50)])
+            page = client.get_records(request_id=request_id, max_records=50)
+            self.assertEqual(len(page.whois_records), 50)
+
+            stats = client.api_requester.transfer_stats
+            self.assertLess(stats['received_bytes'],
+                            stats['decoded_bytes'] / 4)
+
+    def test_error_response(self):
+        with StubServer() as server:
+            with self.assertRaises(BadRequestError):
+                ApiRequester(base_url=server.url).post('/bulkWhois', {})
+
+    def test_invalid_threshold(self):
+        with self.assertRaises(ValueError):
+            ApiRequester(compress_threshold=-1)
+
+
+class TestTimeouts(unittest.TestCase):
+
+    def test_endpoint_budgets(self):
+        requester = ApiRequester(timeout=20, timeouts={
+            '/getRecords': Timeouts(connect=2, read=120),
+            '/bulkWhois': {'total': 600}})
+
+        self.assertEqual(requester.budget('/getRecords'),
+                         Timeouts(2, 120, None))
+        self.assertEqual(requester.budget('/bulkWhois'),
+                         Timeouts(10, 20, 600))
+        self.assertEqual(requester.budget('/other'), Timeouts(10, 20, None))
+
+        # Defaults: long reads for pages, fail fast for request lists
+        requester = ApiRequester()
+        self.assertEqual(requester.timeout, 30)
+        self.assertEqual(requester.budget('/download').read, 300)
+        self.assertEqual(requester.budget('/getRecords'),
+                         Timeouts(10, 120, None))
+        self.assertEqual(requester.budget('/getUserRequests'),
+                         Timeouts(5, 10, None))
+        self.assertEqual(requester.budget('/bulkWhois'),
+                         Timeouts(10, 30, None))
+
+        # One call uses one snapshot, whatever setters run meanwhile
+        config = requester._config
+        requester.timeouts = {'/getRecords': Timeouts(read=5)}
+        self.assertEqual(ApiRequester._budget(config, '/getRecords').read,
+                         120)
+        self.assertEqual(requester.budget('/getRecords').read, 5)
+        self.assertEqual(requester.budget('/download').read, 300)
+
+        with self.assertRaises(ValueError):
+            ApiRequester(timeouts={'/download': Timeouts(read=0)})
+        with self.assertRaises(ValueError):
+            ApiRequester(timeouts={'/download': 30})
+
+    def test_timeout_controls_every_endpoint(self):
+        client = Client(_api_key, timeout=5)
+        for path in ('/bulkWhois', '/download', '/getRecords',
+                     '/getUserRequests'):
+            self.assertEqual(client.api_requester.budget(path),
+                             Timeouts(10, 5, None))
+
+        client = Client(_api_key)
+        client.timeout = 5
+        self.assertEqual(client.api_requester.budget('/download').read, 5)
+
+    def test_total_budget(self):
+        with StubServer(latency=0.5) as server:
+            client = Client(_api_key, base_url=server.url, timeouts={
+                '/getUserRequests': Timeouts(total=0.1)})
+            started = time.monotonic()
+            with self.assertRaises(TimeoutError):
+                client.get_requests()
+            self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_call_deadline(self):
+        with StubServer(latency=0.5) as server:
+            client = Client(_api_key, base_url=server.url)
+            request_id = server.add_job(['a.com', 'b.com'])
+
+            with self.assertRaises(TimeoutError):
+                client.get_records(request_id=request_id, max_records=2,
+                                   timeout=0.1)
+            page = client.get_records(request_id=request_id, max_records=2,
+                                      timeout=5)
+            self.assertEqual(len(page.whois_records), 2)
+
+            with self.assertRaises(ParameterError):
+                client.get_requests(timeout=0)
+
+    def test_deadline_waiting_for_slot(self):
+        requester = ApiRequester(max_in_flight=1)
+        requester._semaphore.acquire()
+        try:
+            with self.assertRaises(TimeoutError):
+                requester.post('/getUserRequests', {},
+                               time.monotonic() + 0.05)
+        finally:
+            requester._semaphore.release()
+
+
+def _response(status: int, payload) -> TransportResponse:
+    content = dumps(payload).encode('UTF-8')
+    return TransportResponse(status, content, len(content))
+
+
+class TestResponseClassification(unittest.TestCase):
+
+    def setUp(self):
+        records = [record_values('domain{}.com'.format(i), i + 1)
+                   for i in range(200)]
+        self.page = records_page('id', records, total_records=200)
+
+    def test_success(self):
+        response = _response(200, self.page)
+        self.assertIs(ApiRequester._handle_response(response),
+                      response.content)
+
+        # A code nested in the records is not the response's code
+        self.page['whoisRecords'][0]['messageCode'] = 500
+        self.page = dict(list(self.page.items())[::-1])
+        response = _response(200, self.page)
+        self.assertIs(ApiRequester._handle_response(response),
+                      response.content)
+
+    def test_error_codes(self):
+        with self.assertRaises(ApiAuthError) as context:
+            ApiRequester._handle_response(_response(200, {
+                'messageCode': 403, 'message': 'Access restricted'}))
+        self.assertEqual(context.exception.parsed_message.code, 403)
+
+        with self.assertRaises(BadRequestError):
+            ApiRequester._handle_response(_response(200, dict(
+                {'messageCode': 422, 'message': 'Bad'}, **self.page)))
+        with self.assertRaises(HttpApiError):
+            ApiRequester._handle_response(TransportResponse(
+                502, b'<html>Bad Gateway</html>', 24))
+        self.assertEqual(ApiRequester._handle_response(_response(201, {
+            'messageCode': 200, 'requestId': 'id'})),
+            b'{"messageCode": 200, "requestId": "id"}')
+
+
+if __name__ == '__main__':
+    unittest.main()
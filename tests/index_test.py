@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+
+from bulkwhoisapi import Client, DownloadIndex, FileError, ParameterError
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+_header = 'domainName,registrarName,expiresDate\n'
+
+
+class TestDownloadIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'records.csv')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, text: str, mode: str = 'w'):
+        with open(self.path, mode, encoding='UTF-8', newline='') as f:
+            f.write(text)
+
+    def test_lookup_and_range(self):
+        self._write(_header +
+                    'b.com,"Registrar, Inc",2028\n'
+                    'a.com,"Multi\nline",2027\n'
+                    'C.com,Other,2026\n'
+                    'b.com,Later,2029\n')
+
+        with DownloadIndex(self.path) as index:
+            self.assertEqual(len(index), 4)
+            self.assertEqual(index.columns,
+                             ['domainName', 'registrarName', 'expiresDate'])
+            self.assertTrue(os.path.exists(self.path + DownloadIndex.SUFFIX))
+
+            self.assertEqual(index.get('a.com'), [{
+                'domainName': 'a.com', 'registrarName': 'Multi\nline',
+                'expiresDate': '2027'}])
+            self.assertEqual([r['registrarName'] for r in index.get('B.COM')],
+                             ['Registrar, Inc', 'Later'])
+            self.assertEqual(index.get('c.com')[0]['domainName'], 'C.com')
+            self.assertNotIn('d.com', index)
+
+            self.assertEqual([d for d, _ in index.range('a.com', 'c.com')],
+                             ['a.com', 'b.com', 'b.com'])
+            self.assertEqual([d for d, _ in index.range('b.com')],
+                             ['b.com', 'b.com', 'c.com'])
+
+            with self.assertRaises(ParameterError):
+                index.row_at(10 ** 9)
+
+    def test_incremental_update(self):
+        self._write(_header + 'a.com,A,2027\n')
+        index = DownloadIndex(self.path)
+        scanned = index.indexed_size
+
+        # An incomplete row is left for the next update
+        self._write('b.com,B,2028\nc.com,', 'a')
+        self.assertEqual(index.update(), 1)
+        self.assertIn('b.com', index)
+        self.assertNotIn('c.com', index)
+        self.assertGreater(index.indexed_size, scanned)
+
+        self._write('C,2029\n', 'a')
+        self.assertEqual(index.update(), 1)
+        self.assertEqual(index.get('c.com')[0]['registrarName'], 'C')
+        self.assertEqual(index.update(), 0)
+        index.close()
+
+        # Reopening reuses the index file
+        with DownloadIndex(self.path) as index:
+            self.assertEqual(len(index), 3)
+            self.assertEqual(index.update(), 0)
+
+    def test_rewritten_file(self):
+        self._write(_header + 'a.com,A,2027\nb.com,B,2028\n')
+        DownloadIndex(self.path).close()
+
+        self._write(_header + 'x.com,X,2027\n')
+        with DownloadIndex(self.path) as index:
+            self.assertEqual(len(index), 1)
+            self.assertNotIn('a.com', index)
+            self.assertIn('x.com', index)
+
+    def test_errors(self):
+        with self.assertRaises(FileError):
+            DownloadIndex(self.path)
+        self._write('other,columns\n1,2\n')
+        with self.assertRaises(FileError):
+            DownloadIndex(self.path)
+
+    def test_client_download(self):
+        with StubServer() as stub:
+            domains = ['domain{}.com'.format(i) for i in range(500)]
+            request_id = stub.add_job(domains)
+            Client(_api_key, base_url=stub.url).download(
+                filename=self.path, request_id=request_id)
+
+        with DownloadIndex(self.path) as index:
+            self.assertEqual(len(index), 500)
+            self.assertEqual(index.get('domain123.com')[0]['domainName'],
+                             'domain123.com')
+            self.assertEqual(
+                len(list(index.range('domain10.com', 'domain11.com'))), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
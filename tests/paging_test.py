@@ -0,0 +1,462 @@
+import collections
+import io
+import re
+import threading
+import time
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+from bulkwhoisapi import AdaptivePageSize, Client, PageScheduler, \
+    ParameterError, RequestHedging
+from bulkwhoisapi.cli import main
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+def _simulate(sizer: AdaptivePageSize, latency, pages: int = 30,
+              bytes_per_record: int = 1000) -> list:
+    """Feed pages with latency(size) seconds, return the chosen sizes"""
+    sizes = []
+    for _ in range(pages):
+        size = sizer.size
+        sizes.append(size)
+        sizer.observe(size, size, latency(size), size * bytes_per_record)
+    return sizes
+
+
+class TestAdaptivePageSize(unittest.TestCase):
+
+    def test_converges_to_target_latency(self):
+        sizer = AdaptivePageSize(initial=10, target_latency=1)
+        sizes = _simulate(sizer, lambda n: 0.05 + n * 0.001)
+
+        self.assertEqual(sizes[:3], [10, 20, 40])
+        self.assertTrue(800 <= sizes[-1] <= 1000, sizes)
+        metrics = sizer.metrics
+        self.assertEqual(metrics['size'], sizer.size)
+        self.assertEqual(metrics['pages'], 30)
+        self.assertGreater(metrics['grown'], 0)
+        self.assertAlmostEqual(metrics['bytes_per_record'], 1000)
+
+    def test_shrinks_slow_pages(self):
+        sizer = AdaptivePageSize(initial=5000, target_latency=2)
+        _simulate(sizer, lambda n: n * 0.01, pages=1)
+        self.assertEqual(sizer.size, 200)
+
+    def test_stops_growing_without_gain(self):
+        # Throughput peaks at 400 records per page
+        sizer = AdaptivePageSize(initial=100, target_latency=60)
+        sizes = _simulate(
+            sizer, lambda n: 0.1 + n * 0.001 + max(0, n - 400) * 0.01)
+        self.assertEqual(sizes[-5:], [400] * 5)
+
+    def test_timeouts_and_limits(self):
+        sizer = AdaptivePageSize(initial=1000, min_size=50)
+        sizer.timed_out()
+        self.assertEqual(sizer.size, 250)
+        sizer.timed_out()
+        sizer.timed_out()
+        self.assertEqual(sizer.size, 50)
+        self.assertEqual(sizer.metrics['timeouts'], 3)
+
+        sizer = AdaptivePageSize(initial=1000, max_page_bytes=100000)
+        sizer.observe(1000, 1000, 0.1, 1000000)
+        self.assertEqual(sizer.size, 100)
+
+        with self.assertRaises(ParameterError):
+            AdaptivePageSize(initial=0)
+        with self.assertRaises(ParameterError):
+            AdaptivePageSize(min_size=100, max_size=10)
+        with self.assertRaises(ParameterError):
+            AdaptivePageSize(target_latency=0)
+
+    def test_partial_pages_keep_size(self):
+        sizer = AdaptivePageSize(initial=100)
+        sizer.observe(100, 3, 0.01, 3000)
+        self.assertEqual(sizer.size, 100)
+
+
+class TestAdaptivePaging(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer()
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+        self.request_id = self.server.add_job(
+            ['domain{}.com'.format(i) for i in range(300)])
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _sizes(self) -> list:
+        return [e['data']['maxRecords'] for e in self.server.log
+                if e['path'].endswith('Records')]
+
+    def test_follow(self):
+        sizer = AdaptivePageSize(initial=10, target_latency=5)
+        indexes = [r.index for r in self.client.follow(
+            request_id=self.request_id, page_size=sizer)]
+
+        self.assertEqual(indexes, list(range(1, 301)))
+        sizes = self._sizes()
+        self.assertEqual(sizes[:3], [10, 20, 40])
+        self.assertEqual(sizer.metrics['records'], 300)
+
+    def test_follow_retries_timeouts(self):
+        get_records_raw = self.client.get_records_raw
+        calls = []
+
+        def flaky(**kwargs):
+            calls.append(kwargs['max_records'])
+            if len(calls) == 2:
+                raise TimeoutError('read timed out')
+            return get_records_raw(**kwargs)
+
+        self.client.get_records_raw = flaky
+        sizer = AdaptivePageSize(initial=100, min_size=10)
+        indexes = [r.index for r in self.client.follow(
+            request_id=self.request_id, page_size=sizer)]
+
+        self.assertEqual(indexes, list(range(1, 301)))
+        self.assertEqual(calls[:3], [100, 200, 50])
+        self.assertEqual(sizer.metrics['timeouts'], 1)
+
+        # Without adaptive paging timeouts propagate
+        def timeout(**kwargs):
+            raise TimeoutError('read timed out')
+
+        self.client.get_records_raw = timeout
+        with self.assertRaises(TimeoutError):
+            list(self.client.follow(request_id=self.request_id,
+                                    max_records=100))
+
+    def test_follow_sizes_in_bytes(self):
+        get_records_raw = self.client.get_records_raw
+        sizes = []
+
+        def non_ascii(**kwargs):
+            response = re.sub(r'domain(\d)', r'dömain\1',
+                              get_records_raw(**kwargs))
+            sizes.append(len(response.encode('UTF-8')))
+            return response
+
+        self.client.get_records_raw = non_ascii
+        sizer = AdaptivePageSize(initial=100)
+        names = [r.domain_name for r in self.client.follow(
+            request_id=self.request_id, page_size=sizer)]
+
+        self.assertEqual(names[0], 'dömain0.com')
+        self.assertEqual(sizer.metrics['bytes'], sum(sizes))
+
+    def test_follow_max_timeouts(self):
+        def timeout(**kwargs):
+            raise TimeoutError('read timed out')
+
+        self.client.get_records_raw = timeout
+        sizer = AdaptivePageSize(initial=100, max_timeouts=1)
+        with self.assertRaises(TimeoutError):
+            list(self.client.follow(request_id=self.request_id,
+                                    page_size=sizer))
+        self.assertEqual(sizer.metrics['timeouts'], 1)
+
+        with self.assertRaises(ParameterError):
+            AdaptivePageSize(max_timeouts=-1)
+
+    def test_cli_export_auto(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            code = main(['--api-key', _api_key, '--base-url', self.server.url,
+                         '--no-progress', 'export', self.request_id,
+                         '--format', 'ndjson', '--page-size', 'auto',
+                         '--concurrency', '2'])
+
+        self.assertEqual(code, 0)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 300)
+        self.assertIn('page size', stderr.getvalue())
+        self.assertEqual(self._sizes()[0], 100)
+
+    def test_cli_export_hedge(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            code = main(['--api-key', _api_key, '--base-url', self.server.url,
+                         '--no-progress', 'export', self.request_id,
+                         '--format', 'ndjson', '--page-size', '10',
+                         '--hedge', '0.05'])
+
+        self.assertEqual(code, 0)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 300)
+        self.assertIn('of 30 calls hedged', stderr.getvalue())
+
+
+class _Calls:
+    """
+    Returns its argument after `delays[n]` seconds on the n-th call, or
+    raises `error` if n is in `failing`
+    """
+
+    def __init__(self, *delays: float, **kwargs):
+        self.delays = delays
+        self.error = kwargs.get('error', ValueError('failed'))
+        self.failing = kwargs.get('failing', ())
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        with self._lock:
+            n = self.count
+            self.count += 1
+        time.sleep(self.delays[n] if n < len(self.delays) else 0)
+        if n in self.failing:
+            raise self.error
+        return value
+
+
+class TestRequestHedging(unittest.TestCase):
+
+    def _warm(self, hedging: RequestHedging, delay: float = 0.01):
+        for _ in range(hedging.min_samples):
+            hedging.call(time.sleep, delay)
+
+    def test_warms_up_before_hedging(self):
+        hedging = RequestHedging(min_samples=5)
+        for i in range(4):
+            hedging.call(time.sleep, 0.001)
+            self.assertIsNone(hedging.delay)
+        hedging.call(time.sleep, 0.001)
+
+        self.assertIsNotNone(hedging.delay)
+        self.assertEqual(hedging.metrics['calls'], 5)
+        self.assertEqual(hedging.metrics['hedges'], 0)
+
+    def test_hedge_wins_slow_call(self):
+        hedging = RequestHedging(min_samples=5, budget=0.5)
+        self._warm(hedging)
+        started = time.monotonic()
+        self.assertEqual(hedging.call(_Calls(2, 0), 'page'), 'page')
+
+        self.assertLess(time.monotonic() - started, 1)
+        metrics = hedging.metrics
+        self.assertEqual(metrics['hedges'], 1)
+        self.assertEqual(metrics['hedge_wins'], 1)
+        self.assertEqual(metrics['primary_wins'], 0)
+        self.assertAlmostEqual(metrics['extra_ratio'], 1 / 6)
+
+    def test_primary_wins(self):
+        hedging = RequestHedging(min_samples=5, budget=0.5)
+        self._warm(hedging)
+        self.assertEqual(hedging.call(_Calls(0.1, 2), 'page'), 'page')
+        self.assertEqual(hedging.metrics['primary_wins'], 1)
+
+    def test_budget(self):
+        hedging = RequestHedging(min_samples=5, budget=0.1)
+        self._warm(hedging)
+        # 6 calls allow no duplicate at 10%
+        self.assertEqual(hedging.call(_Calls(0.2, 0), 'page'), 'page')
+        metrics = hedging.metrics
+        self.assertEqual(metrics['hedges'], 0)
+        self.assertEqual(metrics['over_budget'], 1)
+
+        for _ in range(4):
+            hedging.call(time.sleep, 0)
+        # 11 calls allow one
+        hedging.call(_Calls(2, 0), 'page')
+        self.assertEqual(hedging.metrics['hedge_wins'], 1)
+
+    def test_errors(self):
+        hedging = RequestHedging(min_samples=5, budget=1)
+        self._warm(hedging)
+        # A timeout of the call itself is raised, not hedged
+        with self.assertRaises(TimeoutError):
+            hedging.call(_Calls(0, failing=[0], error=TimeoutError()), None)
+        self.assertEqual(hedging.metrics['hedges'], 0)
+
+        # The first success wins, even after a failure
+        self.assertEqual(hedging.call(_Calls(0.3, 0, failing=[1]), 'page'),
+                         'page')
+        self.assertEqual(hedging.metrics['primary_wins'], 1)
+
+        # Both failed
+        with self.assertRaises(KeyError):
+            hedging.call(_Calls(0.3, 0, failing=[0, 1], error=KeyError()),
+                         None)
+
+    def test_failures_count_as_latencies(self):
+        hedging = RequestHedging(min_samples=5, quantile=0.5)
+        for _ in range(5):
+            with self.assertRaises(TimeoutError):
+                hedging.call(_Calls(0.05, failing=[0],
+                                    error=TimeoutError()), None)
+        self.assertGreaterEqual(hedging.delay, 0.05)
+
+        for _ in range(5):
+            with self.assertRaises(ValueError):
+                hedging.call(_Calls(0.05, failing=[0]), None)
+        self.assertGreaterEqual(hedging.delay, 0.05)
+        hedging.close()
+
+    def test_bounded_workers(self):
+        hedging = RequestHedging(min_samples=5, budget=1, max_workers=2)
+        self._warm(hedging)
+        main = threading.get_ident()
+        threads = set()
+
+        def record(value):
+            threads.add(threading.get_ident())
+            time.sleep(0.05)
+            return value
+
+        results = []
+        callers = [threading.Thread(
+            target=lambda: results.append(hedging.call(record, 'page')))
+            for _ in range(6)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual(results, ['page'] * 6)
+        pool = {t for t in threads if t != main
+                and t not in {c.ident for c in callers}}
+        self.assertLessEqual(len(pool), 2)
+        self.assertGreater(hedging.metrics['saturated'], 0)
+        hedging.close()
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ParameterError):
+            RequestHedging(max_workers=1)
+        with self.assertRaises(ParameterError):
+            RequestHedging(quantile=1)
+        with self.assertRaises(ParameterError):
+            RequestHedging(budget=-0.1)
+        with self.assertRaises(ParameterError):
+            RequestHedging(min_samples=0)
+        with self.assertRaises(ParameterError):
+            RequestHedging(min_samples=50, window=10)
+
+    def test_client(self):
+        with StubServer() as server:
+            hedging = RequestHedging(min_samples=5, budget=0.5)
+            client = Client(_api_key, base_url=server.url, hedging=hedging)
+            request_id = server.add_job(
+                ['domain{}.com'.format(i) for i in range(300)])
+
+            post = client.api_requester.post
+            attempts = collections.Counter()
+
+            def slow_once(path, data, *args):
+                attempts[path, data.get('startIndex')] += 1
+                if data.get('startIndex') == 201 \
+                        and attempts[path, 201] == 1:
+                    time.sleep(2)
+                return post(path, data, *args)
+
+            client.api_requester.post = slow_once
+            started = time.monotonic()
+            indexes = [r.index for r in client.follow(
+                request_id=request_id, max_records=10)]
+
+            self.assertEqual(indexes, list(range(1, 301)))
+            self.assertLess(time.monotonic() - started, 1.5)
+            self.assertGreaterEqual(hedging.metrics['hedge_wins'], 1)
+            self.assertEqual(
+                attempts[Client._PATH_RECORDS, 201], 2)
+            # Only /getRecords is hedged
+            self.assertEqual(attempts[Client._PATH_REQUESTS, None], 0)
+
+
+class TestPageScheduler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer(latency=0.005)
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _job(self, size: int, processed: int = None) -> str:
+        return self.server.add_job(
+            ['d{}-{}.com'.format(size, i) for i in range(size)], processed)
+
+    def test_merged_stream(self):
+        sizes = [400, 5, 120, 40]
+        request_ids = [self._job(size) for size in sizes]
+
+        tagged = list(self.client.follow_many(
+            request_ids=request_ids, page_size=20, max_in_flight=4))
+
+        self.assertLessEqual(self.server.max_in_flight, 4)
+        last = {}
+        for position, (request_id, record) in enumerate(tagged):
+            last[request_id] = position
+        for request_id, size in zip(request_ids, sizes):
+            indexes = [r.index for i, r in tagged if i == request_id]
+            self.assertEqual(indexes, list(range(1, size + 1)))
+        # Requests nearest completion are drained first
+        self.assertEqual(sorted(request_ids, key=last.get),
+                         [request_ids[i] for i in (1, 3, 2, 0)])
+
+    def test_per_request_limit(self):
+        request_id = self._job(300)
+        scheduler = PageScheduler(self.client, [request_id], page_size=10,
+                                  max_in_flight=8, per_request=2)
+        self.assertEqual(len(list(scheduler.records())), 300)
+        self.assertLessEqual(self.server.max_in_flight, 2)
+
+        metrics = scheduler.metrics
+        self.assertEqual(metrics['records'], 300)
+        self.assertEqual(metrics['pages'], 30)
+        self.assertEqual(metrics['requests_done'], 1)
+
+    def test_requests_in_progress(self):
+        done = self._job(30)
+        pending = self._job(50, processed=10)
+        timer = threading.Timer(
+            0.2, self.server.set_processed, (pending, 50))
+        timer.start()
+
+        scheduler = PageScheduler(self.client, [pending, done],
+                                  page_size=20, interval=0.05)
+        tagged = list(scheduler.records())
+        timer.join()
+
+        self.assertEqual([r.index for i, r in tagged if i == pending],
+                         list(range(1, 51)))
+        self.assertEqual(len([i for i, _ in tagged if i == done]), 30)
+        self.assertGreater(scheduler.metrics['polls'], 0)
+
+    def test_short_final_pages(self):
+        # Processed, but 5 of 50 records are never returned
+        request_id = self._job(50)
+        route = self.server._route_getRecords
+        calls = []
+
+        def short(data: dict):
+            calls.append(data['startIndex'])
+            if len(calls) > 100:
+                raise RuntimeError('short pages requested again and again')
+            status, page = route(data)
+            page['whoisRecords'] = [r for r in page['whoisRecords']
+                                    if r['index'] <= 45]
+            return status, page
+
+        self.server._route_getRecords = short
+        tagged = list(self.client.follow_many(
+            request_ids=[request_id], page_size=20, per_request=1))
+
+        self.assertEqual([r.index for _, r in tagged], list(range(1, 46)))
+        self.assertEqual(calls, [1, 21, 41])
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ParameterError):
+            self.client.follow_many(request_ids=None)
+        with self.assertRaises(ParameterError):
+            self.client.follow_many(request_ids=[])
+        with self.assertRaises(ParameterError):
+            PageScheduler(self.client, [self._job(1)], max_in_flight=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
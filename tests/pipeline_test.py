@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+import unittest
+from json import loads
+
+from bulkwhoisapi import ByteBoundedQueue, Client, ParameterError, \
+    RecordPipeline
+from bulkwhoisapi.pipeline import QueueClosed
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+class TestByteBoundedQueue(unittest.TestCase):
+
+    def test_backpressure(self):
+        queue = ByteBoundedQueue(100)
+        queue.put('a', 60)
+        started = threading.Event()
+
+        def producer():
+            started.set()
+            queue.put('b', 60)
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        started.wait()
+        time.sleep(0.05)
+        # The second item does not fit until the first one is taken
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.get(), 'a')
+        thread.join()
+        self.assertEqual(queue.get(), 'b')
+
+        metrics = queue.metrics
+        self.assertEqual(metrics['peak_bytes'], 60)
+        self.assertEqual(metrics['peak_items'], 1)
+        self.assertGreater(metrics['put_wait_seconds'], 0.04)
+
+    def test_close_and_abort(self):
+        queue = ByteBoundedQueue(10)
+        # Larger than the queue, admitted when empty
+        queue.put('large', 50)
+        queue.close()
+        self.assertEqual(queue.get(), 'large')
+        with self.assertRaises(QueueClosed):
+            queue.get()
+        with self.assertRaises(QueueClosed):
+            queue.put('late', 1)
+
+        queue = ByteBoundedQueue(10)
+        queue.put('a', 5)
+        queue.abort()
+        with self.assertRaises(QueueClosed):
+            queue.get()
+
+        with self.assertRaises(ParameterError):
+            ByteBoundedQueue(0)
+
+
+class TestRecordPipeline(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer()
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+        self.request_id = self.server.add_job(
+            ['domain{}.com'.format(i) for i in range(500)])
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_slow_sink(self):
+        received = []
+
+        def sink(records: list):
+            time.sleep(0.01)
+            received.extend(r.index for r in records)
+
+        pipeline = RecordPipeline(
+            self.client, self.request_id, sink, page_size=10,
+            fetch_workers=4, raw_queue_bytes=20000,
+            parsed_queue_bytes=20000)
+        metrics = pipeline.run()
+
+        self.assertEqual(sorted(received), list(range(1, 501)))
+        self.assertEqual(metrics['records'], 500)
+        self.assertEqual(metrics['fetch']['items'], 50)
+        self.assertEqual(metrics['sink']['items'], 50)
+        for name in ('raw_queue', 'parsed_queue'):
+            queue = metrics[name]
+            self.assertLessEqual(queue['peak_bytes'], 20000)
+            self.assertEqual(queue['items'], 0)
+        # Fetchers waited for the sink instead of buffering everything
+        self.assertGreater(metrics['raw_queue']['put_wait_seconds'], 0)
+
+    def test_queues_weigh_bytes(self):
+        get_records_raw = self.client.get_records_raw
+        sizes = []
+
+        def non_ascii(**kwargs):
+            response = re.sub(r'domain(\d)', r'dömain\1',
+                              get_records_raw(**kwargs))
+            sizes.append(len(response.encode('UTF-8')))
+            return response
+
+        self.client.get_records_raw = non_ascii
+        received = []
+        pipeline = RecordPipeline(
+            self.client, self.request_id, received.extend, page_size=100)
+        weights = {'raw_queue': [], 'parsed_queue': []}
+        for name, weighed in weights.items():
+            queue = getattr(pipeline, name)
+
+            def put(item, size, queue_put=queue.put, weighed=weighed):
+                weighed.append(size)
+                queue_put(item, size)
+
+            queue.put = put
+        pipeline.run()
+
+        self.assertIn('dömain0.com', [r.domain_name for r in received])
+        for weighed in weights.values():
+            self.assertEqual(sorted(weighed), sorted(sizes))
+
+    def test_custom_parse_and_processing_request(self):
+        request_id = self.server.add_job(
+            ['domain{}.com'.format(i) for i in range(50)], processed=25)
+        pages = []
+        pipeline = RecordPipeline(
+            self.client, request_id, pages.append, page_size=10,
+            parse=lambda response: loads(response)['whoisRecords'])
+        pipeline.run()
+
+        indexes = sorted(r['index'] for page in pages for r in page)
+        self.assertEqual(indexes, list(range(1, 26)))
+
+    def test_errors_stop_all_stages(self):
+        calls = []
+
+        def sink(records: list):
+            calls.append(len(records))
+            raise RuntimeError('database is down')
+
+        pipeline = RecordPipeline(self.client, self.request_id, sink,
+                                  page_size=10, raw_queue_bytes=20000)
+        with self.assertRaises(RuntimeError):
+            pipeline.run()
+        self.assertEqual(calls, [10])
+
+        # No call is started once a stage has failed
+        fetched = []
+        get_records_raw = self.client.get_records_raw
+
+        def counting(**kwargs):
+            fetched.append(kwargs['start_index'])
+            return get_records_raw(**kwargs)
+
+        self.client.get_records_raw = counting
+        pipeline = RecordPipeline(self.client, self.request_id, sink,
+                                  page_size=10, fetch_workers=1)
+        pipeline._error = RuntimeError('failed')
+        with self.assertRaises(RuntimeError):
+            pipeline.run()
+        self.assertEqual(fetched, [])
+        del self.client.get_records_raw
+
+        self.server.jobs.clear()
+        with self.assertRaises(Exception):
+            RecordPipeline(self.client, self.request_id, calls.append).run()
+
+        with self.assertRaises(ParameterError):
+            RecordPipeline(self.client, self.request_id, calls.append,
+                           sink_workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+"""
+Profiles a synthetic job end to end against the local API stub:
+create -> poll -> paginate -> decode -> model -> export.
+
+    python -m tests.profiling --domains 20000 --output report.json
+    python -m tests.profiling --domains 20000 --baseline report.json
+
+The JSON report holds per-stage timings, tracemalloc peaks and top
+allocation sites, and the hottest functions from cProfile or a sampling
+profiler. With --baseline, stages slower than the baseline by more than
+--tolerance are listed and the exit code is 1.
+"""
+
+import argparse
+import collections
+import cProfile
+import io
+import json
+import platform
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+import bulkwhoisapi
+from bulkwhoisapi import Client
+from bulkwhoisapi.cli import export_writer
+from bulkwhoisapi.models.response import ResponseRecords
+from bulkwhoisapi.version import VERSION
+from tests.stub_server import StubServer
+
+
+REPORT_VERSION = 1
+
+_api_key = 'at_' + 'a' * 29
+
+STAGES = ('create', 'poll', 'paginate', 'decode', 'model', 'export')
+
+
+class _Timings:
+    """Durations of every call, per stage"""
+
+    def __init__(self):
+        self.durations = {stage: [] for stage in STAGES}
+
+    def measure(self, stage: str, function, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.durations[stage].append(time.perf_counter() - started)
+
+    def report(self) -> dict:
+        result = {}
+        for stage, durations in self.durations.items():
+            ordered = sorted(durations)
+            result[stage] = {
+                'calls': len(ordered),
+                'seconds': sum(ordered),
+                'mean': sum(ordered) / len(ordered) if ordered else 0.0,
+                'p50': _percentile(ordered, 0.5),
+                'p95': _percentile(ordered, 0.95),
+                'max': ordered[-1] if ordered else 0.0,
+            }
+        return result
+
+
+class _SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval. Cheaper than
+    cProfile, so the timings stay closer to unprofiled runs. Same
+    enable/disable interface as `cProfile.Profile`.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.own = collections.Counter()
+        self.total = collections.Counter()
+        self._running = False
+        self._thread = None
+
+    def enable(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._running = False
+        self._thread.join()
+
+    def report(self, top: int) -> list:
+        return [{
+            'function': function,
+            'own_samples': self.own[function],
+            'total_samples': samples,
+            'total_share': samples / self.samples,
+        } for function, samples in self.total.most_common(top)]
+
+    def _sample(self):
+        while self._running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples += 1
+                self.own[_function(frame.f_code)] += 1
+                seen = set()
+                while frame is not None:
+                    seen.add(_function(frame.f_code))
+                    frame = frame.f_back
+                self.total.update(seen)
+            time.sleep(self.interval)
+
+
+def _function(code) -> str:
+    return '{}:{}({})'.format(code.co_filename, code.co_firstlineno,
+                              code.co_name)
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def _cprofile_report(profile: cProfile.Profile, top: int) -> list:
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, name), (_, calls, own, total, _) in \
+            stats.stats.items():
+        rows.append({
+            'function': '{}:{}({})'.format(filename, line, name),
+            'calls': calls,
+            'own_seconds': own,
+            'total_seconds': total,
+        })
+    rows.sort(key=lambda row: row['total_seconds'], reverse=True)
+    return rows[:top]
+
+
+def _memory_report(snapshot, peak: int, top: int) -> dict:
+    package = bulkwhoisapi.__file__.rsplit('__init__.py', 1)[0]
+    statistics = snapshot.filter_traces([
+        tracemalloc.Filter(True, package + '*')]).statistics('lineno')
+    return {
+        'peak_bytes': peak,
+        'top_package_sites': [{
+            'site': '{}:{}'.format(stat.traceback[0].filename,
+                                   stat.traceback[0].lineno),
+            'bytes': stat.size,
+            'blocks': stat.count,
+        } for stat in statistics[:top]],
+    }
+
+
+def run(**kwargs) -> dict:
+    """
+    Profile one synthetic job
+    :key domains: int: (optional) Domains of the job. 10000 by default
+    :key page_size: int: (optional) Records per /getRecords call.
+            1000 by default
+    :key processing_steps: int: (optional) Polls before the job is
+            complete. 3 by default
+    :key latency: float: (optional) Stub latency per call in seconds.
+            0 by default
+    :key profiler: str: (optional) 'cprofile', 'sampling' or None.
+            'cprofile' by default
+    :key memory: bool: (optional) Trace allocations. True by default
+    :key export_format: str: (optional) 'csv' or 'ndjson'. 'csv' by default
+    :key top: int: (optional) Functions and allocation sites reported.
+            25 by default
+    :return: Report, serializable to JSON
+    """
+    domains = kwargs.get('domains', 10000)
+    page_size = kwargs.get('page_size', 1000)
+    steps = kwargs.get('processing_steps', 3)
+    profiler_name = kwargs.get('profiler', 'cprofile')
+    memory = kwargs.get('memory', True)
+    export_format = kwargs.get('export_format', 'csv')
+    top = kwargs.get('top', 25)
+    if profiler_name not in ('cprofile', 'sampling', None):
+        raise ValueError('Unknown profiler: {}'.format(profiler_name))
+
+    timings = _Timings()
+    records = 0
+    output = io.StringIO()
+
+    with StubServer(latency=kwargs.get('latency', 0)) as server:
+        client = Client(_api_key, base_url=server.url)
+        names = ['domain{}.com'.format(i) for i in range(domains)]
+
+        profiler = None
+        if profiler_name == 'cprofile':
+            profiler = cProfile.Profile()
+        elif profiler_name == 'sampling':
+            profiler = _SamplingProfiler(threading.get_ident())
+        if memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+
+        try:
+            request_id = timings.measure(
+                'create', client.create_request, domains=names).request_id
+            # The job completes after a few polls
+            server.set_processed(request_id, 0)
+            for step in range(1, steps + 2):
+                response = timings.measure('poll', client.get_requests)
+                status = [r.status for r in response.user_requests
+                          if r.request_id == request_id]
+                if status == ['Completed']:
+                    break
+                server.set_processed(request_id, domains * step // steps)
+
+            writer = export_writer(export_format, output)
+            cursor = 1
+            while cursor <= domains:
+                raw = timings.measure(
+                    'paginate', client.get_records_raw,
+                    request_id=request_id, max_records=page_size,
+                    start_index=cursor, output_format='json')
+                values = timings.measure('decode', json.loads, raw)
+                page = timings.measure('model', ResponseRecords, values)
+                timings.measure('export', writer.write,
+                                values['whoisRecords'])
+                records += len(page.whois_records)
+                cursor += len(page.whois_records)
+                if not page.whois_records:
+                    break
+            writer.close()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+    report = {
+        'report_version': REPORT_VERSION,
+        'library_version': VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'domains': domains,
+            'page_size': page_size,
+            'processing_steps': steps,
+            'latency': kwargs.get('latency', 0),
+            'profiler': profiler_name,
+            'memory': memory,
+            'export_format': export_format,
+        },
+        'records': records,
+        'export_bytes': len(output.getvalue()),
+        'seconds': elapsed,
+        'records_per_second': records / elapsed if elapsed else 0.0,
+        'stages': timings.report(),
+        'memory': _memory_report(snapshot, peak, top) if memory else None,
+        'profile': None,
+    }
+    if profiler_name == 'cprofile':
+        report['profile'] = _cprofile_report(profiler, top)
+    elif profiler_name == 'sampling':
+        report['profile'] = profiler.report(top)
+    return report
+
+
+def compare(baseline: dict, report: dict, tolerance: float = 0.2) -> list:
+    """
+    Stages slower than in the baseline by more than `tolerance`, and the
+    memory peak if it grew by more than `tolerance`
+    :return: List of {name, baseline, current, change}, empty when none
+    :raises ValueError: reports of different versions or configurations
+    """
+    if baseline.get('report_version') != report.get('report_version'):
+        raise ValueError('Reports have different versions')
+    if baseline.get('config') != report.get('config'):
+        raise ValueError('Reports were run with different configurations')
+
+    pairs = [(stage, baseline['stages'][stage]['seconds'],
+              report['stages'][stage]['seconds'])
+             for stage in STAGES if stage in baseline['stages']]
+    if baseline.get('memory') and report.get('memory'):
+        pairs.append(('memory_peak', baseline['memory']['peak_bytes'],
+                      report['memory']['peak_bytes']))
+    return [{
+        'name': name,
+        'baseline': before,
+        'current': after,
+        'change': after / before - 1,
+    } for name, before, after in pairs
+        if before > 0 and after > before * (1 + tolerance)]
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m tests.profiling',
+        description='Profile a synthetic job against the local API stub.')
+    parser.add_argument('--domains', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--processing-steps', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--profiler', default='cprofile',
+                        choices=['cprofile', 'sampling', 'none'])
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not trace allocations')
+    parser.add_argument('--format', choices=['csv', 'ndjson'],
+                        default='csv')
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--output', '-o', default='-',
+                        help='report file, - for stdout (default)')
+    parser.add_argument('--baseline', help='report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown, 0.2 by default')
+    args = parser.parse_args(argv)
+
+    report = run(
+        domains=args.domains, page_size=args.page_size,
+        processing_steps=args.processing_steps, latency=args.latency,
+        profiler=None if args.profiler == 'none' else args.profiler,
+        memory=not args.no_memory, export_format=args.format, top=args.top)
+
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='UTF-8') as file:
+            file.write(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='UTF-8') as file:
+            regressions = compare(json.load(file), report, args.tolerance)
+        for item in regressions:
+            sys.stderr.write('{name}: {baseline:.4g} -> {current:.4g} '
+                             '({change:+.0%})\n'.format(**item))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
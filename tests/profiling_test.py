@@ -0,0 +1,62 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+from tests import profiling
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_report(self):
+        report = profiling.run(domains=500, page_size=100,
+                               processing_steps=2, top=5)
+        json.dumps(report)
+
+        self.assertEqual(report['records'], 500)
+        stages = report['stages']
+        self.assertEqual(list(stages), list(profiling.STAGES))
+        self.assertEqual(stages['create']['calls'], 1)
+        self.assertEqual(stages['poll']['calls'], 3)
+        for stage in ('paginate', 'decode', 'model', 'export'):
+            self.assertEqual(stages[stage]['calls'], 5)
+            self.assertGreater(stages[stage]['seconds'], 0)
+        self.assertGreater(report['memory']['peak_bytes'], 0)
+        self.assertLessEqual(len(report['memory']['top_package_sites']), 5)
+        functions = [row['function'] for row in report['profile']]
+        self.assertEqual(len(functions), 5)
+        self.assertTrue(any('run' in f or 'measure' in f
+                            for f in functions))
+
+        sampled = profiling.run(domains=200, page_size=100, memory=False,
+                                profiler='sampling', export_format='ndjson')
+        self.assertIsNone(sampled['memory'])
+        self.assertEqual(sampled['records'], 200)
+        self.assertIsInstance(sampled['profile'], list)
+
+    def test_compare(self):
+        baseline = profiling.run(domains=200, page_size=100, profiler=None)
+        current = copy.deepcopy(baseline)
+        self.assertEqual(profiling.compare(baseline, current), [])
+
+        current['stages']['model']['seconds'] *= 2
+        regressions = profiling.compare(baseline, current)
+        self.assertEqual([r['name'] for r in regressions], ['model'])
+        self.assertAlmostEqual(regressions[0]['change'], 1.0)
+
+        current['config']['page_size'] = 50
+        with self.assertRaises(ValueError):
+            profiling.compare(baseline, current)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            self.assertEqual(profiling.main(
+                ['--domains', '200', '--page-size', '100', '--profiler',
+                 'none', '--output', path]), 0)
+            with open(path, encoding='UTF-8') as file:
+                self.assertEqual(json.load(file)['records'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import datetime
+import unittest
+
+from bulkwhoisapi import RecordStore, ResponseRecords, ResponseRequests
+from tests.fixtures import record_values, records_page, requests_list
+
+
+_request_old = '12345678-1234-1234-1234-123456789011'
+_request_new = '12345678-1234-1234-1234-123456789012'
+
+
+class TestRecordStore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.store = RecordStore(batch_size=2)
+        self.store.add_requests(ResponseRequests(requests_list([
+            (_request_old, 1641985855887, 'Completed', 3),
+            (_request_new, 1642985855887, 'Completed', 3),
+        ])))
+        for request_id in [_request_old, _request_new]:
+            self.store.add_records(ResponseRecords(records_page(request_id, [
+                record_values('soon.com', 1,
+                              expires='2022-01-20T00:00:00+0000'),
+                record_values('later.com', 2,
+                              expires='2030-01-01T00:00:00+0000'),
+                record_values('Upper.NET', 3, registrar='Other',
+                              expires='2022-02-01T00:00:00Z'),
+            ])))
+
+    def tearDown(self) -> None:
+        self.store.close()
+
+    def test_requests(self):
+        requests = self.store.get_requests()
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[0].request_id, _request_new)
+        self.assertEqual(requests[0].time.tzinfo, datetime.timezone.utc)
+        self.assertEqual(len(self.store.get_requests(limit=1)), 1)
+        self.assertEqual(len(self.store.get_requests(status='Pending')), 0)
+
+    def test_records(self):
+        records = list(self.store.iter_records(_request_new))
+        self.assertEqual([r.index for r in records], [1, 2, 3])
+        self.assertEqual(records[2].domain_name, 'upper.net')
+        self.assertEqual(records[2].registrar_name, 'Other')
+        self.assertEqual(records[0].name_servers,
+                         ['ns1.example.net', 'ns2.example.net'])
+        self.assertEqual(records[0].status, 'clientTransferProhibited')
+
+    def test_reingest_replaces(self):
+        count = self.store.add_records(
+            [ResponseRecords(records_page(_request_new, [
+                record_values('soon.com', 1, registrar='Changed')
+            ])).whois_records[0]],
+            request_id=_request_new
+        )
+        self.assertEqual(count, 1)
+        records = list(self.store.iter_records(_request_new))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0].registrar_name, 'Changed')
+
+    def test_domain_history(self):
+        history = self.store.domain_history('UPPER.net')
+        self.assertEqual([r.request_id for r in history],
+                         [_request_old, _request_new])
+
+    def test_expiring(self):
+        now = datetime.datetime(2022, 1, 15, tzinfo=datetime.timezone.utc)
+        # Stored by both requests, listed once from the latest
+        expiring = self.store.expiring(datetime.timedelta(days=30), now=now)
+        self.assertEqual([(r.request_id, r.domain_name) for r in expiring],
+                         [(_request_new, 'soon.com'),
+                          (_request_new, 'upper.net')])
+
+        expiring = self.store.expiring(
+            datetime.timedelta(days=10), last_requests=1, now=now)
+        self.assertEqual([(r.request_id, r.domain_name) for r in expiring],
+                         [(_request_new, 'soon.com')])
+
+    def test_expiring_latest_record(self):
+        now = datetime.datetime(2022, 1, 15, tzinfo=datetime.timezone.utc)
+        latest = '12345678-1234-1234-1234-123456789013'
+        self.store.add_requests(ResponseRequests(requests_list([
+            (latest, 1643985855887, 'Completed', 1)])))
+        self.store.add_records(ResponseRecords(records_page(latest, [
+            record_values('soon.com', 1, expires='2023-01-20T00:00:00Z'),
+        ])))
+
+        # Renewed in the latest request
+        expiring = self.store.expiring(datetime.timedelta(days=30), now=now)
+        self.assertEqual([(r.request_id, r.domain_name) for r in expiring],
+                         [(_request_new, 'upper.net')])
+
+
+if __name__ == '__main__':
+    unittest.main()
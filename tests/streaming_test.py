@@ -0,0 +1,185 @@
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+from bulkwhoisapi import ApiRequester, BadRequestError, Client, FileError, \
+    ParameterError, Transport
+from bulkwhoisapi.net import ResponseStream, TransportResponse
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+def _domains(count: int):
+    return ('domain{}.com'.format(i) for i in range(count))
+
+
+class TestStreamingInput(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer()
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _job_domains(self, request_id: str) -> list:
+        return self.server.jobs[request_id]['domains']
+
+    def test_generator(self):
+        response = self.client.create_request(domains=_domains(1000))
+        self.assertEqual(self._job_domains(response.request_id),
+                         list(_domains(1000)))
+        self.assertEqual(
+            self.server.log[-1]['headers'].get('Transfer-Encoding'),
+            'chunked')
+
+    def test_compressed_generator(self):
+        self.client.api_requester.compress_threshold = 0
+        response = self.client.create_request(domains=_domains(1000))
+        self.assertEqual(len(self._job_domains(response.request_id)), 1000)
+        stats = self.client.api_requester.transfer_stats
+        self.assertLess(stats['sent_bytes'], stats['body_bytes'])
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'domains.txt')
+            with open(path, 'w') as f:
+                f.write('a.com\n\n  b.com \nc.com')
+            response = self.client.create_request(domains_file=path)
+            self.assertEqual(self._job_domains(response.request_id),
+                             ['a.com', 'b.com', 'c.com'])
+
+        response = self.client.create_request(
+            domains_file=io.StringIO('d.com\ne.com\n'))
+        self.assertEqual(self._job_domains(response.request_id),
+                         ['d.com', 'e.com'])
+
+        with self.assertRaises(FileError):
+            self.client.create_request(domains_file='/does/not/exist')
+
+    def test_split(self):
+        self.client.max_domains = 400
+        responses = list(self.client.create_requests(domains=_domains(1000)))
+        self.assertEqual(
+            [len(self._job_domains(r.request_id)) for r in responses],
+            [400, 400, 200])
+
+    def test_too_many_domains(self):
+        self.client.max_domains = 10
+        with self.assertRaises(ParameterError):
+            self.client.create_request(domains=list(_domains(11)))
+        with self.assertRaises(ParameterError):
+            self.client.create_request(domains=_domains(11))
+        self.assertEqual(self.server.jobs, {})
+
+    def test_invalid_values(self):
+        with self.assertRaises(ParameterError):
+            self.client.create_request(domains=iter([]))
+        with self.assertRaises(ParameterError):
+            self.client.create_request(domains='example.com')
+        with self.assertRaises(ParameterError):
+            self.client.create_request(domains=iter(['a.com', 1]))
+        self.assertEqual(self.server.jobs, {})
+
+
+class TestStreamingSerializer(unittest.TestCase):
+
+    def test_constant_memory(self):
+        def peak(count: int) -> int:
+            tracemalloc.start()
+            for _ in ApiRequester._iter_json(
+                    {'apiKey': _api_key, 'domains': _domains(count)}):
+                pass
+            result = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return result
+
+        small, large = peak(10000), peak(200000)
+        self.assertLess(large, small * 2)
+
+
+class _CannedTransport(Transport):
+
+    def send(self, url, body, headers, timeout, deadline):
+        return TransportResponse(200, b'{"userRequests": []}', 20)
+
+
+class TestStreamingOutput(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer(gzip_responses=True)
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+        self.request_id = self.server.add_job(
+            ['domain{}.com'.format(i) for i in range(300)])
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _records(self, **kwargs):
+        return self.client.get_records_raw(
+            request_id=self.request_id, max_records=300, **kwargs)
+
+    def test_bytes(self):
+        text = self._records()
+        body = self._records(return_type=Client.RETURN_BYTES)
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(body, text.encode('UTF-8'))
+        self.assertIsInstance(self.client.get_requests_raw(
+            return_type=Client.RETURN_BYTES), bytes)
+
+        with self.assertRaises(ParameterError):
+            self._records(return_type='memoryview')
+
+    def test_stream(self):
+        text = self._records()
+        requester = ApiRequester(base_url=self.server.url, max_in_flight=1)
+        self.client.api_requester = requester
+        before = requester.transfer_stats
+
+        with self._records(return_type=Client.RETURN_STREAM) as stream:
+            self.assertIsInstance(stream, ResponseStream)
+            self.assertEqual(stream.status_code, 200)
+            # The stream holds the only slot until it is closed
+            with self.assertRaises(TimeoutError):
+                self.client.get_requests_raw(timeout=0.2)
+            output = io.BytesIO()
+            shutil.copyfileobj(stream, output, 1000)
+        self.assertEqual(output.getvalue(), text.encode('UTF-8'))
+
+        stats = requester.transfer_stats
+        self.assertEqual(stats['requests'] - before['requests'], 1)
+        self.assertEqual(stats['decoded_bytes'] - before['decoded_bytes'],
+                         len(output.getvalue()))
+        # Compressed on the wire
+        self.assertLess(stats['received_bytes'] - before['received_bytes'],
+                        len(output.getvalue()))
+
+        stream = self.client.download_raw(request_id=self.request_id,
+                                          return_type=Client.RETURN_STREAM)
+        self.assertTrue(stream.read(20).startswith(b'domainName'))
+        stream.close()
+        self.client.get_requests_raw(timeout=1)
+
+    def test_stream_errors(self):
+        with self.assertRaises(BadRequestError):
+            self.client.get_records_raw(
+                request_id='00000000-0000-0000-0000-000000000000',
+                max_records=1, return_type=Client.RETURN_STREAM)
+
+        # Transports without streaming read the whole body first
+        client = Client(_api_key, base_url='http://api.local',
+                        transport=_CannedTransport())
+        with client.get_requests_raw(
+                return_type=Client.RETURN_STREAM) as stream:
+            self.assertEqual(stream.read(), b'{"userRequests": []}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+"""
+Local Bulk Whois API stub for offline tests and benchmarks.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+
+import gzip
+import threading
+import time
+import uuid
+
+from tests.fixtures import record_values, records_page, to_xml
+
+
+class StubServer:
+    """
+    Serves /bulkWhois, /getRecords, /getUserRequests and /download from
+    in-memory jobs on a random local port.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :key gzip_responses: bool: Compress responses when the client
+                accepts gzip
+        :key accept_gzip_requests: bool: Accept gzip request bodies,
+                415 otherwise
+        :key latency: float: Delay before every response in seconds
+        """
+        self.gzip_responses = kwargs.get('gzip_responses', False)
+        self.accept_gzip_requests = kwargs.get('accept_gzip_requests', True)
+        self.latency = kwargs.get('latency', 0)
+
+        self.jobs = {}
+        self.log = []
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def add_job(self, domains: list, processed: int = None) -> str:
+        request_id = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[request_id] = {
+                'domains': list(domains),
+                'processed': len(domains) if processed is None else processed,
+                'time': int(time.time() * 1000),
+            }
+        return request_id
+
+    def set_processed(self, request_id: str, processed: int):
+        with self.lock:
+            self.jobs[request_id]['processed'] = processed
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                with stub.lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(
+                        stub.max_in_flight, stub.in_flight)
+                try:
+                    stub._handle(self)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.01,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._drain()
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _drain(self, timeout: float = 5):
+        """Wait for responses delayed by latency, e.g. of timed out calls"""
+        until = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < until:
+            time.sleep(0.01)
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        if handler.headers.get('Transfer-Encoding') == 'chunked':
+            body = self._read_chunked(handler.rfile)
+        else:
+            body = handler.rfile.read(
+                int(handler.headers.get('Content-Length', 0)))
+
+        status, headers, body = self.respond(handler.path, handler.headers,
+                                             body)
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def respond(self, path: str, headers, body: bytes) -> tuple:
+        """
+        Handle a request independently of the HTTP version
+        :param headers: Case-insensitive mapping
+        :return: (status, headers, body)
+        """
+        encoding = headers.get('Content-Encoding', '')
+
+        entry = {
+            'path': path,
+            'headers': dict(headers),
+            'wire_bytes': len(body),
+            'data': None,
+        }
+        with self.lock:
+            self.log.append(entry)
+
+        if encoding == 'gzip':
+            if not self.accept_gzip_requests:
+                return self._response(headers, 415, {
+                    'messageCode': 415,
+                    'message': 'Unsupported Media Type'})
+            body = gzip.decompress(body)
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        data = entry['data'] = loads(body.decode('UTF-8'))
+        route = getattr(self, '_route_' + path.rsplit('/', 1)[-1], None)
+        if route is None:
+            return self._response(headers, 404, {
+                'messageCode': 404, 'message': 'Not found'})
+        status, payload = route(data)
+        if data.get('outputFormat') == 'xml' and isinstance(payload, dict):
+            payload = to_xml('response', payload)
+        return self._response(headers, status, payload)
+
+    @staticmethod
+    def _read_chunked(rfile) -> bytes:
+        chunks = []
+        while True:
+            size = int(rfile.readline().split(b';')[0], 16)
+            if size == 0:
+                rfile.readline()
+                return b''.join(chunks)
+            chunks.append(rfile.read(size))
+            rfile.readline()
+
+    def _response(self, request_headers, status: int, payload) -> tuple:
+        if isinstance(payload, str):
+            content_type = 'application/xml' \
+                if payload.startswith('<?xml') else 'text/csv'
+            body = payload.encode('UTF-8')
+        else:
+            content_type = 'application/json'
+            body = dumps(payload).encode('UTF-8')
+
+        headers = {'Content-Type': content_type}
+        if self.gzip_responses and \
+                'gzip' in request_headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        headers['Content-Length'] = str(len(body))
+        return status, headers, body
+
+    def _job(self, data: dict):
+        with self.lock:
+            return self.jobs.get(data.get('requestId'))
+
+    def _route_bulkWhois(self, data: dict):
+        domains = data.get('domains') or []
+        if not domains:
+            return 417, {'messageCode': 417,
+                         'message': 'Domain list can not be empty!'}
+        valid = [d for d in domains if '.' in d]
+        invalid = [d for d in domains if '.' not in d]
+        return 200, {'messageCode': 200, 'message': 'OK',
+                     'requestId': self.add_job(valid),
+                     'invalidDomains': invalid}
+
+    def _route_getRecords(self, data: dict):
+        job = self._job(data)
+        if job is None:
+            return 400, {'messageCode': 400, 'message': 'Unknown request'}
+        start = data.get('startIndex', 1)
+        stop = min(start - 1 + data['maxRecords'], job['processed'])
+        records = [record_values(job['domains'][i], i + 1)
+                   for i in range(start - 1, stop)]
+        return 200, records_page(
+            data['requestId'], records,
+            total_records=len(job['domains']),
+            records_left=len(job['domains']) - job['processed'])
+
+    def _route_getUserRequests(self, data: dict):
+        with self.lock:
+            jobs = list(self.jobs.items())
+        return 200, {'userRequests': [{
+            'requestId': request_id,
+            'time': job['time'],
+            'status': 'Completed'
+            if job['processed'] == len(job['domains']) else 'In progress',
+            'totalRecords': len(job['domains']),
+            'fetchedRecords': 0,
+        } for request_id, job in jobs]}
+
+    def _route_download(self, data: dict):
+        job = self._job(data)
+        if job is None:
+            return 400, {'messageCode': 400, 'message': 'Unknown request'}
+        lines = ['domainName,registrarName,expiresDate']
+        for domain in job['domains'][:job['processed']]:
+            values = record_values(domain)['whoisRecord']
+            lines.append('{},"{}",{}'.format(
+                domain, values['registrarName'], values['expiresDate']))
+        return 200, '\n'.join(lines) + '\n'
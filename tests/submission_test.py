@@ -0,0 +1,128 @@
+import threading
+import time
+import unittest
+
+from bulkwhoisapi import Client, ParameterError, SubmissionScheduler
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+
+def _domains(prefix: str, count: int) -> list:
+    return ['{}{}.com'.format(prefix, i) for i in range(count)]
+
+
+class TestSubmissionScheduler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = StubServer()
+        self.server.start()
+        self.client = Client(_api_key, base_url=self.server.url)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def _created(self) -> list:
+        return [entry['data']['domains'] for entry in self.server.log
+                if entry['path'] == '/bulkWhois']
+
+    def test_urgent_lookups_overtake_backfill(self):
+        with SubmissionScheduler(self.client, 1000, batch_size=100,
+                                 batch_window=0.5,
+                                 urgent_batch=5) as scheduler:
+            backfill = scheduler.submit(_domains('bulk', 60))
+            urgent = scheduler.submit(_domains('urgent', 8), priority=10)
+            due = scheduler.submit(['due.com', 'invalid'], deadline=0.2)
+
+            submitted = urgent.result(2)
+            self.assertEqual(len(set(submitted.request_ids)), 2)
+            self.assertEqual(due.result(2).invalid_domains, ['invalid'])
+            self.assertFalse(backfill.done())
+            self.assertEqual(len(backfill.result(2).request_ids), 1)
+
+        created = self._created()
+        self.assertEqual(created[0], _domains('urgent', 5))
+        # Due within the batch window, so urgent as well
+        self.assertEqual(created[1],
+                         _domains('urgent', 8)[5:] + ['due.com', 'invalid'])
+        self.assertEqual(created[2], _domains('bulk', 60))
+        metrics = scheduler.metrics
+        self.assertEqual(metrics['urgent_requests'], 2)
+        self.assertEqual(metrics['requests'], 3)
+        # The invalid domain is not charged
+        self.assertEqual(metrics['credits_spent'], 69)
+
+    def test_credit_budget(self):
+        # Requests of the last hour count against the budget
+        self.server.add_job(_domains('earlier', 5))
+        scheduler = SubmissionScheduler(self.client, 20, batch_size=100,
+                                        batch_window=0.05, reserve=4)
+        backfill = scheduler.submit(_domains('bulk', 20), deadline=0.5)
+        time.sleep(0.2)
+        urgent = scheduler.submit(_domains('urgent', 3), priority=10)
+        self.assertEqual(len(urgent.result(2).request_ids), 1)
+        with self.assertRaises(TimeoutError):
+            backfill.result(2)
+        scheduler.close()
+
+        created = self._created()
+        # 20 credits, 5 spent before, 4 kept for urgent lookups
+        self.assertEqual(created[0], _domains('bulk', 11))
+        self.assertEqual(created[1], _domains('urgent', 3))
+        # Due soon, the rest of the backfill took the last credit
+        self.assertEqual(created[2], ['bulk11.com'])
+        metrics = scheduler.metrics
+        self.assertEqual(metrics['credits_left'], 0)
+        self.assertEqual(metrics['expired'], 1)
+        self.assertEqual(metrics['queued'], 0)
+
+        with self.assertRaises(ParameterError):
+            scheduler.submit(['a.com'])
+        with self.assertRaises(ParameterError):
+            SubmissionScheduler(self.client, 10, reserve=10)
+        with self.assertRaises(ParameterError):
+            SubmissionScheduler(self.client, 10).submit([])
+
+    def test_existing_requests_loaded_without_lock(self):
+        scheduler = SubmissionScheduler(self.client, 100, batch_window=0.05)
+        get_requests = self.client.get_requests
+        loading, release = threading.Event(), threading.Event()
+
+        def slow_get_requests(**kwargs):
+            loading.set()
+            release.wait(2)
+            return get_requests(**kwargs)
+
+        self.client.get_requests = slow_get_requests
+        thread = threading.Thread(
+            target=scheduler.submit, args=(_domains('first', 2),))
+        thread.start()
+        try:
+            self.assertTrue(loading.wait(2))
+            # Neither blocked by the call in progress
+            started = time.monotonic()
+            self.assertEqual(scheduler.metrics['queued'], 0)
+            self.assertLess(time.monotonic() - started, 0.5)
+        finally:
+            release.set()
+            thread.join()
+        scheduler.close()
+        self.assertEqual(scheduler.metrics['domains'], 2)
+
+    def test_expire_many(self):
+        scheduler = SubmissionScheduler(self.client, 100000, batch_size=5000,
+                                        batch_window=60)
+        futures = [scheduler.submit(['d{}.com'.format(i)], deadline=100)
+                   for i in range(2000)]
+        started = time.monotonic()
+        with scheduler._condition:
+            scheduler._expire(time.monotonic() + 100)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertTrue(all(isinstance(f.exception(0), TimeoutError)
+                            for f in futures))
+        scheduler.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
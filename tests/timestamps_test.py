@@ -0,0 +1,90 @@
+import datetime
+import importlib.util
+import unittest
+
+from unittest import mock
+
+from bulkwhoisapi import BulkRequest, BulkWhoisRecord, ResponseRecords, \
+    ResponseRequests
+from bulkwhoisapi.models.timestamps import MISSING, epoch_ms, \
+    ms_to_datetime, to_datetime64, to_datetimes
+from tests.fixtures import record_values, records_page
+
+
+_utc = datetime.timezone.utc
+
+
+class TestTimestamps(unittest.TestCase):
+
+    def test_epoch_ms(self):
+        values = epoch_ms([1642158864782, '1642158864783', None, '', 'x'])
+        self.assertEqual(values.typecode, 'q')
+        self.assertEqual(list(values), [
+            1642158864782, 1642158864783, MISSING, MISSING, MISSING])
+
+        page = [record_values('a.com', 1), {'domainName': 'b.com'}, None]
+        self.assertEqual(list(epoch_ms(page, 'domainFetchedTime')),
+                         [1642158864783, MISSING, MISSING])
+
+    def test_to_datetimes(self):
+        self.assertEqual(
+            to_datetimes(epoch_ms([1642158864782, None, -1])), [
+                datetime.datetime(2022, 1, 14, 11, 14, 24, 782000,
+                                  tzinfo=_utc),
+                None,
+                datetime.datetime(1969, 12, 31, 23, 59, 59, 999000,
+                                  tzinfo=_utc)])
+        self.assertIsNone(ms_to_datetime(None))
+
+        # Same results as one value at a time, whatever the order
+        values = [1642158864999, 1642158865000, 1642158864001, -1000, 0,
+                  1642158865000, 999, None]
+        self.assertEqual(to_datetimes(iter(values)),
+                         [ms_to_datetime(v) for v in values])
+
+    def test_models_are_aware(self):
+        record = BulkWhoisRecord(record_values('a.com', 1))
+        self.assertEqual(record.domain_fetched_time, datetime.datetime(
+            2022, 1, 14, 11, 14, 24, 783000, tzinfo=_utc))
+
+        request = BulkRequest({'requestId': 'r', 'time': '1642158864782'})
+        self.assertEqual(request.time.tzinfo, _utc)
+        self.assertEqual(request.time.microsecond, 782000)
+        self.assertIsNone(BulkRequest({'requestId': 'r'}).time)
+
+    def test_pages_convert_in_one_batch(self):
+        records = [record_values('d{}.com'.format(i), i + 1)
+                   for i in range(3)]
+        records[1]['domainFetchedTime'] = None
+        del records[2]['domainFetchedTime']
+        expected = [BulkWhoisRecord(r).domain_fetched_time for r in records]
+
+        # No per-record conversion
+        with mock.patch('bulkwhoisapi.models.response.ms_to_datetime',
+                        side_effect=AssertionError):
+            page = ResponseRecords(records_page('r', records))
+            requests = ResponseRequests({'userRequests': [
+                {'requestId': 'r', 'time': 1642158864782},
+                {'requestId': 's'}]})
+
+        self.assertEqual([r.domain_fetched_time for r in page.whois_records],
+                         expected)
+        self.assertIsNotNone(expected[0])
+        self.assertEqual([r.time for r in requests.user_requests], [
+            datetime.datetime(2022, 1, 14, 11, 14, 24, 782000, tzinfo=_utc),
+            None])
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'),
+                         'numpy is not installed')
+    def test_to_datetime64(self):
+        import numpy
+
+        values = epoch_ms([1642158864782, None])
+        result = to_datetime64(values)
+        self.assertEqual(result[0],
+                         numpy.datetime64('2022-01-14T11:14:24.782'))
+        self.assertTrue(numpy.isnat(result[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import importlib.util
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps
+
+from bulkwhoisapi import ApiRequester, Client, HttpxTransport, \
+    RequestsTransport, Transport
+from bulkwhoisapi.net import TransportResponse
+from tests.h2_server import H2StubServer
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+
+_has_http2 = importlib.util.find_spec('httpx') is not None \
+    and importlib.util.find_spec('h2') is not None
+
+
+class _RecordingTransport(Transport):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def send(self, url, body, headers, timeout, deadline):
+        if not isinstance(body, bytes):
+            body = b''.join(body)
+        self.calls.append((url, body, headers, timeout))
+        payload = {'userRequests': []} if url.endswith('Requests') \
+            else {'requestId': 'id', 'invalidDomains': []}
+        return TransportResponse(200, dumps(payload).encode('UTF-8'), 20)
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_default_transport(self):
+        requester = ApiRequester(pool_size=4)
+        self.assertIsInstance(requester.transport, RequestsTransport)
+        self.assertEqual(requester.transport.pool_size, 4)
+        requester.pool_size = None
+        self.assertIsNone(requester.transport.pool_size)
+
+        with self.assertRaises(ValueError):
+            ApiRequester(transport=object())
+        with self.assertRaises(ValueError):
+            RequestsTransport(pool_size=0)
+
+    def test_custom_transport(self):
+        transport = _RecordingTransport()
+        client = Client(_api_key, base_url='http://api.local',
+                        transport=transport, timeout=20)
+        self.assertEqual(client.get_requests().user_requests, [])
+        client.create_request(domains=iter(['a.com']))
+
+        url, body, headers, timeout = transport.calls[0]
+        self.assertEqual(url, 'http://api.local/getUserRequests')
+        self.assertIn(b'"apiKey"', body)
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        # The requested timeout applies to every endpoint
+        self.assertEqual(timeout, (10, 20))
+        self.assertIn(b'["a.com"]', transport.calls[1][1])
+        self.assertEqual(transport.calls[1][3], (10, 20))
+        self.assertEqual(client.api_requester.transfer_stats['requests'], 2)
+
+    @unittest.skipUnless(_has_http2, 'httpx and h2')
+    def test_http2_multiplexing(self):
+        with H2StubServer(latency=0.05) as server:
+            request_id = server.add_job(
+                ['domain{}.com'.format(i) for i in range(160)])
+            transport = HttpxTransport(http1=False)
+            client = Client(_api_key, base_url=server.url,
+                            transport=transport)
+            start = threading.Barrier(16)
+
+            def fetch(n: int) -> list:
+                start.wait()
+                page = client.get_records(request_id=request_id,
+                                          max_records=10,
+                                          start_index=n * 10 + 1)
+                return [r.index for r in page.whois_records]
+
+            with ThreadPoolExecutor(16) as executor:
+                pages = list(executor.map(fetch, range(16)))
+            transport.close()
+
+        self.assertEqual(sum(pages, []), list(range(1, 161)))
+        self.assertEqual(server.connections, 1)
+        self.assertGreater(server.max_in_flight, 1)
+
+    @unittest.skipUnless(_has_http2, 'httpx and h2')
+    def test_httpx_slow_upload(self):
+        with StubServer() as server:
+            transport = HttpxTransport(http2=False)
+            client = Client(_api_key, base_url=server.url,
+                            transport=transport)
+            producing = threading.Event()
+
+            def domains():
+                yield 'a.com'
+                producing.set()
+                time.sleep(0.5)
+                yield 'b.com'
+
+            with ThreadPoolExecutor(1) as executor:
+                upload = executor.submit(client.create_request,
+                                         domains=domains())
+                self.assertTrue(producing.wait(2))
+                # Not blocked by the producer of the upload
+                started = time.monotonic()
+                client.get_requests()
+                self.assertLess(time.monotonic() - started, 0.4)
+                self.assertEqual(upload.result().invalid_domains, [])
+            transport.close()
+
+    @unittest.skipUnless(_has_http2, 'httpx and h2')
+    def test_httpx_errors(self):
+        with H2StubServer(latency=0.5) as server:
+            transport = HttpxTransport(http1=False)
+            client = Client(_api_key, base_url=server.url,
+                            transport=transport)
+            with self.assertRaises(TimeoutError):
+                client.get_requests(timeout=0.1)
+            transport.close()
+
+        with StubServer(gzip_responses=True) as server:
+            transport = HttpxTransport(http2=False)
+            client = Client(_api_key, base_url=server.url,
+                            transport=transport, compress_threshold=0)
+            response = client.create_request(domains=iter(['a.com']))
+            self.assertEqual(server.log[-1]['headers']['Content-Encoding'],
+                             'gzip')
+            page = client.get_records(request_id=response.request_id,
+                                      max_records=10)
+            self.assertEqual(len(page.whois_records), 1)
+            client.get_records(request_id=server.add_job(
+                ['domain{}.com'.format(i) for i in range(50)]),
+                max_records=50)
+            stats = client.api_requester.transfer_stats
+            self.assertLess(stats['received_bytes'], stats['decoded_bytes'])
+            transport.close()
+
+        with self.assertRaises(ConnectionError):
+            client.get_requests()
+        with self.assertRaises(ValueError):
+            HttpxTransport(http1=False, http2=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+from xml.etree.ElementTree import iterparse
+
+import io
+import tracemalloc
+import unittest
+
+from unittest import mock
+
+from bulkwhoisapi import Client, ResponseRecords, UnparsableApiResponseError
+from bulkwhoisapi.models.xml_parser import iter_records_xml, \
+    parse_create_xml, parse_records_xml, parse_requests_xml
+from tests.fixtures import record_values, records_page, requests_list, \
+    to_xml
+from tests.stub_server import StubServer
+
+
+_api_key = 'at_' + 'a' * 29
+_request_id = 'f7e7e2ae-ee8c-4a5f-8ae1-c3e9e4cd1b9c'
+
+
+def _page(count: int) -> dict:
+    return records_page(_request_id, [
+        record_values('domain{}.com'.format(i), i + 1) for i in range(count)
+    ], total_records=count + 5, records_left=5)
+
+
+class TestXmlParser(unittest.TestCase):
+
+    def test_records_match_json(self):
+        values = _page(3)
+        expected = ResponseRecords(values)
+        parsed = parse_records_xml(to_xml('response', values))
+
+        self.assertEqual(parsed.request_id, expected.request_id)
+        self.assertEqual(parsed.total_records, 8)
+        self.assertEqual(parsed.records_left, 5)
+        self.assertFalse(parsed.no_data_available)
+        self.assertEqual(parsed.domain_list, expected.domain_list)
+        self.assertEqual(
+            [r.domain_name for r in parsed.whois_records],
+            [r.domain_name for r in expected.whois_records])
+
+        record = parsed.whois_records[1]
+        self.assertEqual(record.index, 2)
+        self.assertEqual(record.domain_fetched_time,
+                         expected.whois_records[1].domain_fetched_time)
+        self.assertEqual(record.whois_record.registrar_name, 'Registrar Inc')
+        self.assertEqual(record.whois_record.expires_date,
+                         expected.whois_records[1].whois_record.expires_date)
+        self.assertEqual(record.whois_record.name_servers.host_names,
+                         ['ns1.example.net', 'ns2.example.net'])
+
+    def test_unwrapped_lists(self):
+        xml = '<response><requestId>{}</requestId>' \
+              '<whoisRecords><index>1</index><domainName>a.com</domainName>' \
+              '<whoisRecord><domainName>a.com</domainName></whoisRecord>' \
+              '</whoisRecords>' \
+              '<whoisRecords><index>2</index><domainName>b.com</domainName>' \
+              '</whoisRecords></response>'.format(_request_id)
+        parsed = parse_records_xml(xml)
+
+        self.assertEqual([r.domain_name for r in parsed.whois_records],
+                         ['a.com', 'b.com'])
+        self.assertEqual(parsed.whois_records[0].whois_record.domain_name,
+                         'a.com')
+
+    def test_requests_and_create(self):
+        requests = parse_requests_xml(to_xml('response', requests_list([
+            (_request_id, 1642158864782, 'Completed', 2),
+        ])).encode('UTF-8'))
+        self.assertEqual(len(requests.user_requests), 1)
+        self.assertEqual(requests.user_requests[0].total_records, 2)
+
+        created = parse_create_xml(to_xml('response', {
+            'requestId': _request_id,
+            'invalidDomains': ['bad'],
+        }))
+        self.assertEqual(created.request_id, _request_id)
+        self.assertEqual(created.invalid_domains, ['bad'])
+
+    def test_invalid(self):
+        with self.assertRaises(UnparsableApiResponseError):
+            parse_records_xml('<response><requestId>')
+        with self.assertRaises(UnparsableApiResponseError):
+            parse_requests_xml('<response><other>1</other></response>')
+
+    def test_iter_records_memory(self):
+        def peak(count: int) -> tuple:
+            source = io.BytesIO(to_xml('response', _page(count))
+                                .encode('UTF-8'))
+            tracemalloc.start()
+            try:
+                seen = sum(1 for _ in iter_records_xml(source))
+                return tracemalloc.get_traced_memory()[1], seen
+            finally:
+                tracemalloc.stop()
+
+        small, seen = peak(100)
+        self.assertEqual(seen, 100)
+        large, seen = peak(1000)
+        self.assertEqual(seen, 1000)
+        # Records are dropped once handed over, the peak must not grow
+        # with the page size
+        self.assertLess(large, small * 3)
+
+    def test_finished_elements_detached(self):
+        finished, attached = {}, []
+
+        def tracking(source, events):
+            root = None
+            for event, element in iterparse(source, events=events):
+                root = element if root is None else root
+                yield event, element
+                if event == 'end':
+                    # Held here, so that ids stay unique
+                    finished[id(element)] = element
+                attached.append(sum(
+                    1 for e in root.iter() if id(e) in finished))
+
+        with mock.patch('bulkwhoisapi.models.xml_parser.iterparse',
+                        tracking):
+            seen = sum(1 for _ in iter_records_xml(
+                to_xml('response', _page(100))))
+        self.assertEqual(seen, 100)
+        # Converted elements leave the tree, only the read-ahead of the
+        # parser stays in it
+        self.assertEqual(max(attached), 0)
+
+    def test_client_xml_format(self):
+        with StubServer() as stub:
+            request_id = stub.add_job(['a.com', 'b.com'])
+            client = Client(_api_key, base_url=stub.url)
+
+            page = client.get_records(request_id=request_id, max_records=10,
+                                      output_format=Client.XML_FORMAT)
+            self.assertEqual([r.domain_name for r in page.whois_records],
+                             ['a.com', 'b.com'])
+            self.assertEqual(stub.log[-1]['data']['outputFormat'], 'xml')
+
+            requests = client.get_requests(response_format='xml')
+            self.assertEqual(requests.user_requests[0].request_id, request_id)
+
+            created = client.create_request(domains=['c.com', 'bad'],
+                                            output_format=Client.XML_FORMAT)
+            self.assertEqual(created.invalid_domains, ['bad'])
+
+
+if __name__ == '__main__':
+    unittest.main()